@@ -1,12 +1,15 @@
 import os
 import gc
+import asyncio
 import tempfile
 import time
 import uuid
 import streamlit as st
 from dotenv import load_dotenv
-from llama_index.core import SimpleDirectoryReader
 from rag import EmbedData, MilvusVDB_BQ, Retriever, RAG
+from pipeline import iter_page_records, run_pipeline
+from rescore_store import RescoreStore
+from streaming import iter_frames
 
 load_dotenv()
 
@@ -79,61 +82,24 @@ with st.sidebar:
 
                     st.write(f"Indexing {len(new_files_to_process)} new document(s)...")
 
-                    loader = SimpleDirectoryReader(
-                        input_dir=temp_dir,
-                        required_exts=[".pdf"],
-                        recursive=True
-                    )
+                    progress_bar = st.progress(0)
+                    status_text = st.empty()
+                    status_text.text("Generating embeddings...")
+                    counts = {"parsed": 0, "inserted": 0}
 
-                    docs = loader.load_data()
-                    documents = [doc.text for doc in docs]
-                    
-                    # Extract metadata from documents
-                    metadata = []
-                    for doc in docs:
-                        # Extract filename from document metadata
-                        filename = "unknown"
-                        page = 0
-                        
-                        if hasattr(doc, 'metadata') and doc.metadata:
-                            # Get filename from metadata
-                            if 'file_name' in doc.metadata:
-                                filename = doc.metadata['file_name']
-                            elif 'source' in doc.metadata:
-                                filename = doc.metadata['source'].split('/')[-1] if '/' in doc.metadata['source'] else doc.metadata['source']
-                            
-                            # Get page number from metadata
-                            if 'page_label' in doc.metadata:
-                                try:
-                                    page = int(doc.metadata['page_label'])
-                                except (ValueError, TypeError):
-                                    page = 0
-                            elif 'page' in doc.metadata:
-                                try:
-                                    page = int(doc.metadata['page'])
-                                except (ValueError, TypeError):
-                                    page = 0
-                        
-                        # If filename is still unknown, try to get it from uploaded files
-                        if filename == "unknown" and new_files_to_process:
-                            for uploaded_file in new_files_to_process:
-                                if uploaded_file.name.replace('.pdf', '') in doc.text[:100]:
-                                    filename = uploaded_file.name
-                                    break
-                            if filename == "unknown":
-                                filename = new_files_to_process[0].name  # Default to first file
-                        
-                        metadata.append({
-                            "filename": filename,
-                            "page": page + 1  # Convert to 1-based page numbering
-                        })
-
-                    if not documents:
-                        st.error("No text could be extracted from the PDFs. Please try different files.")
-                        st.stop()
+                    def on_parsed(n):
+                        counts["parsed"] += n
 
-                    progress_bar = st.progress(0)
-                    st.text("Generating embeddings...")
+                    def on_inserted(n):
+                        counts["inserted"] += n
+                        status_text.text(f"Stored {counts['inserted']}/{counts['parsed']} pages...")
+                        progress_bar.progress(min(90, 10 + int(80 * counts["inserted"] / max(counts["parsed"], 1))))
+
+                    file_paths = [
+                        (os.path.join(temp_dir, uploaded_file.name), uploaded_file.name)
+                        for uploaded_file in new_files_to_process
+                    ]
+                    records = iter_page_records(file_paths)
 
                     # Check if we need to initialize embeddings and vector DB
                     if "query_engine" not in st.session_state.file_cache:
@@ -142,30 +108,34 @@ with st.sidebar:
                             embed_model_name="BAAI/bge-m3",
                             batch_size=batch_size
                         )
-                        embeddata.embed(documents, metadata)
-                        progress_bar.progress(40)
-                        st.text("Creating vector index...")
-
                         db_file = os.path.join(tempfile.gettempdir(), f"milvus_{session_id}.db")
-                        
-                        test_embedding = embeddata.embed_model.encode("test")
-                        actual_dim = len(test_embedding)
 
                         milvus_vdb = MilvusVDB_BQ(
                             collection_name=collection_name,
                             batch_size=batch_size,
-                            vector_dim=actual_dim,
-                            db_file=db_file
+                            vector_dim=embeddata.vector_dim,
+                            db_file=db_file,
+                            rescore_store=RescoreStore(
+                                os.path.join(tempfile.gettempdir(), f"rescore_{session_id}"),
+                                dim=embeddata.vector_dim
+                            ),
+                            sparse=embeddata.sparse
                         )
-                        progress_bar.progress(60)
-                        st.text("Storing in vector DB...")
+                        progress_bar.progress(10)
 
                         milvus_vdb.define_client()
                         milvus_vdb.create_collection(drop_existing=True)
-                        milvus_vdb.ingest_data(embeddata=embeddata)
-                        
-                        progress_bar.progress(80)
-                        st.text("Creating query engine...")
+                        # Pages are chunked and stream through parse -> embed -> insert in bounded batches
+                        total_inserted = asyncio.run(run_pipeline(
+                            embeddata.chunk_records(records), embeddata, milvus_vdb,
+                            batch_size=batch_size, on_parsed=on_parsed, on_inserted=on_inserted
+                        ))
+
+                        if not total_inserted:
+                            st.error("No text could be extracted from the PDFs. Please try different files.")
+                            st.stop()
+
+                        status_text.text("Creating query engine...")
 
                         retriever = Retriever(vector_db=milvus_vdb, embeddata=embeddata)
                         query_engine = RAG(
@@ -181,19 +151,15 @@ with st.sidebar:
                         # Add to existing collection
                         embeddata = st.session_state.file_cache["embeddata"]
                         milvus_vdb = st.session_state.file_cache["milvus_vdb"]
-                        
-                        # Generate embeddings for new documents
-                        new_embeddata = EmbedData(
-                            embed_model_name="BAAI/bge-m3",
-                            batch_size=batch_size
-                        )
-                        new_embeddata.embed(documents, metadata)
-                        progress_bar.progress(60)
-                        st.text("Adding to vector DB...")
-                        
-                        # Add new embeddings to existing collection
-                        milvus_vdb.ingest_data(embeddata=new_embeddata)
-                        progress_bar.progress(80)
+
+                        total_inserted = asyncio.run(run_pipeline(
+                            embeddata.chunk_records(records), embeddata, milvus_vdb,
+                            batch_size=batch_size, on_parsed=on_parsed, on_inserted=on_inserted
+                        ))
+
+                        if not total_inserted:
+                            st.error("No text could be extracted from the PDFs. Please try different files.")
+                            st.stop()
 
                     progress_bar.progress(100)
                     
@@ -266,25 +232,10 @@ if prompt := st.chat_input("Ask a question about your documents..."):
             # Call the LLM for streaming
             streaming_response = query_engine.llm.stream_complete(prompt_text)
 
-            for chunk in streaming_response:
-                try:
-                    if hasattr(chunk, 'delta') and chunk.delta:
-                        new_text = chunk.delta
-                    elif hasattr(chunk, 'text') and chunk.text is not None:
-                        candidate = chunk.text
-                        if candidate.startswith(full_response):
-                            new_text = candidate[len(full_response):]
-                        else:
-                            new_text = candidate
-                    else:
-                        candidate = str(chunk)
-                        new_text = candidate if not candidate.startswith(full_response) else ""
-
-                    if new_text:
-                        full_response += new_text
-                        message_placeholder.markdown(full_response + "▌")
-                except Exception:
-                    continue
+            # Re-rendered once per frame rather than once per token
+            for _, streamed in iter_frames(streaming_response):
+                full_response = streamed.text
+                message_placeholder.markdown(full_response + "▌")
 
             # Always append citations if available
             if citations:
@@ -1,20 +1,39 @@
 import os
 import gc
-import tempfile
+import asyncio
+import hashlib
+import logging
 import time
 import uuid
 from typing import List, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from llama_index.core import SimpleDirectoryReader
-from rag import EmbedData, MilvusVDB_BQ, Retriever, RAG
+from rag import EmbedData, MilvusVDB_BQ, Retriever, RAG, MILVUS_TENANCY, DEFAULT_TOP_K, close_shared_clients
+from model_registry import registry as model_registry
+from executors import run_embed, run_milvus, shutdown as shutdown_executors
+from jobs import IngestionJob, IngestionQueue, TERMINAL_STATES
+from pipeline import iter_page_records, run_pipeline
+from rescore_store import RescoreStore
+from query_cache import query_caches
+from embedding_cache import embedding_caches
+from session_manager import SessionManager
+from storage import (
+    MANIFEST_VERSION, session_db_file, shared_db_file, rescore_path, ensure_dirs,
+    model_fingerprint, compatible, remove_files, valid_session_id
+)
+from metrics import span, trace_request, render as render_metrics
+from llm_gateway import llm_gateway
+from streaming import relay
+from reranking import get_reranker, RERANKER_ENABLED
 import json
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # FastAPI application for Alwasaet RAG
 # Provides REST API and WebSocket endpoints for document processing and chat
 app = FastAPI(title="Alwasaet RAG API")
@@ -28,15 +47,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global state management
-sessions = {}
 batch_size = 512
 
+# Upload limits: a request whose declared size exceeds the request cap is refused
+# before its body is read; each file is also checked while it is streamed in
+MAX_UPLOAD_FILE_MB = float(os.getenv("MAX_UPLOAD_FILE_MB", "256"))
+MAX_UPLOAD_REQUEST_MB = float(os.getenv("MAX_UPLOAD_REQUEST_MB", "1024"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Largest number of queries accepted by /api/query/batch
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path == "/api/upload":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_REQUEST_MB * 1024 * 1024:
+            return JSONResponse(status_code=413, content={"detail": f"Upload exceeds {MAX_UPLOAD_REQUEST_MB:.0f} MB"})
+    return await call_next(request)
+
+@app.on_event("startup")
+async def start_workers():
+    """Start ingestion workers and load the shared embedding model before the first upload arrives"""
+    ensure_dirs()
+    ingestion_queue.start()
+    # Stored sessions are registered now and reattached on first use
+    sessions.restore()
+    sessions.start()
+    if os.getenv("EMBED_WARMUP", "true").lower() in ("1", "true", "yes"):
+        await run_embed(model_registry.warm_up, ["BAAI/bge-m3"])
+        if RERANKER_ENABLED:
+            await run_embed(get_reranker().warm_up)
+
+@app.on_event("shutdown")
+async def stop_workers():
+    await ingestion_queue.stop()
+    await sessions.stop()
+    await llm_gateway.close()
+    close_shared_clients()
+    shutdown_executors()
+
 class QueryRequest(BaseModel):
     query: str
     session_id: str
     groq_api_key: str
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    session_id: str
+    groq_api_key: str
+    top_k: int = Field(DEFAULT_TOP_K, ge=1, le=50)
+    # False returns retrieved contexts and citations only (evaluation, cache pre-warming)
+    answer: bool = True
+
 class InitSessionRequest(BaseModel):
     groq_api_key: str
 
@@ -53,26 +116,154 @@ class SessionInfo(BaseModel):
     documents: List[DocumentInfo]
     is_indexed: bool
 
-def get_or_create_session(session_id: str = None, groq_api_key: str = None):
-    if session_id and session_id in sessions:
-        return sessions[session_id]
-    
-    new_session_id = session_id or str(uuid.uuid4())[:8]
-    sessions[new_session_id] = {
-        "id": new_session_id,
+def new_session(session_id: str, groq_api_key: str = None):
+    return {
+        "id": session_id,
         "query_engine": None,
         "milvus_vdb": None,
         "embeddata": None,
         "processed_files": {},
+        "ingested_hashes": {},  # content hash -> filename of fully ingested files
         "is_indexed": False,
+        # Serializes ingestion jobs of the same session
+        "ingest_lock": asyncio.Lock(),
         "groq_api_key": groq_api_key or os.getenv("GROQ_API_KEY", "")
     }
-    return sessions[new_session_id]
+
+async def get_or_create_session(session_id: str = None, groq_api_key: str = None):
+    # The id names the session's files under DATA_DIR
+    if session_id and not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    if session_id and session_id in sessions:
+        session = await sessions.load(session_id)
+        if session is not None:
+            adopt_api_key(session, groq_api_key)
+            return session
+    
+    new_session_id = session_id or str(uuid.uuid4())[:8]
+    sessions[new_session_id] = new_session(new_session_id, groq_api_key)
+    return sessions.get(new_session_id)
+
+def adopt_api_key(session, groq_api_key: str = None):
+    """Give a session restored without its API key (keys are never stored) the caller's key"""
+    if groq_api_key and not session["groq_api_key"]:
+        session["groq_api_key"] = groq_api_key
+    if session["query_engine"] is None and session["milvus_vdb"] is not None and session["groq_api_key"]:
+        session["query_engine"] = build_query_engine(session["milvus_vdb"], session["embeddata"], session["groq_api_key"])
+
+def build_query_engine(milvus_vdb, embeddata, groq_api_key):
+    retriever = Retriever(vector_db=milvus_vdb, embeddata=embeddata)
+    return RAG(
+        retriever=retriever,
+        llm_model="moonshotai/kimi-k2-instruct",
+        groq_api_key=groq_api_key
+    )
+
+def session_manifest(session):
+    """Durable description of a session: its collection, documents (with content hashes) and the model behind its vectors"""
+    milvus_vdb = session["milvus_vdb"]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "id": session["id"],
+        "processed_files": session["processed_files"],
+        "ingested_hashes": session["ingested_hashes"],
+        "is_indexed": session["is_indexed"],
+        "model": model_fingerprint(session["embeddata"]) if session["embeddata"] is not None else None,
+        "vector_db": None
+    }
+    if milvus_vdb is not None:
+        rescore_store = milvus_vdb.rescore_store
+        manifest["vector_db"] = {
+            "collection_name": milvus_vdb.collection_name,
+            "db_file": milvus_vdb.db_file,
+            "vector_dim": milvus_vdb.vector_dim,
+            "tenant_id": milvus_vdb.tenant_id,
+            "sparse": milvus_vdb.sparse,
+            "rescore_path": rescore_store.path if rescore_store is not None else None,
+            "rescore_dtype": str(rescore_store.dtype) if rescore_store is not None else None
+        }
+    return manifest
+
+async def spill_session(session):
+    """Release a session's Milvus client and engine; returns (manifest, memo) for rehydration"""
+    manifest = session_manifest(session)
+    milvus_vdb = session["milvus_vdb"]
+    if milvus_vdb is not None:
+        await run_milvus(milvus_vdb.close)
+        query_caches.drop(milvus_vdb.cache_key)
+    # The API key stays in memory only
+    return manifest, {"groq_api_key": session["groq_api_key"]}
+
+async def rehydrate_session(manifest, memo):
+    """Rebuild a spilled or stored session; the Milvus data and rescore vectors are reopened from disk, never re-embedded"""
+    # Sessions restored after a restart have no memo; their key comes from the next request (or GROQ_API_KEY)
+    session = new_session(manifest["id"], (memo or {}).get("groq_api_key"))
+    session["processed_files"] = manifest["processed_files"]
+    session["ingested_hashes"] = manifest["ingested_hashes"]
+    session["is_indexed"] = manifest["is_indexed"]
+    params = manifest["vector_db"]
+    if params is None:
+        return session
+
+    embeddata = await run_embed(EmbedData, embed_model_name="BAAI/bge-m3", batch_size=batch_size, sparse=params.get("sparse", False))
+    stored_model = manifest.get("model")
+    missing_data = params["tenant_id"] is None and not os.path.exists(params["db_file"])
+    if missing_data or (stored_model is not None and not compatible(stored_model, model_fingerprint(embeddata))):
+        # The documents stay listed but must be uploaded again
+        logger.warning(f"Session {manifest['id']}: stored vectors are {'missing' if missing_data else 'from ' + stored_model['embed_model']}; re-upload needed")
+        session["processed_files"] = {filename: False for filename in session["processed_files"]}
+        session["ingested_hashes"] = {}
+        session["is_indexed"] = False
+        remove_files(params["db_file"] if params["tenant_id"] is None else None, params["rescore_path"])
+        return session
+
+    rescore_store = None
+    if params["rescore_path"]:
+        rescore_store = RescoreStore(params["rescore_path"], dim=params["vector_dim"], dtype=params["rescore_dtype"])
+    milvus_vdb = MilvusVDB_BQ(
+        collection_name=params["collection_name"],
+        batch_size=batch_size,
+        vector_dim=params["vector_dim"],
+        db_file=params["db_file"],
+        rescore_store=rescore_store,
+        tenant_id=params["tenant_id"],
+        sparse=params.get("sparse", False)
+    )
+    await run_milvus(milvus_vdb.define_client)
+    await run_milvus(milvus_vdb.create_collection, drop_existing=False)
+    session["milvus_vdb"] = milvus_vdb
+    session["embeddata"] = embeddata
+    adopt_api_key(session)
+    return session
+
+def session_nbytes(session):
+    """Bytes pinned by a resident session: held embeddings, its Milvus Lite data and rescore vectors"""
+    total = 0
+    embeddata = session["embeddata"]
+    if embeddata is not None:
+        total += sum(getattr(vector, "nbytes", 0) for vector in embeddata.embeddings)
+        total += sum(getattr(vector, "nbytes", 0) for vector in embeddata.binary_embeddings)
+    milvus_vdb = session["milvus_vdb"]
+    if milvus_vdb is not None:
+        # Milvus Lite keeps a loaded collection in memory; a shared collection is not attributed to any one session
+        if milvus_vdb.tenant_id is None:
+            total += path_size(milvus_vdb.db_file)
+        if milvus_vdb.rescore_store is not None:
+            total += milvus_vdb.rescore_store.nbytes
+    return total
+
+def path_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+# Global state management: resident sessions in LRU order, idle ones spilled to disk
+sessions = SessionManager(spill=spill_session, rehydrate=rehydrate_session, sizeof=session_nbytes, describe=session_manifest)
 
 @app.post("/api/init-session", response_model=SessionResponse)
 async def init_session(request: InitSessionRequest):
     """Initialize a new session"""
-    session = get_or_create_session(groq_api_key=request.groq_api_key)
+    session = await get_or_create_session(groq_api_key=request.groq_api_key)
     return SessionResponse(
         session_id=session["id"],
         message="Session initialized successfully"
@@ -81,10 +272,10 @@ async def init_session(request: InitSessionRequest):
 @app.get("/api/session/{session_id}", response_model=SessionInfo)
 async def get_session_info(session_id: str):
     """Get session information"""
-    if session_id not in sessions:
+    session = await sessions.load(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = sessions[session_id]
     documents = [
         DocumentInfo(filename=filename, processed=processed)
         for filename, processed in session["processed_files"].items()
@@ -96,191 +287,395 @@ async def get_session_info(session_id: str):
         is_indexed=session["is_indexed"]
     )
 
+async def process_ingestion_job(job: IngestionJob):
+    """Parse -> embed -> insert pipeline run by the ingestion workers"""
+    # Pinned so the session is not spilled mid-ingest
+    async with sessions.use(job.session_id) as session:
+        if session is None:
+            raise RuntimeError("Session no longer exists")
+        with trace_request("ingest", session_id=job.session_id, request_id=job.id) as trace:
+            try:
+                await ingest_into_session(job, session)
+            finally:
+                job.timings = trace.breakdown() if trace else None
+
+async def ingest_into_session(job: IngestionJob, session: dict):
+    async with session["ingest_lock"]:
+        job.update(stage="ingesting")
+        embeddata = await run_embed(
+            EmbedData,
+            embed_model_name="BAAI/bge-m3",
+            batch_size=batch_size
+        )
+        
+        first_ingest = session["milvus_vdb"] is None
+        if first_ingest:
+            if MILVUS_TENANCY == "shared":
+                # One client and collection for all sessions, rows tagged with session_id
+                db_file = shared_db_file()
+                # Sparse rows need their own schema
+                collection_name = "docs_shared_sparse" if embeddata.sparse else "docs_shared"
+                tenant_id = job.session_id
+            else:
+                db_file = session_db_file(job.session_id)
+                collection_name = f"docs_{job.session_id}"
+                tenant_id = None
+            milvus_vdb = MilvusVDB_BQ(
+                collection_name=collection_name,
+                batch_size=batch_size,
+                vector_dim=embeddata.vector_dim,
+                db_file=db_file,
+                rescore_store=RescoreStore(rescore_path(job.session_id), dim=embeddata.vector_dim),
+                tenant_id=tenant_id,
+                sparse=embeddata.sparse
+            )
+            await run_milvus(milvus_vdb.define_client)
+            await run_milvus(milvus_vdb.create_collection, drop_existing=True)
+        else:
+            milvus_vdb = session["milvus_vdb"]
+        
+        # Rows of files that were never fully ingested can be rolled back safely
+        new_filenames = [name for name in job.filenames if not session["processed_files"].get(name)]
+        try:
+            # Parsers read the uploaded buffers directly. The job hands each buffer
+            # over as it is consumed, so it is freed once its file is parsed.
+            sources = ((file.pop("data"), file["filename"]) for file in job.files)
+            
+            # Pages are chunked and stream through parse -> embed -> insert; stages overlap
+            records = iter_page_records(
+                sources,
+                on_file_parsed=lambda _: job.update(files_parsed=1),
+                on_page_parsed=lambda: job.update(pages_parsed=1),
+                on_file_failed=job.fail_file
+            )
+            total_inserted = await run_pipeline(
+                embeddata.chunk_records(records),
+                embeddata,
+                milvus_vdb,
+                batch_size=batch_size,
+                on_parsed=lambda n: job.update(chunks_parsed=n),
+                on_embedded=lambda n: job.update(vectors_embedded=n),
+                on_inserted=lambda n: job.update(rows_inserted=n)
+            )
+            
+            if not total_inserted:
+                raise ValueError("No text could be extracted from PDFs")
+        except Exception:
+            if first_ingest:
+                if milvus_vdb.tenant_id is not None:
+                    await run_milvus(milvus_vdb.delete_tenant)
+                await run_milvus(milvus_vdb.close)
+            else:
+                await run_milvus(milvus_vdb.delete_by_filenames, new_filenames)
+            raise
+        
+        if first_ingest:
+            session["milvus_vdb"] = milvus_vdb
+            session["embeddata"] = embeddata
+        if session["query_engine"] is None:
+            session["query_engine"] = build_query_engine(milvus_vdb, session["embeddata"], job.groq_api_key or session["groq_api_key"])
+        
+        # Mark files as processed; skipped files stay unprocessed so a retry re-parses them
+        for file in job.files:
+            if file["filename"] in job.file_errors:
+                continue
+            session["processed_files"][file["filename"]] = True
+            session["ingested_hashes"][file["content_hash"]] = file["filename"]
+        
+        session["is_indexed"] = True
+    await sessions.save(job.session_id)
+
+ingestion_queue = IngestionQueue(handler=process_ingestion_job)
+
+async def read_upload(file: UploadFile):
+    """Read an uploaded file in chunks into one buffer, hashing as it goes; returns (data, sha256 hex)"""
+    limit = MAX_UPLOAD_FILE_MB * 1024 * 1024
+    digest = hashlib.sha256()
+    data = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if len(data) + len(chunk) > limit:
+            raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {MAX_UPLOAD_FILE_MB:.0f} MB")
+        digest.update(chunk)
+        data += chunk
+    await file.close()
+    return data, digest.hexdigest()
+
 @app.post("/api/upload")
 async def upload_documents(
     session_id: str,
     groq_api_key: str,
     files: List[UploadFile] = File(...)
 ):
-    """Upload and process PDF documents"""
+    """Queue PDF documents for background processing and return a job id"""
+    session = None
     try:
-        session = get_or_create_session(session_id, groq_api_key)
-        collection_name = f"docs_{session_id}"
+        created = await get_or_create_session(session_id, groq_api_key)
+        # Pinned while the files are read, so a spill cannot leave the updates below on an orphaned dict
+        session = await sessions.acquire(created["id"])
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
         
-        # Filter new files
-        new_files = [f for f in files if f.filename not in session["processed_files"]]
+        # Files already ingested (by content) or waiting in an active job are skipped,
+        # so a client retry never re-does finished work
+        pending = {}
+        for active_job in ingestion_queue.active_jobs(session["id"]):
+            for content_hash in active_job.content_hashes:
+                pending[content_hash] = active_job
+        
+        new_files = []
+        pending_jobs = []
+        request_bytes = 0
+        for file in files:
+            data, content_hash = await read_upload(file)
+            request_bytes += len(data)
+            if request_bytes > MAX_UPLOAD_REQUEST_MB * 1024 * 1024:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_REQUEST_MB:.0f} MB")
+            if content_hash in session["ingested_hashes"]:
+                continue
+            if content_hash in pending:
+                if pending[content_hash] not in pending_jobs:
+                    pending_jobs.append(pending[content_hash])
+                continue
+            if any(f["content_hash"] == content_hash for f in new_files):
+                continue
+            new_files.append({"filename": file.filename, "content_hash": content_hash, "data": data})
         
         if not new_files:
+            if pending_jobs:
+                return JSONResponse(status_code=202, content={
+                    "message": "Files are already being processed",
+                    "job_id": pending_jobs[0].id,
+                    "status": pending_jobs[0].status,
+                    "processed_count": len(session["processed_files"])
+                })
             return JSONResponse(content={
                 "message": "All files already processed",
                 "processed_count": len(session["processed_files"])
             })
         
-        # Save files and process
-        with tempfile.TemporaryDirectory() as temp_dir:
-            for file in new_files:
-                file_path = os.path.join(temp_dir, file.filename)
-                with open(file_path, "wb") as f:
-                    content = await file.read()
-                    f.write(content)
-            
-            # Load documents
-            loader = SimpleDirectoryReader(
-                input_dir=temp_dir,
-                required_exts=[".pdf"],
-                recursive=True
-            )
-            
-            docs = loader.load_data()
-            documents = [doc.text for doc in docs]
-            
-            # Extract metadata
-            metadata = []
-            for doc in docs:
-                filename = "unknown"
-                page = 0
-                
-                if hasattr(doc, 'metadata') and doc.metadata:
-                    if 'file_name' in doc.metadata:
-                        filename = doc.metadata['file_name']
-                    elif 'source' in doc.metadata:
-                        filename = doc.metadata['source'].split('/')[-1] if '/' in doc.metadata['source'] else doc.metadata['source']
-                    
-                    if 'page_label' in doc.metadata:
-                        try:
-                            page = int(doc.metadata['page_label'])
-                        except (ValueError, TypeError):
-                            page = 0
-                    elif 'page' in doc.metadata:
-                        try:
-                            page = int(doc.metadata['page'])
-                        except (ValueError, TypeError):
-                            page = 0
-                
-                if filename == "unknown" and new_files:
-                    filename = new_files[0].filename
-                
-                metadata.append({
-                    "filename": filename,
-                    "page": page + 1
-                })
-            
-            if not documents:
-                raise HTTPException(status_code=400, detail="No text could be extracted from PDFs")
-            
-            # Process embeddings
-            if session["query_engine"] is None:
-                # First time setup
-                embeddata = EmbedData(
-                    embed_model_name="BAAI/bge-m3",
-                    batch_size=batch_size
-                )
-                embeddata.embed(documents, metadata)
-                
-                db_file = os.path.join(tempfile.gettempdir(), f"milvus_{session_id}.db")
-                test_embedding = embeddata.embed_model.encode("test")
-                actual_dim = len(test_embedding)
-                
-                milvus_vdb = MilvusVDB_BQ(
-                    collection_name=collection_name,
-                    batch_size=batch_size,
-                    vector_dim=actual_dim,
-                    db_file=db_file
-                )
-                
-                milvus_vdb.define_client()
-                milvus_vdb.create_collection(drop_existing=True)
-                milvus_vdb.ingest_data(embeddata=embeddata)
-                
-                retriever = Retriever(vector_db=milvus_vdb, embeddata=embeddata)
-                query_engine = RAG(
-                    retriever=retriever,
-                    llm_model="moonshotai/kimi-k2-instruct",
-                    groq_api_key=groq_api_key or session["groq_api_key"]
-                )
-                
-                session["query_engine"] = query_engine
-                session["milvus_vdb"] = milvus_vdb
-                session["embeddata"] = embeddata
-            else:
-                # Add to existing collection
-                new_embeddata = EmbedData(
-                    embed_model_name="BAAI/bge-m3",
-                    batch_size=batch_size
-                )
-                new_embeddata.embed(documents, metadata)
-                session["milvus_vdb"].ingest_data(embeddata=new_embeddata)
-            
-            # Mark files as processed
-            for file in new_files:
-                session["processed_files"][file.filename] = True
-            
-            session["is_indexed"] = True
+        job = ingestion_queue.submit(IngestionJob(
+            session_id=session["id"],
+            files=new_files,
+            groq_api_key=groq_api_key
+        ))
+        for file in new_files:
+            session["processed_files"].setdefault(file["filename"], False)
         
-        return JSONResponse(content={
-            "message": f"Successfully processed {len(new_files)} document(s)",
+        return JSONResponse(status_code=202, content={
+            "message": f"Queued {len(new_files)} document(s) for processing",
+            "job_id": job.id,
+            "status": job.status,
             "processed_count": len(session["processed_files"]),
-            "new_files": [f.filename for f in new_files]
+            "new_files": job.filenames
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if session is not None:
+            sessions.release(session["id"])
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Get status and per-stage progress of an ingestion job"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running ingestion job"""
+    job = ingestion_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content={"message": "Cancellation requested", **job.to_dict()})
+
+@app.websocket("/ws/jobs/{job_id}")
+async def websocket_job_progress(websocket: WebSocket, job_id: str):
+    """WebSocket endpoint streaming ingestion job progress until it finishes"""
+    await websocket.accept()
+    
+    try:
+        job = ingestion_queue.get(job_id)
+        if job is None:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Job not found"
+            })
+            return
+        
+        async for snapshot in job.watch():
+            done = snapshot["status"] in TERMINAL_STATES
+            await websocket.send_json({"type": "done" if done else "progress", **snapshot})
+    
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            await websocket.close()
+        except:
+            pass
 
 @app.post("/api/query")
 async def query_documents(request: QueryRequest):
     """Query documents (non-streaming)"""
+    session = None
     try:
-        if request.session_id not in sessions:
+        # Pinned (and rehydrated if it was spilled) for the duration of the request
+        session = await sessions.acquire(request.session_id)
+        if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        session = sessions[request.session_id]
+        adopt_api_key(session, request.groq_api_key)
         
         if not session["is_indexed"] or session["query_engine"] is None:
             raise HTTPException(status_code=400, detail="Please upload and process documents first")
         
         query_engine = session["query_engine"]
         
-        # Generate context and response
-        start_time = time.perf_counter()
-        context_text, citations = query_engine.generate_context_with_citations(query=request.query)
-        retrieval_time = time.perf_counter() - start_time
-        
-        prompt_text = query_engine.prompt_template.format(context=context_text, query=request.query)
-        response = query_engine.llm.complete(prompt_text)
-        
-        response_text = response.text
-        
-        # Append citations if available
-        if citations and "Citation:" not in response_text:
-            citation_text = f"\n\nCitation: {', '.join(citations)}"
-            response_text += citation_text
-        
-        return JSONResponse(content={
-            "response": response_text,
-            "retrieval_time_ms": int(retrieval_time * 1000),
-            "citations": citations
-        })
+        with trace_request("query", session_id=request.session_id) as trace:
+            # Generate context and response
+            start_time = time.perf_counter()
+            cache_generation = query_engine.cache_generation()
+            cached, query_embedding = await run_milvus(query_engine.lookup_answer, request.query)
+            if cached:
+                response_text, citations = cached
+                retrieval_time = time.perf_counter() - start_time
+            else:
+                context_text, citations = await run_milvus(
+                    query_engine.generate_context_with_citations,
+                    query=request.query,
+                    query_embedding=query_embedding
+                )
+                retrieval_time = time.perf_counter() - start_time
+
+                with span("prompt_build"):
+                    prompt_text = query_engine.prompt_template.format(context=context_text, query=request.query)
+                with span("llm_total"):
+                    response_text = await llm_gateway.complete(query_engine.groq_api_key, query_engine.llm_model, prompt_text)
+
+                query_engine.store_answer(request.query, query_embedding, response_text, citations, cache_generation)
+            
+            # Append citations if available
+            if citations and "Citation:" not in response_text:
+                citation_text = f"\n\nCitation: {', '.join(citations)}"
+                response_text += citation_text
+            
+            return JSONResponse(content={
+                "response": response_text,
+                "retrieval_time_ms": int(retrieval_time * 1000),
+                "citations": citations,
+                "cached": cached is not None,
+                "timings": trace.breakdown() if trace else None
+            })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if session is not None:
+            sessions.release(request.session_id)
+
+@app.post("/api/query/batch")
+async def query_documents_batch(request: BatchQueryRequest):
+    """Answer several queries with one batched encode and one Milvus search per retrieval stage"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    session = None
+    try:
+        session = await sessions.acquire(request.session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        adopt_api_key(session, request.groq_api_key)
+
+        if not session["is_indexed"] or session["query_engine"] is None:
+            raise HTTPException(status_code=400, detail="Please upload and process documents first")
+
+        query_engine = session["query_engine"]
+        queries = request.queries
+
+        with trace_request("query_batch", session_id=request.session_id) as trace:
+            start_time = time.perf_counter()
+            cache_generation = query_engine.cache_generation()
+            # Cached answers were built from DEFAULT_TOP_K passages; another top_k neither reads nor fills the cache
+            if request.answer and request.top_k == DEFAULT_TOP_K:
+                cached, query_embeddings = await run_milvus(query_engine.lookup_answers, queries)
+            else:
+                cached, query_embeddings = [None] * len(queries), None
+            missing = [i for i, entry in enumerate(cached) if entry is None]
+            contexts = await run_milvus(
+                query_engine.generate_contexts_with_citations,
+                [queries[i] for i in missing],
+                top_k=request.top_k,
+                query_embeddings=None if query_embeddings is None else query_embeddings[missing]
+            ) if missing else []
+            retrieval_time = time.perf_counter() - start_time
+
+            results = [None] * len(queries)
+            for i, entry in enumerate(cached):
+                if entry is not None:
+                    response_text, citations = entry
+                    results[i] = {"query": queries[i], "response": response_text, "citations": citations, "cached": True}
+
+            async def answer(i, context_text, citations):
+                with span("prompt_build"):
+                    prompt_text = query_engine.prompt_template.format(context=context_text, query=queries[i])
+                response_text = await llm_gateway.complete(query_engine.groq_api_key, query_engine.llm_model, prompt_text)
+                if query_embeddings is not None:
+                    query_engine.store_answer(queries[i], query_embeddings[i], response_text, citations, cache_generation)
+                return response_text
+
+            if request.answer:
+                # The gateway caps concurrent completions per key and per process
+                with span("llm_total"):
+                    answers = await asyncio.gather(*(
+                        answer(i, context_text, citations) for i, (context_text, citations) in zip(missing, contexts)
+                    ))
+            for position, (i, (context_text, citations)) in enumerate(zip(missing, contexts)):
+                results[i] = {"query": queries[i], "citations": citations, "cached": False}
+                if request.answer:
+                    response_text = answers[position]
+                    if citations and "Citation:" not in response_text:
+                        response_text += f"\n\nCitation: {', '.join(citations)}"
+                    results[i]["response"] = response_text
+                else:
+                    results[i]["context"] = context_text
+
+            return JSONResponse(content={
+                "results": results,
+                "retrieval_time_ms": int(retrieval_time * 1000),
+                "queries_per_second": round(len(queries) / retrieval_time, 1) if retrieval_time else None,
+                "timings": trace.breakdown() if trace else None
+            })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if session is not None:
+            sessions.release(request.session_id)
 
 @app.websocket("/ws/chat/{session_id}")
 async def websocket_chat(websocket: WebSocket, session_id: str):
     """WebSocket endpoint for streaming chat responses"""
     await websocket.accept()
-    
+
+    session = None
     try:
-        if session_id not in sessions:
+        session = await sessions.acquire(session_id)
+        if session is None:
             await websocket.send_json({
                 "type": "error",
                 "message": "Session not found"
             })
             await websocket.close()
             return
-        
-        session = sessions[session_id]
-        
-        if not session["is_indexed"] or session["query_engine"] is None:
+
+        if not session["is_indexed"]:
             await websocket.send_json({
                 "type": "error",
                 "message": "Please upload and process documents first"
@@ -288,12 +683,20 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
             await websocket.close()
             return
         
-        query_engine = session["query_engine"]
-        
         # Receive query from client
         data = await websocket.receive_text()
         query_data = json.loads(data)
         query = query_data.get("query", "")
+        # A session restored after a restart gets its engine once a key is known
+        adopt_api_key(session, query_data.get("groq_api_key"))
+        
+        query_engine = session["query_engine"]
+        if query_engine is None:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Groq API key is required"
+            })
+            return
         
         if not query:
             await websocket.send_json({
@@ -302,58 +705,51 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
             })
             return
         
-        # Generate context
-        start_time = time.perf_counter()
-        context_text, citations = query_engine.generate_context_with_citations(query=query)
-        retrieval_time = time.perf_counter() - start_time
-        
-        # Send retrieval time
-        await websocket.send_json({
-            "type": "retrieval",
-            "retrieval_time_ms": int(retrieval_time * 1000)
-        })
-        
-        # Stream response
-        prompt_text = query_engine.prompt_template.format(context=context_text, query=query)
-        streaming_response = query_engine.llm.stream_complete(prompt_text)
-        
-        full_response = ""
-        for chunk in streaming_response:
-            try:
-                if hasattr(chunk, 'delta') and chunk.delta:
-                    new_text = chunk.delta
-                elif hasattr(chunk, 'text') and chunk.text is not None:
-                    candidate = chunk.text
-                    if candidate.startswith(full_response):
-                        new_text = candidate[len(full_response):]
-                    else:
-                        new_text = candidate
-                else:
-                    candidate = str(chunk)
-                    new_text = candidate if not candidate.startswith(full_response) else ""
-                
-                if new_text:
-                    full_response += new_text
-                    await websocket.send_json({
-                        "type": "chunk",
-                        "content": new_text
-                    })
-            except Exception:
-                continue
-        
-        # Send citations
-        if citations and "Citation:" not in full_response:
-            citation_text = f"\n\nCitation: {', '.join(citations)}"
+        with trace_request("chat", session_id=session_id) as trace:
+            # Generate context (or reuse an answer to the same question)
+            start_time = time.perf_counter()
+            cache_generation = query_engine.cache_generation()
+            cached, query_embedding = await run_milvus(query_engine.lookup_answer, query)
+            if cached:
+                full_response, citations = cached
+            else:
+                context_text, citations = await run_milvus(
+                    query_engine.generate_context_with_citations,
+                    query=query,
+                    query_embedding=query_embedding
+                )
+            retrieval_time = time.perf_counter() - start_time
+            
+            # Send retrieval time
             await websocket.send_json({
-                "type": "chunk",
-                "content": citation_text
+                "type": "retrieval",
+                "retrieval_time_ms": int(retrieval_time * 1000)
+            })
+            
+            if cached:
+                await websocket.send_json({
+                    "type": "chunk",
+                    "content": full_response
+                })
+            else:
+                full_response = await stream_answer(websocket, query_engine, context_text, query)
+                query_engine.store_answer(query, query_embedding, full_response, citations, cache_generation)
+            
+            # Send citations
+            if citations and "Citation:" not in full_response:
+                citation_text = f"\n\nCitation: {', '.join(citations)}"
+                await websocket.send_json({
+                    "type": "chunk",
+                    "content": citation_text
+                })
+            
+            # Send completion signal
+            await websocket.send_json({
+                "type": "done",
+                "citations": citations,
+                "cached": cached is not None,
+                "timings": trace.breakdown() if trace else None
             })
-        
-        # Send completion signal
-        await websocket.send_json({
-            "type": "done",
-            "citations": citations
-        })
     
     except WebSocketDisconnect:
         pass
@@ -363,31 +759,83 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
             "message": str(e)
         })
     finally:
+        if session is not None:
+            sessions.release(session_id)
         try:
             await websocket.close()
         except:
             pass
 
+async def stream_answer(websocket: WebSocket, query_engine, context_text: str, query: str):
+    """Stream the LLM answer to the client as chunk messages; returns the full text"""
+    with span("prompt_build"):
+        prompt_text = query_engine.prompt_template.format(context=context_text, query=query)
+
+    async def send_frame(frame):
+        await websocket.send_json({
+            "type": "chunk",
+            "content": frame
+        })
+
+    return await relay(llm_gateway.stream(query_engine.groq_api_key, query_engine.llm_model, prompt_text), send_frame)
+
 @app.delete("/api/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session and cleanup resources"""
-    if session_id in sessions:
-        session = sessions[session_id]
-        # Cleanup
-        if session["milvus_vdb"]:
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    for job in ingestion_queue.active_jobs(session_id):
+        ingestion_queue.cancel(job.id)
+    try:
+        # A spilled session is rehydrated so its clients and rows can be released
+        session = await sessions.load(session_id)
+    except Exception as e:
+        # A missing or corrupt manifest must not make the session undeletable; its own files go by name
+        logger.warning(f"Session {session_id} could not be reopened for deletion: {e}")
+        remove_files(session_db_file(session_id), rescore_path(session_id))
+    else:
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        milvus_vdb = session["milvus_vdb"]
+        if milvus_vdb:
             try:
-                session["milvus_vdb"].client.close()
+                # Shared collection: a filtered delete of this session's rows
+                if milvus_vdb.tenant_id is not None:
+                    await run_milvus(milvus_vdb.delete_tenant)
+                await run_milvus(milvus_vdb.close)
             except:
                 pass
-        del sessions[session_id]
-        gc.collect()
-        return JSONResponse(content={"message": "Session deleted successfully"})
-    raise HTTPException(status_code=404, detail="Session not found")
+            query_caches.drop(milvus_vdb.cache_key)
+            # The data directory persists, so a deleted session's files must go with it
+            rescore_store = milvus_vdb.rescore_store
+            remove_files(
+                milvus_vdb.db_file if milvus_vdb.tenant_id is None else None,
+                rescore_store.path if rescore_store is not None else None
+            )
+    # Also drops the stored manifest
+    await sessions.remove(session_id)
+    gc.collect()
+    return JSONResponse(content={"message": "Session deleted successfully"})
+
+@app.get("/metrics")
+async def metrics():
+    """Stage histograms and counters in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "active_sessions": len(sessions)}
+    return {
+        "status": "healthy",
+        "active_sessions": len(sessions),
+        "sessions": sessions.stats(),
+        "active_jobs": len(ingestion_queue.active_jobs()),
+        "loaded_models": [list(key) for key in model_registry.loaded()],
+        "query_cache": query_caches.stats(),
+        "embedding_cache": embedding_caches.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "reranker": get_reranker().stats() if RERANKER_ENABLED else None
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,60 @@
+import os
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Padded tokens (rows x longest row) allowed in one encoder forward pass
+EMBED_TOKEN_BUDGET = int(os.getenv("EMBED_TOKEN_BUDGET", "16384"))
+# Upper bound on rows per forward pass, however short they are
+EMBED_MAX_BATCH_ROWS = int(os.getenv("EMBED_MAX_BATCH_ROWS", "256"))
+
+def token_lengths(model, texts):
+    """Tokens per text as the encoder will see them (special tokens included, truncated)"""
+    tokenizer = getattr(model, "tokenizer", None)
+    max_length = getattr(model, "max_seq_length", None)
+    if tokenizer is None:
+        return np.array([len(text) for text in texts], dtype=np.int64)
+    encoding = tokenizer(
+        list(texts),
+        add_special_tokens=True,
+        truncation=max_length is not None,
+        max_length=max_length,
+        return_attention_mask=False,
+        return_token_type_ids=False
+    )
+    return np.array([len(ids) for ids in encoding["input_ids"]], dtype=np.int64)
+
+def plan_batches(lengths, token_budget=EMBED_TOKEN_BUDGET, max_rows=EMBED_MAX_BATCH_ROWS):
+    """Group indices into batches of similar length under a padded-token budget.
+
+    Indices are visited shortest first; a batch is closed when adding the next
+    row would push rows x longest row over token_budget or the batch reaches
+    max_rows. A single row longer than the budget gets a batch of its own.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        if end == len(order):
+            batches.append(order[start:end])
+            break
+        rows = end - start + 1
+        # Sorted ascending, so the next row is the longest of the extended batch
+        if rows > max_rows or rows * lengths[order[end]] > token_budget:
+            batches.append(order[start:end])
+            start = end
+    return batches
+
+def encode_bucketed(model, texts, token_budget=EMBED_TOKEN_BUDGET, max_rows=EMBED_MAX_BATCH_ROWS):
+    """Encode texts in length-bucketed, token-budgeted batches; rows come back in input order"""
+    if not len(texts):
+        return np.empty((0, model.get_sentence_embedding_dimension() or 0), dtype=np.float32)
+    lengths = token_lengths(model, texts)
+    embeddings = None
+    for batch in plan_batches(lengths, token_budget, max_rows):
+        encoded = model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+        embeddings[batch] = encoded
+    return embeddings
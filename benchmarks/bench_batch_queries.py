@@ -0,0 +1,91 @@
+"""Retrieval throughput of Retriever.search_many vs. a loop over Retriever.search.
+
+Ingests synthetic pages (or a fixture PDF directory) into a temporary
+collection. For each batch size N, the same N queries are run both ways: one
+search() call per query, and one search_many() call. search_many() uses one
+encoder pass and one Milvus search per retrieval stage. Both sides are
+checked to return identical result ids. --mock-encoder swaps bge-m3 for the
+hashed bag-of-words encoder of bench_suite.py, so the script runs offline.
+
+Usage:
+    python benchmarks/bench_batch_queries.py --mock-encoder --pages 5000
+    python benchmarks/bench_batch_queries.py --pages 2000 --sizes 1 8 64 256 --no-rescore
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+
+from bench_ingestion_memory import synthetic_pages, pdf_pages
+from bench_chunking import synthetic_queries
+from bench_suite import make_embeddata_class
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--mock-encoder", action="store_true")
+    parser.add_argument("--no-rescore", action="store_true")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64, 128, 256])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    from rag import MilvusVDB_BQ, Retriever
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+
+    embeddata = make_embeddata_class(args.mock_encoder)(embed_model_name=args.model, use_cache=False, sparse=False)
+    pages = pdf_pages(args.pdf_dir) if args.pdf_dir else synthetic_pages(args.pages)
+    queries = synthetic_queries(max(args.sizes) * args.repeats, seed=1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=embeddata.vector_dim,
+            db_file=os.path.join(temp_dir, "bench.db"),
+            rescore_store=None if args.no_rescore else RescoreStore(os.path.join(temp_dir, "rescore"), dim=embeddata.vector_dim)
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        rows = asyncio.run(run_pipeline(embeddata.chunk_records(pages), embeddata, vdb))
+        retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+        retriever.search_many(queries[:8])
+
+        for size in args.sizes:
+            loop_seconds = batch_seconds = 0.0
+            mismatches = 0
+            for repeat in range(args.repeats):
+                batch = queries[repeat * size:(repeat + 1) * size]
+                start = time.perf_counter()
+                looped = [retriever.search(query) for query in batch]
+                loop_seconds += time.perf_counter() - start
+                start = time.perf_counter()
+                batched = retriever.search_many(batch)
+                batch_seconds += time.perf_counter() - start
+                mismatches += sum(
+                    [r["id"] for r in a] != [r["id"] for r in b] for a, b in zip(looped, batched)
+                )
+            total = size * args.repeats
+            print(json.dumps({
+                "n": size,
+                "rows": rows,
+                "rescore": not args.no_rescore,
+                "loop_qps": round(total / loop_seconds, 1),
+                "batch_qps": round(total / batch_seconds, 1),
+                "speedup": round(loop_seconds / batch_seconds, 2),
+                "batch_ms": round(batch_seconds / args.repeats * 1000, 1),
+                "mismatched_queries": mismatches,
+            }))
+        vdb.client.close()
+
+if __name__ == "__main__":
+    main()
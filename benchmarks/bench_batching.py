@@ -0,0 +1,82 @@
+"""Encoder throughput: fixed row-count batches vs. length-bucketed token-budget batches.
+
+"fixed" is the previous EmbedData behaviour: inputs are cut into slices of
+--batch-size rows in input order and each slice goes to model.encode with its
+default batch size. "bucketed" plans batches with batching.encode_bucketed
+under --token-budget padded tokens. The default corpus mixes near-empty,
+short and page-length texts; pass --pdf-dir to use real PDF pages (add
+--chunk to run them through the chunker first).
+
+Usage:
+    python benchmarks/bench_batching.py --texts 2000
+    python benchmarks/bench_batching.py --pdf-dir ./corpus --chunk
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_ingestion_memory import WORDS, pdf_pages
+
+def mixed_texts(n_texts, seed=0):
+    """Heavy-tailed lengths: mostly short texts with a few page-sized ones"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_texts):
+        n_words = rng.choice([rng.randint(1, 20), rng.randint(20, 120), rng.randint(300, 900)])
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(n_words)))
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--chunk", action="store_true")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--token-budget", type=int, default=16384)
+    parser.add_argument("--max-rows", type=int, default=256)
+    args = parser.parse_args()
+
+    from rag import EmbedData
+    from batching import encode_bucketed, token_lengths
+
+    embeddata = EmbedData(embed_model_name=args.model, batch_size=args.batch_size, use_cache=False)
+    model = embeddata.embed_model
+    model.encode("warm up")
+
+    if args.pdf_dir:
+        records = pdf_pages(args.pdf_dir)
+        if args.chunk:
+            records = embeddata.chunk_records(records)
+        texts = [text for text, _ in records]
+    else:
+        texts = mixed_texts(args.texts)
+    lengths = token_lengths(model, texts)
+
+    start = time.perf_counter()
+    fixed = np.concatenate([model.encode(texts[i:i + args.batch_size]) for i in range(0, len(texts), args.batch_size)])
+    fixed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bucketed = encode_bucketed(model, texts, token_budget=args.token_budget, max_rows=args.max_rows)
+    bucketed_seconds = time.perf_counter() - start
+
+    cosine = np.sum(fixed * bucketed, axis=1) / (np.linalg.norm(fixed, axis=1) * np.linalg.norm(bucketed, axis=1))
+    print(json.dumps({
+        "texts": len(texts),
+        "tokens_mean": round(float(lengths.mean()), 1),
+        "tokens_max": int(lengths.max()),
+        "fixed_texts_per_second": round(len(texts) / fixed_seconds, 1),
+        "bucketed_texts_per_second": round(len(texts) / bucketed_seconds, 1),
+        "speedup": round(fixed_seconds / bucketed_seconds, 2),
+        "min_cosine_vs_fixed": round(float(cosine.min()), 6),
+    }))
+
+if __name__ == "__main__":
+    main()
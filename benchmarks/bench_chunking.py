@@ -0,0 +1,100 @@
+"""Embedding throughput and prompt context size: whole pages vs. token-budgeted chunks.
+
+"pages" embeds each PDF page's text as one vector (the old behaviour); "chunks"
+runs the pages through EmbedData.chunk_records first. For each mode the script
+reports encoder throughput (pages and vectors per second, embedding cache
+disabled) and, after ingesting into a temporary Milvus Lite collection, the
+number of model tokens in the top-k context handed to the LLM per query.
+
+Usage:
+    python benchmarks/bench_chunking.py --pages 500
+    python benchmarks/bench_chunking.py --pdf-dir ./corpus --queries-file queries.txt
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_ingestion_memory import WORDS, synthetic_pages, pdf_pages
+
+def synthetic_queries(n_queries, seed=1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))) for _ in range(n_queries)]
+
+def run_mode(mode, pages, queries, embeddata, args):
+    from rag import MilvusVDB_BQ, Retriever
+    from pipeline import run_pipeline
+
+    records = embeddata.chunk_records(pages) if mode == "chunks" else pages
+    records = list(records)
+    tokenizer = embeddata.embed_model.tokenizer
+
+    start = time.perf_counter()
+    for i in range(0, len(records), args.batch_size):
+        embeddata.embed_batch([text for text, _ in records[i:i + args.batch_size]])
+    embed_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=embeddata.vector_dim,
+            batch_size=args.batch_size,
+            db_file=os.path.join(temp_dir, "bench.db")
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        asyncio.run(run_pipeline(records, embeddata, vdb, batch_size=args.batch_size))
+
+        retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+        context_tokens = []
+        for query in queries:
+            results = retriever.search(query)
+            # Same joining as RAG.generate_context_with_citations
+            context = "\n\n---\n\n".join(entry["payload"]["context"] for entry in results)
+            context_tokens.append(len(tokenizer(context, add_special_tokens=False)["input_ids"]))
+        vdb.client.close()
+
+    return {
+        "mode": mode,
+        "pages": len(pages),
+        "vectors": len(records),
+        "embed_seconds": round(embed_seconds, 2),
+        "pages_per_second": round(len(pages) / embed_seconds, 1),
+        "vectors_per_second": round(len(records) / embed_seconds, 1),
+        "context_tokens_per_query": round(sum(context_tokens) / max(len(context_tokens), 1), 1),
+        "max_context_tokens": max(context_tokens, default=0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--queries-file")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    from rag import EmbedData
+
+    pages = list(pdf_pages(args.pdf_dir) if args.pdf_dir else synthetic_pages(args.pages))
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = synthetic_queries(args.queries)
+
+    embeddata = EmbedData(embed_model_name=args.model, batch_size=args.batch_size, use_cache=False)
+    embeddata.generate_embedding("warm up")
+    for mode in ("pages", "chunks"):
+        print(json.dumps(run_mode(mode, pages, queries, embeddata, args)))
+
+if __name__ == "__main__":
+    main()
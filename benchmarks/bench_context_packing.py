@@ -0,0 +1,123 @@
+"""Prompt tokens and time to first token with and without context packing.
+
+Ingests synthetic pages (or a fixture PDF directory) and, for every query,
+builds the prompt twice. The unpacked prompt joins the top-k passages as
+they are; the packed one goes through ContextPacker. Prompt tokens are
+counted with context_packing.count_tokens (tiktoken, or a length estimate
+when it is unavailable). With --base-url, the first --ttft-queries prompts
+of each kind are also streamed through the LLM gateway to measure TTFT.
+Point it at Groq, or at benchmarks/mock_llm_server.py with
+--prefill-tokens-per-second to model prefill cost offline.
+
+Usage:
+    python benchmarks/bench_context_packing.py --mock-encoder --pages 2000 --queries 200
+    python benchmarks/mock_llm_server.py --prefill-tokens-per-second 2000 &
+    python benchmarks/bench_context_packing.py --mock-encoder --base-url http://127.0.0.1:8100/v1 --budget 1500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+
+from bench_ingestion_memory import synthetic_pages, pdf_pages
+from bench_chunking import synthetic_queries
+from bench_suite import make_embeddata_class
+
+def summarize(values):
+    return {
+        "mean": round(float(np.mean(values)), 1),
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+    }
+
+async def measure_ttft(base_url, api_key, model, prompts):
+    from llm_gateway import LLMGateway
+
+    gateway = LLMGateway(base_url=base_url)
+    ttfts = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        async for _ in gateway.stream(api_key, model, prompt, max_tokens=8):
+            ttfts.append((time.perf_counter() - start) * 1000)
+            break
+    await gateway.close()
+    return ttfts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--queries-file")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--mock-encoder", action="store_true")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget", type=int, help="Context token budget (default CONTEXT_TOKEN_BUDGET)")
+    parser.add_argument("--base-url")
+    parser.add_argument("--api-key", default=os.getenv("GROQ_API_KEY") or "mock-key")
+    parser.add_argument("--llm-model", default="moonshotai/kimi-k2-instruct")
+    parser.add_argument("--ttft-queries", type=int, default=20)
+    args = parser.parse_args()
+
+    from rag import MilvusVDB_BQ, Retriever, RAG
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+    from context_packing import count_tokens, CONTEXT_TOKEN_BUDGET
+
+    embeddata = make_embeddata_class(args.mock_encoder)(embed_model_name=args.model, use_cache=False, sparse=False)
+    pages = pdf_pages(args.pdf_dir) if args.pdf_dir else synthetic_pages(args.pages)
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = synthetic_queries(args.queries)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=embeddata.vector_dim,
+            db_file=os.path.join(temp_dir, "bench.db"),
+            rescore_store=RescoreStore(os.path.join(temp_dir, "rescore"), dim=embeddata.vector_dim)
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        rows = asyncio.run(run_pipeline(embeddata.chunk_records(pages), embeddata, vdb))
+        retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+
+        reports = {}
+        for mode in ("unpacked", "packed"):
+            rag = RAG(retriever=retriever, groq_api_key="offline", expansion="off", packing=mode == "packed")
+            if rag.packer is not None and args.budget:
+                rag.packer.token_budget = args.budget
+            prompts, tokens, build_ms = [], [], []
+            for query in queries:
+                start = time.perf_counter()
+                context_text, _ = rag.generate_context_with_citations(query, top_k=args.top_k)
+                prompt = rag.prompt_template.format(context=context_text, query=query)
+                build_ms.append((time.perf_counter() - start) * 1000)
+                prompts.append(prompt)
+                tokens.append(count_tokens(prompt))
+            reports[mode] = {"prompt_tokens": summarize(tokens), "context_build_ms": summarize(build_ms)}
+            if args.base_url:
+                ttfts = asyncio.run(measure_ttft(args.base_url, args.api_key, args.llm_model, prompts[:args.ttft_queries]))
+                reports[mode]["ttft_ms"] = summarize(ttfts)
+        vdb.client.close()
+
+    print(json.dumps({
+        "rows": rows,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "token_budget": args.budget or CONTEXT_TOKEN_BUDGET,
+        **reports,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Parity and throughput of the embedding backends: torch fp32 vs. ONNX Runtime vs. ONNX int8.
+
+Every backend encodes the same corpus and queries. Against the torch fp32
+reference the script reports the cosine between the two embeddings of each
+text and the overlap of exact top-k retrieval (recall@k of the reference
+results). It exits non-zero when any backend drifts more than --max-drift
+(1 - min cosine) or falls below --min-recall, so it doubles as a parity check
+after a model or onnxruntime upgrade. ONNX exports are cached under ./hf_cache.
+
+Usage:
+    python benchmarks/bench_encoder_backends.py --pages 300 --queries 100
+    python benchmarks/bench_encoder_backends.py --pdf-dir ./corpus --queries-file queries.txt
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_ingestion_memory import synthetic_pages, pdf_pages
+from bench_chunking import synthetic_queries
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def top_k(corpus, queries, k):
+    scores = normalize(queries) @ normalize(corpus).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def encode(embeddata, texts):
+    start = time.perf_counter()
+    vectors = np.asarray(embeddata.generate_embedding(texts), dtype=np.float32)
+    return vectors, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--queries-file")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-drift", type=float, default=0.05)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    args = parser.parse_args()
+
+    from rag import EmbedData
+
+    records = pdf_pages(args.pdf_dir) if args.pdf_dir else synthetic_pages(args.pages)
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = synthetic_queries(args.queries)
+
+    reference = None
+    failed = False
+    for backend in ["torch"] + [b for b in args.backends.split(",") if b != "torch"]:
+        embeddata = EmbedData(embed_model_name=args.model, backend=backend, precision="fp32", use_cache=False)
+        if reference is None:
+            # Chunk once with the reference tokenizer so every backend sees the same texts
+            texts = [text for text, _ in embeddata.chunk_records(records)]
+        embeddata.generate_embedding("warm up")
+
+        corpus, corpus_seconds = encode(embeddata, texts)
+        query_latencies = []
+        query_vectors = []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(embeddata.embed_model.encode(query))
+            query_latencies.append(time.perf_counter() - start)
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        results = top_k(corpus, query_vectors, args.top_k)
+
+        report = {
+            "backend": backend,
+            "texts": len(texts),
+            "texts_per_second": round(len(texts) / corpus_seconds, 1),
+            "query_ms_p50": round(float(np.percentile(query_latencies, 50)) * 1000, 1),
+            "query_ms_p95": round(float(np.percentile(query_latencies, 95)) * 1000, 1),
+        }
+        if reference is None:
+            reference = (corpus, query_vectors, results)
+        else:
+            ref_corpus, ref_queries, ref_results = reference
+            cosine = np.concatenate([
+                np.sum(normalize(corpus) * normalize(ref_corpus), axis=1),
+                np.sum(normalize(query_vectors) * normalize(ref_queries), axis=1),
+            ])
+            recall = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(results, ref_results)])
+            report.update({
+                "mean_cosine": round(float(cosine.mean()), 6),
+                "min_cosine": round(float(cosine.min()), 6),
+                f"recall@{args.top_k}": round(float(recall), 4),
+            })
+            if 1 - cosine.min() > args.max_drift or recall < args.min_recall:
+                failed = True
+        print(json.dumps(report))
+
+    if failed:
+        print(f"Parity check failed (max drift {args.max_drift}, min recall {args.min_recall})", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
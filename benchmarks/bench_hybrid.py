@@ -0,0 +1,118 @@
+"""Recall and latency of dense-only vs. hybrid (dense + bge-m3 lexical weights) retrieval.
+
+One sparse-enabled collection is built; the dense-only path is the same
+collection searched by a Retriever whose EmbedData has sparse disabled. The
+default corpus is synthetic pages, each mentioning one unique part number.
+Each query asks for a part number, and the page that mentions it is the one
+relevant result. That is the exact-term case dense vectors tend to miss.
+Pass --pdf-dir and --labels to use a real corpus. The labels file is JSONL
+with one {"query": ..., "relevant": [[filename, page], ...]} per line.
+
+Usage:
+    python benchmarks/bench_hybrid.py --pages 1000 --queries 200
+    python benchmarks/bench_hybrid.py --pdf-dir ./corpus --labels labels.jsonl --fusion weighted
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_ingestion_memory import WORDS, pdf_pages
+
+def part_number_corpus(n_pages, n_queries, seed=0):
+    rng = random.Random(seed)
+    pages, labels = [], []
+    for i in range(n_pages):
+        part = f"{rng.choice('ABCDEFGHJK')}{rng.choice('XYZ')}-{rng.randint(10000, 99999)}"
+        words = [rng.choice(WORDS) for _ in range(rng.randint(80, 300))]
+        words.insert(rng.randrange(len(words)), f"part {part}")
+        metadata = {"filename": f"catalog_{i // 50}.pdf", "page": i % 50 + 1}
+        pages.append((" ".join(words), metadata))
+        labels.append({"query": f"What is the warranty for part {part}?", "relevant": [[metadata["filename"], metadata["page"]]]})
+    return pages, rng.sample(labels, min(n_queries, len(labels)))
+
+def evaluate(retriever, labels, top_k):
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for label in labels:
+        relevant = {(filename, page) for filename, page in label["relevant"]}
+        start = time.perf_counter()
+        results = retriever.search(label["query"], top_k=top_k)
+        latencies.append(time.perf_counter() - start)
+        found = [(r["payload"]["filename"], r["payload"]["page"]) for r in results]
+        recalls.append(len(relevant & set(found)) / len(relevant))
+        rank = next((i + 1 for i, key in enumerate(found) if key in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)) * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--labels")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--fusion", choices=["rrf", "weighted"])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=128)
+    args = parser.parse_args()
+
+    if args.fusion:
+        # Read by sparse.py at import
+        os.environ["HYBRID_FUSION"] = args.fusion
+
+    from rag import EmbedData, MilvusVDB_BQ, Retriever
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+
+    if args.pdf_dir:
+        if not args.labels:
+            sys.exit("--pdf-dir needs --labels")
+        with open(args.labels) as f:
+            labels = [json.loads(line) for line in f if line.strip()]
+        pages = pdf_pages(args.pdf_dir)
+    else:
+        pages, labels = part_number_corpus(args.pages, args.queries)
+
+    sparse_embeddata = EmbedData(embed_model_name=args.model, batch_size=args.batch_size, use_cache=False, sparse=True)
+    dense_embeddata = EmbedData(embed_model_name=args.model, batch_size=args.batch_size, use_cache=False, sparse=False)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=sparse_embeddata.vector_dim,
+            batch_size=args.batch_size,
+            db_file=os.path.join(temp_dir, "bench.db"),
+            rescore_store=RescoreStore(os.path.join(temp_dir, "rescore"), dim=sparse_embeddata.vector_dim),
+            sparse=True
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        records = sparse_embeddata.chunk_records(pages)
+        start = time.perf_counter()
+        rows = asyncio.run(run_pipeline(records, sparse_embeddata, vdb, batch_size=args.batch_size))
+        ingest_seconds = time.perf_counter() - start
+
+        for mode, embeddata in (("dense", dense_embeddata), ("hybrid", sparse_embeddata)):
+            retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+            retriever.search("warm up")
+            report = {"mode": mode, "rows": rows, "queries": len(labels), "ingest_seconds": round(ingest_seconds, 1)}
+            if mode == "hybrid":
+                report["fusion"] = os.getenv("HYBRID_FUSION", "rrf")
+            report.update(evaluate(retriever, labels, args.top_k))
+            print(json.dumps(report))
+        vdb.client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Peak RSS and throughput: materialized ingestion vs. the streaming pipeline.
+
+"legacy" loads every page, embeds everything with EmbedData.embed and only then
+calls MilvusVDB_BQ.ingest_data. "pipeline" streams pages through
+pipeline.run_pipeline. Each mode runs in its own subprocess so ru_maxrss is the
+peak of that mode alone.
+
+Usage:
+    python benchmarks/bench_ingestion_memory.py --pages 2000
+    python benchmarks/bench_ingestion_memory.py --pdf-dir ./corpus
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+WORDS = (
+    "contract invoice payment delivery warranty supplier customer report annual revenue "
+    "clause liability termination schedule quantity price total tax section agreement"
+).split()
+
+def synthetic_pages(n_pages, seed=0):
+    """Yield (text, metadata) for n_pages pages of roughly 350 words each"""
+    rng = random.Random(seed)
+    for i in range(n_pages):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 550)))
+        yield text, {"filename": f"doc_{i // 100}.pdf", "page": i % 100 + 1}
+
+def pdf_pages(pdf_dir):
+    from pipeline import iter_page_records
+    files = [(os.path.join(pdf_dir, name), name) for name in sorted(os.listdir(pdf_dir)) if name.lower().endswith(".pdf")]
+    return iter_page_records(files)
+
+def make_vdb(embeddata, db_file, batch_size):
+    from rag import MilvusVDB_BQ
+    vdb = MilvusVDB_BQ(collection_name="bench", vector_dim=embeddata.vector_dim, batch_size=batch_size, db_file=db_file)
+    vdb.define_client()
+    vdb.create_collection(drop_existing=True)
+    return vdb
+
+def run_mode(args):
+    from rag import EmbedData
+    from pipeline import run_pipeline
+
+    embeddata = EmbedData(embed_model_name=args.model, batch_size=args.batch_size)
+    embeddata.generate_embedding("warm up")
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    records = pdf_pages(args.pdf_dir) if args.pdf_dir else synthetic_pages(args.pages)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = make_vdb(embeddata, os.path.join(temp_dir, "bench.db"), args.batch_size)
+        start = time.perf_counter()
+        if args.mode == "legacy":
+            records = list(records)
+            embeddata.embed([text for text, _ in records], [meta for _, meta in records])
+            vdb.ingest_data(embeddata)
+            total = len(records)
+        else:
+            total = asyncio.run(run_pipeline(records, embeddata, vdb, batch_size=args.batch_size))
+        elapsed = time.perf_counter() - start
+        vdb.client.close()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": args.mode,
+        "pages": total,
+        "seconds": round(elapsed, 2),
+        "pages_per_second": round(total / elapsed, 1),
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "peak_rss_over_model_mb": round((peak_rss - baseline_rss) / 1024, 1),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["legacy", "pipeline"])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    # Run each mode in a fresh interpreter so peak RSS is not shared
+    for mode in ("legacy", "pipeline"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode] + sys.argv[1:], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Wall-clock time to parse a multi-file upload against the number of parse processes.
+
+Takes --files PDFs from --pdf-dir (cycling through the directory when it holds
+fewer) and drains pipeline.iter_page_records for each PARSE_PROCESSES value.
+0 is the in-thread serial path. Each setting runs in a fresh interpreter, so
+pool start-up is included in the measured time, as it is for the first upload
+after a restart.
+
+Usage:
+    python benchmarks/bench_parsing.py --pdf-dir ./corpus --files 20 --processes 0,1,2,4,8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def run_setting(args):
+    from pipeline import iter_page_records
+
+    names = sorted(name for name in os.listdir(args.pdf_dir) if name.lower().endswith(".pdf"))
+    if not names:
+        sys.exit(f"No PDFs in {args.pdf_dir}")
+    files = [(os.path.join(args.pdf_dir, names[i % len(names)]), f"{i}_{names[i % len(names)]}") for i in range(args.files)]
+
+    failed = []
+    start = time.perf_counter()
+    pages = sum(1 for _ in iter_page_records(files, on_file_failed=lambda name, _: failed.append(name)))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "processes": int(os.environ["PARSE_PROCESSES"]),
+        "cores": os.cpu_count(),
+        "files": len(files),
+        "files_failed": len(failed),
+        "pages": pages,
+        "seconds": round(elapsed, 2),
+        "pages_per_second": round(pages / elapsed, 1),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", required=True)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--processes", default=",".join(str(n) for n in sorted({0, 1, 2, 4, os.cpu_count() or 1})))
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_setting(args)
+        return
+
+    for processes in args.processes.split(","):
+        env = dict(os.environ, PARSE_PROCESSES=processes)
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--run"] + sys.argv[1:], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
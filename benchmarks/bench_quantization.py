@@ -0,0 +1,69 @@
+"""Binary quantization micro-benchmark for 1024-dim bge-m3 output.
+
+Compares the previous np.where + packbits + per-row bytes path with
+quantization.pack_signs (with and without a preallocated output buffer).
+Reports vectors per second and, via tracemalloc, the allocations that
+outlive each batch (the returned vectors) and the peak bytes allocated while
+quantizing it.
+
+Usage:
+    python benchmarks/bench_quantization.py --batch-size 512 --dim 1024
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from quantization import pack_signs, packed_dim
+
+def legacy_quantize(embeddings):
+    embeddings_array = np.array(embeddings)
+    binary_embeddings = np.where(embeddings_array > 0, 1, 0).astype(np.uint8)
+    packed_embeddings = np.packbits(binary_embeddings, axis=1)
+    return [vec.tobytes() for vec in packed_embeddings]
+
+def measure(label, fn, batch, repeats):
+    fn(batch)  # warm up scratch buffers
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(batch)
+    elapsed = time.perf_counter() - start
+
+    # Keep the result alive so its blocks show up in the second snapshot
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.reset_peak()
+    result = fn(batch)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+
+    vectors_per_second = batch.shape[0] * repeats / elapsed
+    print(f"{label:<28} {vectors_per_second:>14,.0f} vec/s  {allocations:>6} allocs/batch  {peak / 1024:>10.1f} KiB peak")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    batch = rng.standard_normal((args.batch_size, args.dim)).astype(np.float32)
+    out = np.empty((args.batch_size, packed_dim(args.dim)), dtype=np.uint8)
+
+    assert np.array_equal(np.frombuffer(b"".join(legacy_quantize(batch)), dtype=np.uint8).reshape(out.shape), pack_signs(batch))
+
+    measure("legacy (per-row bytes)", legacy_quantize, batch, args.repeats)
+    measure("pack_signs", pack_signs, batch, args.repeats)
+    measure("pack_signs (preallocated)", lambda b: pack_signs(b, out=out), batch, args.repeats)
+
+if __name__ == "__main__":
+    main()
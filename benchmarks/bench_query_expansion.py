@@ -0,0 +1,107 @@
+"""Recall gain and latency overhead of multi-query expansion.
+
+The same collection is queried through RAG._retrieve: once with expansion off,
+and then once for each requested mode. The default corpus is bench_hybrid.py's
+part-number catalog, whose queries are wrapped in question boilerplate. Pass
+--pdf-dir and --labels to use a real corpus; the labels JSONL format is the
+one bench_hybrid.py uses. The "llm" mode needs GROQ_API_KEY. The other modes
+use MockLLM and need no network. --mock-encoder swaps bge-m3 for the hashed
+bag-of-words encoder of bench_suite.py.
+
+Usage:
+    python benchmarks/bench_query_expansion.py --mock-encoder --pages 2000 --queries 200
+    python benchmarks/bench_query_expansion.py --modes rules llm --budget-ms 500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+
+from bench_ingestion_memory import pdf_pages
+from bench_hybrid import part_number_corpus
+from bench_suite import make_embeddata_class
+
+def evaluate(rag, labels, top_k):
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for label in labels:
+        relevant = {(filename, page) for filename, page in label["relevant"]}
+        start = time.perf_counter()
+        results = rag._retrieve(label["query"], top_k)
+        latencies.append(time.perf_counter() - start)
+        found = [(r["payload"]["filename"], r["payload"]["page"]) for r in results]
+        recalls.append(len(relevant & set(found)) / len(relevant))
+        rank = next((i + 1 for i, key in enumerate(found) if key in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)) * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--labels")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--mock-encoder", action="store_true")
+    parser.add_argument("--modes", nargs="+", choices=["rules", "llm"], default=["rules"])
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    from llama_index.core.llms import MockLLM
+    from rag import MilvusVDB_BQ, Retriever, RAG
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+    from query_expansion import QueryExpander, EXPANSIONS
+
+    if args.pdf_dir:
+        if not args.labels:
+            sys.exit("--pdf-dir needs --labels")
+        with open(args.labels) as f:
+            labels = [json.loads(line) for line in f if line.strip()]
+        pages = pdf_pages(args.pdf_dir)
+    else:
+        pages, labels = part_number_corpus(args.pages, args.queries)
+
+    embeddata = make_embeddata_class(args.mock_encoder)(embed_model_name=args.model, use_cache=False, sparse=False)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=embeddata.vector_dim,
+            db_file=os.path.join(temp_dir, "bench.db"),
+            rescore_store=RescoreStore(os.path.join(temp_dir, "rescore"), dim=embeddata.vector_dim)
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        rows = asyncio.run(run_pipeline(embeddata.chunk_records(pages), embeddata, vdb))
+        retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+
+        for mode in ["off"] + args.modes:
+            rag = RAG(retriever=retriever, groq_api_key=os.getenv("GROQ_API_KEY") or "offline", expansion="off")
+            if mode != "llm":
+                rag.llm = MockLLM(max_tokens=16)
+            if mode != "off":
+                rag.expander = QueryExpander(mode=mode, variants=args.variants, budget_ms=args.budget_ms, llm=rag.llm)
+            rag._retrieve("warm up", args.top_k)
+            before = dict(EXPANSIONS._values)
+            report = {"mode": mode, "rows": rows, "queries": len(labels), "budget_ms": args.budget_ms if mode != "off" else None}
+            report.update(evaluate(rag, labels, args.top_k))
+            report["outcomes"] = {key[0]: value - before.get(key, 0) for key, value in EXPANSIONS._values.items() if value - before.get(key, 0)}
+            print(json.dumps(report))
+        vdb.client.close()
+
+if __name__ == "__main__":
+    main()
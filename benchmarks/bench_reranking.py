@@ -0,0 +1,121 @@
+"""Ranking quality and latency with and without the cross-encoder reranker.
+
+The same collection is queried with the reranker off and on, following the
+path RAG.generate_contexts_with_citations takes: retrieve the reranker's
+candidate count, then rerank down to top-k. Quality is measured on the
+ranked results the context is built from. Latency covers retrieval plus reranking. --concurrency
+runs the queries from several threads, to show the candidate count shrinking
+under load so that the p95 stays near --budget-ms. The default corpus is
+bench_hybrid.py's part-number catalog. Pass --pdf-dir and --labels for a real
+corpus. The reranker runs on CPU; set HF_HUB_OFFLINE=1 to load it from
+./hf_cache only.
+
+Usage:
+    python benchmarks/bench_reranking.py --pages 1000 --queries 200
+    python benchmarks/bench_reranking.py --reranker BAAI/bge-reranker-v2-m3 --concurrency 8 --budget-ms 300
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+# Rank quality is measured on the reranked list itself
+os.environ.setdefault("CONTEXT_PACKING", "false")
+
+from bench_ingestion_memory import pdf_pages
+from bench_hybrid import part_number_corpus
+from bench_suite import make_embeddata_class
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--labels")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--mock-encoder", action="store_true")
+    parser.add_argument("--reranker", default="BAAI/bge-reranker-base")
+    parser.add_argument("--candidates", type=int, default=24)
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    from rag import MilvusVDB_BQ, Retriever, RAG
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+    from reranking import Reranker
+
+    if args.pdf_dir:
+        if not args.labels:
+            sys.exit("--pdf-dir needs --labels")
+        with open(args.labels) as f:
+            labels = [json.loads(line) for line in f if line.strip()]
+        pages = pdf_pages(args.pdf_dir)
+    else:
+        pages, labels = part_number_corpus(args.pages, args.queries)
+
+    embeddata = make_embeddata_class(args.mock_encoder)(embed_model_name=args.model, use_cache=False, sparse=False)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=embeddata.vector_dim,
+            db_file=os.path.join(temp_dir, "bench.db"),
+            rescore_store=RescoreStore(os.path.join(temp_dir, "rescore"), dim=embeddata.vector_dim)
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        rows = asyncio.run(run_pipeline(embeddata.chunk_records(pages), embeddata, vdb))
+        retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+
+        for mode in ("off", "rerank"):
+            rag = RAG(retriever=retriever, groq_api_key="offline", expansion="off", packing=False, rerank=False)
+            if mode == "rerank":
+                rag.reranker = Reranker(model_name=args.reranker, max_candidates=args.candidates, budget_ms=args.budget_ms)
+                rag.reranker.warm_up()
+            ranked = {}
+
+            def run_one(label):
+                start = time.perf_counter()
+                results = rag._retrieve(label["query"], rag.reranker.candidate_count(args.top_k) if rag.reranker else args.top_k)
+                if rag.reranker is not None:
+                    results = rag.reranker.rerank(label["query"], results, args.top_k)
+                seconds = time.perf_counter() - start
+                ranked[label["query"]] = [(r["payload"]["filename"], r["payload"]["page"]) for r in results]
+                return seconds
+
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                latencies = list(pool.map(run_one, labels))
+
+            recalls, reciprocal_ranks = [], []
+            for label in labels:
+                relevant = {(filename, page) for filename, page in label["relevant"]}
+                found = ranked[label["query"]]
+                recalls.append(len(relevant & set(found)) / len(relevant))
+                rank = next((i + 1 for i, key in enumerate(found) if key in relevant), None)
+                reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+            report = {
+                "mode": mode,
+                "rows": rows,
+                "queries": len(labels),
+                "concurrency": args.concurrency,
+                f"recall@{args.top_k}": round(float(np.mean(recalls)), 4),
+                "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 1),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)) * 1000, 1),
+            }
+            if rag.reranker is not None:
+                report["reranker"] = rag.reranker.stats()
+            print(json.dumps(report))
+        vdb.client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Recall@k and latency: binary-only vs. two-stage (Hamming + rescoring) vs. exact float search.
+
+Ground truth is exact float32 cosine search over the same vectors. The default
+corpus is synthetic (clustered, normalized 1024-dim vectors, queries are noisy
+copies of corpus vectors) so the script runs without model weights; pass
+--pdf-dir and --queries-file to use real bge-m3 embeddings instead.
+
+Usage:
+    python benchmarks/bench_rescoring.py --docs 20000 --queries 200
+    python benchmarks/bench_rescoring.py --pdf-dir ./corpus --queries-file queries.txt
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rag import MilvusVDB_BQ, Retriever
+from quantization import pack_signs
+from rescore_store import RescoreStore
+
+class PrecomputedModel:
+    """Stands in for the SentenceTransformer: query strings are keys into a vector table"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, query):
+        return self.vectors[int(query)]
+
+class PrecomputedEmbedData:
+    def __init__(self, vectors):
+        self.embed_model = PrecomputedModel(vectors)
+
+def synthetic_corpus(n_docs, n_queries, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n_docs // 50), dim)).astype(np.float32)
+    docs = centers[rng.integers(0, len(centers), n_docs)] + 0.8 * rng.standard_normal((n_docs, dim)).astype(np.float32)
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries = docs[rng.integers(0, n_docs, n_queries)] + 0.05 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs, queries
+
+def real_corpus(pdf_dir, queries_file, model_name):
+    from rag import EmbedData
+    from pipeline import iter_page_records
+    files = [(os.path.join(pdf_dir, name), name) for name in sorted(os.listdir(pdf_dir)) if name.lower().endswith(".pdf")]
+    texts = [text for text, _ in iter_page_records(files)]
+    with open(queries_file) as f:
+        query_texts = [line.strip() for line in f if line.strip()]
+    embeddata = EmbedData(embed_model_name=model_name)
+    docs = np.asarray(embeddata.generate_embedding(texts), dtype=np.float32)
+    queries = np.asarray(embeddata.generate_embedding(query_texts), dtype=np.float32)
+    return docs, queries
+
+def recall(found, truth):
+    return len(set(found) & set(truth)) / len(truth)
+
+def timed_search(retriever, queries, top_k):
+    results, latencies = [], []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        hits = retriever.search(str(i), top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([hit["id"] for hit in hits])
+    return results, latencies
+
+def report(label, results, truth, latencies):
+    mean_recall = np.mean([recall(r, t) for r, t in zip(results, truth)])
+    print(f"{label:<26} recall@k={mean_recall:.3f}  p50={np.percentile(latencies, 50):7.2f} ms  p95={np.percentile(latencies, 95):7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--queries-file")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    args = parser.parse_args()
+
+    if args.pdf_dir:
+        docs, queries = real_corpus(args.pdf_dir, args.queries_file, args.model)
+    else:
+        docs, queries = synthetic_corpus(args.docs, args.queries, args.dim)
+    dim = docs.shape[1]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = RescoreStore(os.path.join(temp_dir, "rescore"), dim=dim, dtype=args.dtype)
+        vdb = MilvusVDB_BQ("bench", vector_dim=dim, db_file=os.path.join(temp_dir, "bench.db"), rescore_store=store)
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+        for start in range(0, len(docs), 1000):
+            batch = docs[start:start + 1000]
+            vdb.insert_batch(
+                [str(start + i) for i in range(len(batch))],
+                pack_signs(batch),
+                [{"filename": "bench.pdf", "page": start + i} for i in range(len(batch))],
+                batch
+            )
+        # Store rows are in insertion order, i.e. aligned with docs
+        ids = store.ids()
+
+        # Exact float search (ground truth and its latency)
+        truth, float_latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            top = np.argpartition(-(docs @ query), args.top_k)[:args.top_k]
+            float_latencies.append((time.perf_counter() - start) * 1000)
+            truth.append(ids[top].tolist())
+        report("exact float (numpy)", truth, truth, float_latencies)
+
+        embeddata = PrecomputedEmbedData(queries)
+        results, latencies = timed_search(Retriever(vdb, embeddata, oversample=1), queries, args.top_k)
+        report("binary only", results, truth, latencies)
+        for factor in args.oversample:
+            results, latencies = timed_search(Retriever(vdb, embeddata, oversample=factor), queries, args.top_k)
+            report(f"binary x{factor} + {args.dtype}", results, truth, latencies)
+
+        vdb.client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Restart cost: reopening stored sessions vs. re-ingesting them.
+
+The build phase creates --sessions stored sessions under a temporary DATA_DIR,
+the way the backend leaves them: a manifest per session, and for the first
+--indexed ones a Milvus Lite file and rescore vectors filled through the real
+chunk -> embed -> insert pipeline. The others are sessions that never got an
+upload (manifest only). Each phase runs in a fresh interpreter, so the restart
+phase sees only what is on disk.
+
+The restart phase imports backend.py, times SessionManager.restore() over all
+manifests, then the first query of --probe indexed sessions: the lazy
+rehydrate (reopening the Milvus file and rescore vectors) and one search.
+The build phase's per-session ingest time is what a restart used to cost
+each session before its documents could be queried again. The embedding model
+is loaded before the probes and reported separately, as the backend's startup
+warm-up does.
+
+One Milvus Lite file per indexed session takes about a second to build; keep
+--indexed small and use --sessions to scale the manifest count.
+
+Usage:
+    python benchmarks/bench_startup.py --mock-encoder --sessions 1000 --indexed 20
+    python benchmarks/bench_startup.py --sessions 1000 --indexed 10 --pages 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+# Query engines are built on rehydrate; no request is sent
+os.environ.setdefault("GROQ_API_KEY", "offline")
+
+from bench_ingestion_memory import synthetic_pages
+from bench_chunking import synthetic_queries
+from bench_suite import make_embeddata_class
+
+def load_backend(mock_encoder):
+    import backend
+    if mock_encoder:
+        backend.EmbedData = make_embeddata_class(True)
+    return backend
+
+def build(args):
+    from rag import MilvusVDB_BQ
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+    from storage import ensure_dirs, session_db_file, rescore_path
+
+    backend = load_backend(args.mock_encoder)
+    ensure_dirs()
+    embeddata = backend.EmbedData(embed_model_name="BAAI/bge-m3", batch_size=backend.batch_size)
+    ingest_seconds = []
+    for i in range(args.sessions):
+        session_id = f"s{i:05d}"
+        session = backend.new_session(session_id)
+        if i < args.indexed:
+            start = time.perf_counter()
+            vdb = MilvusVDB_BQ(
+                collection_name=f"docs_{session_id}",
+                batch_size=backend.batch_size,
+                vector_dim=embeddata.vector_dim,
+                db_file=session_db_file(session_id),
+                rescore_store=RescoreStore(rescore_path(session_id), dim=embeddata.vector_dim),
+                sparse=embeddata.sparse
+            )
+            vdb.define_client()
+            vdb.create_collection(drop_existing=True)
+            asyncio.run(run_pipeline(embeddata.chunk_records(synthetic_pages(args.pages, seed=i)), embeddata, vdb))
+            ingest_seconds.append(time.perf_counter() - start)
+            session["milvus_vdb"] = vdb
+            session["embeddata"] = embeddata
+            session["processed_files"] = {f"doc_{j}.pdf": True for j in range((args.pages + 99) // 100)}
+            session["is_indexed"] = True
+        backend.sessions[session_id] = session
+        asyncio.run(backend.sessions.save(session_id))
+        if session["milvus_vdb"] is not None:
+            session["milvus_vdb"].close()
+    print(json.dumps({
+        "phase": "build",
+        "sessions": args.sessions,
+        "indexed": args.indexed,
+        "pages_per_session": args.pages,
+        "ingest_seconds_per_session": round(float(np.mean(ingest_seconds)), 3) if ingest_seconds else None,
+    }))
+
+def restart(args):
+    start = time.perf_counter()
+    backend = load_backend(args.mock_encoder)
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    backend.ensure_dirs()
+    restored = backend.sessions.restore()
+    restore_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    backend.EmbedData(embed_model_name="BAAI/bge-m3", batch_size=backend.batch_size).generate_embedding("warm up")
+    model_load_seconds = time.perf_counter() - start
+
+    async def probe():
+        rehydrate_ms, search_ms = [], []
+        queries = synthetic_queries(args.probe)
+        for i, query in zip(range(min(args.probe, args.indexed)), queries):
+            session_id = f"s{i:05d}"
+            start = time.perf_counter()
+            session = await backend.sessions.acquire(session_id)
+            rehydrate_ms.append((time.perf_counter() - start) * 1000)
+            try:
+                start = time.perf_counter()
+                hits = await backend.run_milvus(session["query_engine"].retriever.search, query)
+                search_ms.append((time.perf_counter() - start) * 1000)
+                assert hits, f"no results from restored session {session_id}"
+            finally:
+                backend.sessions.release(session_id)
+        return rehydrate_ms, search_ms
+
+    rehydrate_ms, search_ms = asyncio.run(probe())
+    print(json.dumps({
+        "phase": "restart",
+        "restored_sessions": restored,
+        "import_seconds": round(import_seconds, 2),
+        "restore_ms": round(restore_ms, 1),
+        "model_load_seconds": round(model_load_seconds, 2),
+        "first_rehydrate_ms_p50": round(float(np.percentile(rehydrate_ms, 50)), 1) if rehydrate_ms else None,
+        "first_rehydrate_ms_p95": round(float(np.percentile(rehydrate_ms, 95)), 1) if rehydrate_ms else None,
+        "first_search_ms_p50": round(float(np.percentile(search_ms, 50)), 1) if search_ms else None,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--phase", choices=["build", "restart"])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--indexed", type=int, default=20, help="sessions with a Milvus collection")
+    parser.add_argument("--pages", type=int, default=100, help="pages per indexed session")
+    parser.add_argument("--probe", type=int, default=20, help="indexed sessions queried after the restart")
+    parser.add_argument("--mock-encoder", action="store_true")
+    args = parser.parse_args()
+
+    if args.phase == "build":
+        build(args)
+        return
+    if args.phase == "restart":
+        restart(args)
+        return
+
+    common = ["--sessions", str(args.sessions), "--indexed", str(args.indexed), "--pages", str(args.pages), "--probe", str(args.probe)]
+    if args.mock_encoder:
+        common.append("--mock-encoder")
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Fresh interpreter per phase, sharing only the data directory
+        env = {**os.environ, "DATA_DIR": data_dir, "MILVUS_TENANCY": "session"}
+        for phase in ("build", "restart"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--phase", phase] + common, env=env, check=True)
+
+if __name__ == "__main__":
+    main()
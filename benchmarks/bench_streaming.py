@@ -0,0 +1,84 @@
+"""CPU cost of consuming a streamed answer: the old per-token loop vs. streaming.py.
+
+The old loop rebuilt the answer with += after a startswith() check against the
+whole answer so far, and sent (or re-rendered) once per token. The new path
+normalizes deltas in O(1) and coalesces them into frames. Chunks mimic
+LlamaIndex CompletionResponse objects, with a cumulative text and, optionally,
+no delta (which forces the old prefix check). Rendering is simulated by a
+join of the full answer per update, which is what a markdown re-render costs
+at minimum.
+
+Usage:
+    python benchmarks/bench_streaming.py --tokens 2000 8000 32000
+    python benchmarks/bench_streaming.py --tokens 8000 --no-delta
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from streaming import iter_frames
+
+class Chunk:
+    __slots__ = ("delta", "text")
+
+    def __init__(self, delta, text):
+        self.delta = delta
+        self.text = text
+
+def make_chunks(n_tokens, with_delta):
+    # The cumulative text is shared as growing prefixes of one string, like LlamaIndex's responses
+    tokens = [f" tok{i % 97}" for i in range(n_tokens)]
+    full = "".join(tokens)
+    chunks, end = [], 0
+    for token in tokens:
+        end += len(token)
+        chunks.append(Chunk(token if with_delta else None, full[:end]))
+    return chunks
+
+def old_loop(chunks):
+    full_response = ""
+    renders = 0
+    for chunk in chunks:
+        if chunk.delta:
+            new_text = chunk.delta
+        else:
+            candidate = chunk.text
+            new_text = candidate[len(full_response):] if candidate.startswith(full_response) else candidate
+        if new_text:
+            full_response += new_text
+            rendered = full_response + "▌"
+            renders += 1
+    return full_response, renders
+
+def new_loop(chunks, interval_ms):
+    renders = 0
+    full_response = ""
+    for _, streamed in iter_frames(chunks, interval_ms=interval_ms):
+        full_response = streamed.text
+        rendered = full_response + "▌"
+        renders += 1
+    return full_response, renders
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[2000, 8000, 32000])
+    parser.add_argument("--no-delta", action="store_true")
+    parser.add_argument("--interval-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    for n_tokens in args.tokens:
+        chunks = make_chunks(n_tokens, not args.no_delta)
+        report = {"tokens": n_tokens, "delta": not args.no_delta}
+        for name, fn in (("old", old_loop), ("new", lambda c: new_loop(c, args.interval_ms))):
+            start = time.process_time()
+            text, renders = fn(chunks)
+            report[f"{name}_cpu_ms"] = round((time.process_time() - start) * 1000, 2)
+            report[f"{name}_renders"] = renders
+        print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""End-to-end retrieval benchmark: ingest a corpus, replay a query set, write diffable results.
+
+Builds a collection from synthetic pages (or a fixture PDF directory) through
+the real chunk -> embed -> insert pipeline and replays the queries through the
+retriever and RAG.generate_context_with_citations. Answers come from
+llama_index's MockLLM, so no API key or network is needed. --mock-encoder
+also replaces bge-m3 with a deterministic hashed bag-of-words encoder, so the
+whole suite runs offline (absolute latencies then only reflect Milvus and the
+Python code).
+
+Reported:
+  ingest: rows, seconds, rows/s, peak RSS
+  per-stage latency p50/p95/p99 (ms): encode, quantize, search, format,
+    context (generate_context_with_citations) and answer (prompt + MockLLM)
+  recall@k of the retrieved chunks against exact float32 cosine search
+
+Results go to --out-dir as <name>.json (summary, sorted keys) and
+<name>.queries.jsonl (one line per query), so runs can be diffed.
+
+Usage:
+    python benchmarks/bench_suite.py --mock-encoder --pages 2000 --queries 200
+    python benchmarks/bench_suite.py --pdf-dir ./fixtures --queries-file queries.txt --name bge-m3-onnx
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Every query must reach the retriever
+os.environ.setdefault("QUERY_CACHE_ENABLED", "false")
+
+from bench_ingestion_memory import synthetic_pages, pdf_pages
+from bench_chunking import synthetic_queries
+
+class HashingEncoder:
+    """Offline stand-in for a SentenceTransformer: normalized sums of hashed word vectors"""
+
+    tokenizer = None
+    max_seq_length = None
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self._word_vectors = {}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _word_vector(self, word):
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+            vector = self._word_vectors[word] = rng.standard_normal(self.dim).astype(np.float32)
+        return vector
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector += self._word_vector(word)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(text) for text in sentences]) if sentences else np.empty((0, self.dim), dtype=np.float32)
+
+def make_embeddata_class(mock_encoder):
+    from rag import EmbedData
+
+    class RecordingEmbedData(EmbedData):
+        """Keeps every (chunk, float32 vector) it embeds, for the exact-search ground truth"""
+
+        def __init__(self, *args, **kwargs):
+            self.recorded_contexts = []
+            self.recorded_embeddings = []
+            super().__init__(*args, **kwargs)
+
+        def _load_embed_model(self):
+            return HashingEncoder() if mock_encoder else super()._load_embed_model()
+
+        def embed_batch(self, contexts):
+            embeddings, binary_embeddings = super().embed_batch(contexts)
+            self.recorded_contexts.extend(contexts)
+            self.recorded_embeddings.append(np.asarray(embeddings, dtype=np.float32))
+            return embeddings, binary_embeddings
+
+    return RecordingEmbedData
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--pdf-dir")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--queries-file")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--mock-encoder", action="store_true")
+    parser.add_argument("--no-rescore", action="store_true")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--out-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument("--name", default=time.strftime("%Y%m%d-%H%M%S"))
+    args = parser.parse_args()
+
+    from llama_index.core.llms import MockLLM
+    from rag import MilvusVDB_BQ, Retriever, RAG
+    from rescore_store import RescoreStore
+    from pipeline import run_pipeline
+
+    embeddata = make_embeddata_class(args.mock_encoder)(
+        embed_model_name=args.model, batch_size=args.batch_size, use_cache=False, sparse=False
+    )
+    embeddata.generate_embedding("warm up")
+    pages = pdf_pages(args.pdf_dir) if args.pdf_dir else synthetic_pages(args.pages)
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = synthetic_queries(args.queries)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        rescore_store = None if args.no_rescore else RescoreStore(os.path.join(temp_dir, "rescore"), dim=embeddata.vector_dim)
+        vdb = MilvusVDB_BQ(
+            collection_name="bench",
+            vector_dim=embeddata.vector_dim,
+            batch_size=args.batch_size,
+            db_file=os.path.join(temp_dir, "bench.db"),
+            rescore_store=rescore_store
+        )
+        vdb.define_client()
+        vdb.create_collection(drop_existing=True)
+
+        start = time.perf_counter()
+        rows = asyncio.run(run_pipeline(embeddata.chunk_records(pages), embeddata, vdb, batch_size=args.batch_size))
+        ingest_seconds = time.perf_counter() - start
+        ingest_peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        corpus = np.concatenate(embeddata.recorded_embeddings)
+        corpus /= np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        contexts = embeddata.recorded_contexts
+
+        retriever = Retriever(vector_db=vdb, embeddata=embeddata, top_k=args.top_k)
+        rag = RAG(retriever=retriever, groq_api_key="offline")
+        rag.llm = MockLLM(max_tokens=64)
+        rescored = rescore_store is not None and retriever.oversample > 1
+
+        stages = {name: [] for name in ("encode", "quantize", "search", "format", "context", "answer")}
+        recalls = []
+        per_query = []
+        for query in queries:
+            timings = {}
+            start = time.perf_counter()
+            query_embedding = retriever.encode_query(query)
+            timings["encode"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            binary_query = retriever._binary_quantize_query(query_embedding)
+            timings["quantize"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if rescored:
+                ranking = retriever._rescored_ranking(query_embedding, binary_query, args.top_k)
+            else:
+                ranking = retriever._hamming_ranking(binary_query, args.top_k)
+            timings["search"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = retriever._format(ranking)
+            timings["format"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rag.generate_context_with_citations(query, top_k=args.top_k)
+            timings["context"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rag.query(query, stream=False)
+            timings["answer"] = time.perf_counter() - start
+
+            # Ground truth: exact cosine over the float32 vectors of every ingested chunk
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            exact = np.argsort(-(corpus @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))))[:args.top_k]
+            expected = {contexts[i] for i in exact}
+            found = {result["payload"]["context"] for result in results}
+            recall = len(expected & found) / max(len(expected), 1)
+            recalls.append(recall)
+
+            for name, seconds in timings.items():
+                stages[name].append(seconds)
+            per_query.append({
+                "query": query,
+                "recall": round(recall, 4),
+                **{f"{name}_ms": round(seconds * 1000, 3) for name, seconds in timings.items()}
+            })
+        vdb.client.close()
+
+    summary = {
+        "name": args.name,
+        "commit": git_commit(),
+        "config": {
+            "model": "mock-hashing" if args.mock_encoder else args.model,
+            "corpus": args.pdf_dir or f"synthetic:{args.pages}",
+            "queries": len(queries),
+            "top_k": args.top_k,
+            "batch_size": args.batch_size,
+            "rescore": rescored,
+            "oversample": retriever.oversample,
+            "embed_backend": embeddata.backend,
+        },
+        "ingest": {
+            "rows": rows,
+            "seconds": round(ingest_seconds, 3),
+            "rows_per_second": round(rows / ingest_seconds, 1) if ingest_seconds else None,
+            "peak_rss_mb": round(ingest_peak_rss / 1024, 1),
+        },
+        "latency_ms": {name: percentiles(values) for name, values in stages.items()},
+        f"recall@{args.top_k}": round(float(np.mean(recalls)), 4),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    summary_path = os.path.join(args.out_dir, f"{args.name}.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+    with open(os.path.join(args.out_dir, f"{args.name}.queries.jsonl"), "w") as f:
+        for row in per_query:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    print(json.dumps(summary, indent=2, sort_keys=True))
+    print(f"Wrote {summary_path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
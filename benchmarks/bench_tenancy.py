@@ -0,0 +1,142 @@
+"""Memory, open files and search latency: one Milvus Lite file per session vs. a shared collection.
+
+"session" gives every session its own db file, client and collection (the
+default backend behaviour). "shared" puts every session into one collection
+through one pooled client, with rows tagged by session_id and every search
+filtered on it. Each (mode, sessions) pair runs in a fresh subprocess; RSS
+includes the Milvus Lite server processes.
+
+Vectors are synthetic (normalized, 1024-dim) so no model weights are needed.
+
+Per-session mode at 1,000 sessions needs tens of GB of RAM (roughly 38 MiB
+and one second of setup per session on Milvus Lite 2.4); use --modes shared
+to measure only the shared collection at that size.
+
+Usage:
+    python benchmarks/bench_tenancy.py --sessions 1 100 1000 --chunks 50
+    python benchmarks/bench_tenancy.py --sessions 1000 --modes shared
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+            children.extend(child_pids(int(entry)))
+    return children
+
+def process_tree_usage():
+    """(RSS in MiB, open file descriptors) of this process and its descendants"""
+    rss_kib, fds = 0, 0
+    for pid in [os.getpid()] + child_pids(os.getpid()):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                rss_kib += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            fds += len(os.listdir(f"/proc/{pid}/fd"))
+        except (OSError, StopIteration):
+            continue
+    return rss_kib / 1024, fds
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run_mode(args):
+    from rag import MilvusVDB_BQ, Retriever, close_shared_clients
+    from quantization import pack_signs
+
+    rng = np.random.default_rng(0)
+    baseline_rss, baseline_fds = process_tree_usage()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        start = time.perf_counter()
+        vdbs = []
+        for i in range(args.n_sessions):
+            if args.mode == "shared":
+                vdb = MilvusVDB_BQ("docs_shared", vector_dim=args.dim, db_file=os.path.join(temp_dir, "shared.db"), tenant_id=f"session-{i}")
+            else:
+                vdb = MilvusVDB_BQ(f"docs_{i}", vector_dim=args.dim, db_file=os.path.join(temp_dir, f"s{i}.db"))
+            vdb.define_client()
+            vdb.create_collection(drop_existing=True)
+            vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            vdb.insert_batch(
+                [f"chunk {j} of session {i}" for j in range(args.chunks)],
+                pack_signs(vectors),
+                [{"filename": f"doc_{i}.pdf", "page": j + 1} for j in range(args.chunks)]
+            )
+            vdbs.append(vdb)
+        setup_seconds = time.perf_counter() - start
+        rss, fds = process_tree_usage()
+
+        latencies, leaked = [], 0
+        for _ in range(args.queries):
+            i = int(rng.integers(0, args.n_sessions))
+            query = rng.standard_normal(args.dim).astype(np.float32)
+            retriever = Retriever(vdbs[i], embeddata=None, oversample=1)
+            start = time.perf_counter()
+            hits = retriever.search("", top_k=5, query_embedding=query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            leaked += sum(hit["payload"]["filename"] != f"doc_{i}.pdf" for hit in hits)
+
+        disk_mb = dir_size(temp_dir) / (1024 * 1024)
+        for vdb in vdbs:
+            vdb.close()
+        close_shared_clients()
+
+    print(json.dumps({
+        "mode": args.mode,
+        "sessions": args.n_sessions,
+        "rows": args.n_sessions * args.chunks,
+        "setup_seconds": round(setup_seconds, 2),
+        "rss_mb": round(rss, 1),
+        "rss_over_baseline_mb": round(rss - baseline_rss, 1),
+        "open_fds": fds - baseline_fds,
+        "disk_mb": round(disk_mb, 1),
+        "search_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "search_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "cross_session_hits": leaked,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["session", "shared"])
+    parser.add_argument("--n-sessions", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--modes", nargs="+", choices=["session", "shared"], default=["session", "shared"])
+    parser.add_argument("--chunks", type=int, default=50, help="rows per session")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    # Fresh interpreter (and Milvus Lite server) per measurement
+    common = ["--chunks", str(args.chunks), "--dim", str(args.dim), "--queries", str(args.queries)]
+    for n_sessions in args.sessions:
+        for mode in args.modes:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, "--n-sessions", str(n_sessions)] + common,
+                check=True
+            )
+
+if __name__ == "__main__":
+    main()
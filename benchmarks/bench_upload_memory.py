@@ -0,0 +1,83 @@
+"""Peak RSS of receiving one large upload: whole-file read + temp dir vs. the streaming path.
+
+The multipart parser spools uploads to disk, so both modes start from the same
+spooled UploadFile of --mb megabytes. "legacy" is the previous handler: one
+await file.read(), a copy written into a TemporaryDirectory and read back for
+the parser. "streaming" is backend.read_upload: chunked reads into a single
+buffer, hashed on the fly, which the parser then reads in place. Each mode runs
+in its own subprocess so ru_maxrss is the peak of that mode alone.
+
+Usage:
+    python benchmarks/bench_upload_memory.py --mb 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def spooled_upload(size_mb):
+    from starlette.datastructures import UploadFile
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    block = os.urandom(1024 * 1024)
+    for _ in range(size_mb):
+        spooled.write(block)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename="large.pdf")
+
+async def legacy(file):
+    data = await file.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, file.filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        with open(path, "rb") as f:
+            parsed_input = f.read()
+    return len(parsed_input), content_hash
+
+async def streaming(file):
+    from backend import read_upload
+
+    data, content_hash = await read_upload(file)
+    return len(data), content_hash
+
+def run_mode(args):
+    if args.mode == "streaming":
+        import backend  # noqa: F401  (imported before the baseline so its modules are not counted)
+    file = spooled_upload(args.mb)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    size, _ = asyncio.run(legacy(file) if args.mode == "legacy" else streaming(file))
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": args.mode,
+        "upload_mb": round(size / (1024 * 1024), 1),
+        "seconds": round(elapsed, 2),
+        "peak_rss_over_baseline_mb": round((peak_rss - baseline_rss) / 1024, 1),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["legacy", "streaming"])
+    parser.add_argument("--mb", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    for mode in ("legacy", "streaming"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode] + sys.argv[1:], check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Chat latency while uploads run.
+
+Measures /api/health round-trips and WebSocket chat time-to-first-chunk against a
+running backend, first idle and then while other sessions upload PDFs. With the
+blocking work off the event loop both distributions should stay roughly flat.
+
+Usage:
+    python backend.py &
+    python benchmarks/load_test_chat_during_upload.py --pdf-dir ./sample_pdfs --uploads 4
+
+Requires httpx and websockets (pip install httpx websockets).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import asyncio
+import statistics
+import httpx
+import websockets
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(label, values):
+    if not values:
+        print(f"{label:<28} no samples")
+        return
+    print(
+        f"{label:<28} n={len(values):<4} p50={percentile(values, 50):8.1f} ms "
+        f"p95={percentile(values, 95):8.1f} ms max={max(values):8.1f} ms "
+        f"mean={statistics.mean(values):8.1f} ms"
+    )
+
+async def init_session(client, api_key):
+    response = await client.post("/api/init-session", json={"groq_api_key": api_key})
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+async def upload(client, session_id, api_key, pdf_paths):
+    files = [("files", (os.path.basename(path), open(path, "rb"), "application/pdf")) for path in pdf_paths]
+    try:
+        response = await client.post(
+            "/api/upload",
+            params={"session_id": session_id, "groq_api_key": api_key},
+            files=files,
+            timeout=None
+        )
+        response.raise_for_status()
+    finally:
+        for _, (_, handle, _) in files:
+            handle.close()
+
+async def probe_health(client, samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/health")
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.05)
+
+async def probe_chat(ws_url, session_id, query, samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with websockets.connect(f"{ws_url}/ws/chat/{session_id}") as ws:
+            await ws.send(json.dumps({"query": query}))
+            first = None
+            async for raw in ws:
+                message = json.loads(raw)
+                if message["type"] in ("chunk", "error") and first is None:
+                    first = (time.perf_counter() - start) * 1000
+                if message["type"] in ("done", "error"):
+                    break
+        if first is not None:
+            samples.append(first)
+
+async def measure(client, ws_url, chat_session, query, duration, upload_tasks=None):
+    health, chat = [], []
+    stop = asyncio.Event()
+    probes = [
+        asyncio.create_task(probe_health(client, health, stop)),
+        asyncio.create_task(probe_chat(ws_url, chat_session, query, chat, stop)),
+    ]
+    if upload_tasks:
+        await asyncio.gather(*upload_tasks)
+    else:
+        await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*probes, return_exceptions=True)
+    return health, chat
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--pdf-dir", required=True)
+    parser.add_argument("--uploads", type=int, default=4, help="concurrent upload sessions")
+    parser.add_argument("--idle-seconds", type=float, default=10.0)
+    parser.add_argument("--query", default="What is this document about?")
+    parser.add_argument("--groq-api-key", default=os.getenv("GROQ_API_KEY", ""))
+    args = parser.parse_args()
+
+    pdf_paths = sorted(
+        os.path.join(args.pdf_dir, name) for name in os.listdir(args.pdf_dir) if name.lower().endswith(".pdf")
+    )
+    if not pdf_paths:
+        sys.exit(f"No PDFs found in {args.pdf_dir}")
+    ws_url = args.base_url.replace("http", "ws", 1)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        # Index one small document for the chat session
+        chat_session = await init_session(client, args.groq_api_key)
+        await upload(client, chat_session, args.groq_api_key, pdf_paths[:1])
+
+        health_idle, chat_idle = await measure(client, ws_url, chat_session, args.query, args.idle_seconds)
+
+        upload_sessions = [await init_session(client, args.groq_api_key) for _ in range(args.uploads)]
+        uploads = [upload(client, sid, args.groq_api_key, pdf_paths) for sid in upload_sessions]
+        health_busy, chat_busy = await measure(client, ws_url, chat_session, args.query, 0, uploads)
+
+    summarize("health (idle)", health_idle)
+    summarize("health (during uploads)", health_busy)
+    summarize("chat first chunk (idle)", chat_idle)
+    summarize("chat first chunk (uploads)", chat_busy)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Concurrent streamed chats through the shared LLM gateway.
+
+Runs --chats completions at once through llm_gateway, spread over --keys API
+keys, and reports time to first token, per-chat decode rate, aggregate
+tokens/s, retries and failures. By default the target is
+benchmarks/mock_llm_server.py, so it runs offline:
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8100 --fail-rate 0.05 &
+    python benchmarks/load_test_llm_gateway.py --chats 100 --keys 4
+    python benchmarks/load_test_llm_gateway.py --base-url https://api.groq.com/openai/v1 --chats 10 --api-key $GROQ_API_KEY
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def one_chat(gateway, api_key, model, prompt):
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    try:
+        async for _ in gateway.stream(api_key, model, prompt):
+            if first is None:
+                first = time.perf_counter()
+            tokens += 1
+    except Exception as e:
+        return {"error": str(e)}
+    end = time.perf_counter()
+    result = {"ttft_ms": (first - start) * 1000 if first else None, "total_ms": (end - start) * 1000, "tokens": tokens}
+    if first and tokens > 1 and end > first:
+        result["tokens_per_second"] = (tokens - 1) / (end - first)
+    return result
+
+async def run(args):
+    from llm_gateway import LLMGateway
+
+    gateway = LLMGateway(base_url=args.base_url)
+    keys = [args.api_key] if args.api_key else [f"mock-key-{i}" for i in range(args.keys)]
+    prompt = "CONTEXT: mock\n---------------------\nQUERY: What are the steps?\nANSWER: "
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        one_chat(gateway, keys[i % len(keys)], args.model, prompt) for i in range(args.chats)
+    ))
+    elapsed = time.perf_counter() - start
+    await gateway.close()
+
+    ok = [r for r in results if "error" not in r]
+    ttfts = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+    rates = [r["tokens_per_second"] for r in ok if "tokens_per_second" in r]
+    total_tokens = sum(r["tokens"] for r in ok)
+    report = {
+        "chats": args.chats,
+        "keys": len(keys),
+        "succeeded": len(ok),
+        "errors": sorted({r["error"] for r in results if "error" in r})[:5],
+        "wall_seconds": round(elapsed, 3),
+        "ttft_ms_p50": round(percentile(ttfts, 50), 1) if ttfts else None,
+        "ttft_ms_p95": round(percentile(ttfts, 95), 1) if ttfts else None,
+        "ttft_ms_max": round(max(ttfts), 1) if ttfts else None,
+        "chat_tokens_per_second_p50": round(percentile(rates, 50), 1) if rates else None,
+        "aggregate_tokens_per_second": round(total_tokens / elapsed, 1) if elapsed else None,
+        "gateway": gateway.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8100/v1")
+    parser.add_argument("--api-key")
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--model", default="moonshotai/kimi-k2-instruct")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
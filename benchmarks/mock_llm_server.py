@@ -0,0 +1,107 @@
+"""Offline stand-in for Groq's OpenAI-compatible /chat/completions endpoint.
+
+Streams (or returns) a canned answer with a configurable time to first token
+and decode rate, so the LLM gateway and the chat endpoints can be load-tested
+without an API key. The time to first token is a fixed part plus prompt
+prefill at --prefill-tokens-per-second, with prompt tokens estimated at 4
+characters each. --fail-rate makes a fraction of requests answer 429 or 503
+(with Retry-After) to exercise the retry path.
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8100 --ttft-ms 300 --tokens-per-second 80
+    GROQ_BASE_URL=http://127.0.0.1:8100/v1 python backend.py
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "Based on the provided context, the document describes the requested procedure in three steps. "
+    "First, the operator verifies the inputs; second, the values are recorded; third, the results are reviewed. "
+    "Citation: Source: mock.pdf, Page: 1"
+)
+
+def create_app(ttft_ms=300.0, tokens_per_second=80.0, fail_rate=0.0, prefill_tokens_per_second=0.0, seed=0):
+    app = FastAPI()
+    rng = random.Random(seed)
+    stats = {"requests": 0, "failed": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if fail_rate and rng.random() < fail_rate:
+            stats["failed"] += 1
+            status = rng.choice((429, 503))
+            return JSONResponse(status_code=status, content={"error": {"message": "mock overload"}}, headers={"retry-after": "0.2"})
+
+        tokens = ANSWER.split(" ")[:body.get("max_tokens") or None]
+        prompt_chars = sum(len(message.get("content") or "") for message in body.get("messages", []))
+        first_token_delay = ttft_ms / 1000 + (prompt_chars / 4 / prefill_tokens_per_second if prefill_tokens_per_second else 0.0)
+        created = int(time.time())
+
+        def event(delta, finish_reason=None, usage=None):
+            payload = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                payload["x_groq"] = {"usage": usage}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token_delay + len(tokens) / tokens_per_second)
+            return {
+                "id": "mock",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"completion_tokens": len(tokens)},
+            }
+
+        async def generate():
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(first_token_delay)
+                yield event({"role": "assistant", "content": ""})
+                for i, token in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(1 / tokens_per_second)
+                    yield event({"content": token if i == 0 else " " + token})
+                yield event({}, "stop", {"completion_tokens": len(tokens)})
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0)
+    args = parser.parse_args()
+    app = create_app(args.ttft_ms, args.tokens_per_second, args.fail_rate, args.prefill_tokens_per_second)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import re
+import bisect
+import logging
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Token budget per chunk, counted with the embedding model's tokenizer
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "512"))
+# Trailing tokens of a chunk repeated at the start of the next one
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+# Chunks shorter than this (characters, after stripping) are not embedded
+MIN_CHUNK_CHARS = int(os.getenv("MIN_CHUNK_CHARS", "32"))
+
+# End of a sentence: terminal punctuation (Latin or Arabic) followed by whitespace, or a blank line
+SENTENCE_END = re.compile(r"(?<=[.!?؟۔])\s+|\n\s*\n")
+WORD = re.compile(r"\S+")
+
+class Chunker:
+    """Split page text into token-budgeted, sentence-aligned chunks with overlap.
+
+    Sentences are packed into a chunk until the next one would exceed
+    max_tokens; the next chunk starts with the trailing sentences of the
+    previous one that fit in overlap_tokens. A sentence longer than the budget
+    is cut at token boundaries. Tokens are counted with the given Hugging Face
+    tokenizer (one call per page); without one, whitespace-separated words are
+    counted instead.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP, min_chars=MIN_CHUNK_CHARS):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_chars = min_chars
+
+    @classmethod
+    def for_model(cls, embed_model, **kwargs):
+        """Chunker counting tokens the way a SentenceTransformer model sees them"""
+        tokenizer = getattr(embed_model, "tokenizer", None)
+        max_seq_length = getattr(embed_model, "max_seq_length", None)
+        max_tokens = kwargs.pop("max_tokens", CHUNK_TOKENS)
+        if max_seq_length:
+            # Leave room for the special tokens added by the encoder
+            max_tokens = min(max_tokens, max_seq_length - 2)
+        return cls(tokenizer=tokenizer, max_tokens=max_tokens, **kwargs)
+
+    def token_starts(self, text):
+        """Character offset at which each token of text starts"""
+        if self.tokenizer is not None:
+            try:
+                encoding = self.tokenizer(
+                    text,
+                    add_special_tokens=False,
+                    return_offsets_mapping=True,
+                    verbose=False
+                )
+                return [start for start, end in encoding["offset_mapping"] if end > start]
+            except (TypeError, NotImplementedError):
+                # Slow tokenizers cannot report offsets
+                pass
+        return [match.start() for match in WORD.finditer(text)]
+
+    def sentence_spans(self, text):
+        """(start, end) character spans of the sentences of text"""
+        spans = []
+        start = 0
+        for match in SENTENCE_END.finditer(text):
+            if match.start() > start:
+                spans.append((start, match.start()))
+            start = match.end()
+        if start < len(text):
+            spans.append((start, len(text)))
+        return spans
+
+    def split(self, text):
+        """Yield (chunk_text, char_start, char_end) for one page"""
+        if not text or not text.strip():
+            return
+        starts = self.token_starts(text)
+
+        def tokens_in(start, end):
+            return bisect.bisect_left(starts, end) - bisect.bisect_left(starts, start)
+
+        # Units are sentences, with over-long sentences cut at token boundaries
+        units = []
+        for start, end in self.sentence_spans(text):
+            count = tokens_in(start, end)
+            if count <= self.max_tokens:
+                units.append((start, end, count))
+                continue
+            first = bisect.bisect_left(starts, start)
+            for offset in range(0, count, self.max_tokens):
+                piece_start = starts[first + offset] if offset else start
+                piece_end = starts[first + offset + self.max_tokens] if offset + self.max_tokens < count else end
+                units.append((piece_start, piece_end, min(self.max_tokens, count - offset)))
+
+        window = []
+        window_tokens = 0
+        for unit in units:
+            if window and window_tokens + unit[2] > self.max_tokens:
+                yield from self._emit(text, window)
+                # Carry trailing units that fit in the overlap into the next chunk
+                carried = []
+                carried_tokens = 0
+                for previous in reversed(window):
+                    if carried_tokens + previous[2] > self.overlap_tokens or carried_tokens + previous[2] + unit[2] > self.max_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous[2]
+                window, window_tokens = carried, carried_tokens
+            window.append(unit)
+            window_tokens += unit[2]
+        if window:
+            yield from self._emit(text, window)
+
+    def _emit(self, text, window):
+        start, end = window[0][0], window[-1][1]
+        chunk = text[start:end].strip()
+        if len(chunk) >= self.min_chars:
+            yield chunk, start, end
+
+    def iter_chunks(self, records):
+        """Re-yield (text, metadata) page records as chunk records.
+
+        Chunk metadata keeps the page's filename and page number and adds the
+        chunk's character offsets within the page text.
+        """
+        pages = chunks = 0
+        for text, metadata in records:
+            pages += 1
+            with span("chunk"):
+                page_chunks = list(self.split(text))
+            for chunk, start, end in page_chunks:
+                chunks += 1
+                yield chunk, {**metadata, "char_start": start, "char_end": end}
+        logger.info(f"Chunked {pages} pages into {chunks} chunks (max {self.max_tokens} tokens, overlap {self.overlap_tokens})")
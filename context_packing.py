@@ -0,0 +1,145 @@
+import os
+import logging
+import threading
+from chunking import SENTENCE_END
+from metrics import span, registry
+from text_utils import STOPWORDS, WORD
+
+logger = logging.getLogger(__name__)
+
+# Pack retrieved passages into a token budget before building the prompt
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() in ("1", "true", "yes")
+# Context tokens allowed in the prompt, counted with CONTEXT_TOKENIZER
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+# A longer passage is trimmed to its sentences most relevant to the query
+CONTEXT_PASSAGE_TOKENS = int(os.getenv("CONTEXT_PASSAGE_TOKENS", "400"))
+# Passages cut shorter than this by deduplication and trimming are dropped
+CONTEXT_MIN_PASSAGE_TOKENS = int(os.getenv("CONTEXT_MIN_PASSAGE_TOKENS", "16"))
+# Candidates retrieved per query when packing, so the budget can be filled by relevance
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+# tiktoken encoding; when it cannot be loaded (e.g. offline), tokens are estimated at 4 characters each
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+
+SEPARATOR = "\n\n---\n\n"
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+CONTEXT_TOKENS = registry.histogram("rag_context_tokens", "Context tokens per prompt: all retrieved candidates (raw) and what was packed", ["state"], TOKEN_BUCKETS)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding {CONTEXT_TOKENIZER} unavailable ({e}); estimating tokens from length")
+                _encoding = False
+        return _encoding
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode_ordinary(text))
+    return (len(text) + 3) // 4
+
+def _normalize_sentence(sentence):
+    return " ".join(WORD.findall(sentence.lower()))
+
+def _sentences(text):
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        if match.start() > start:
+            sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+class ContextPacker:
+    """Fit retrieved passages into a prompt-token budget.
+
+    Passages are taken in relevance order. Sentences already included (the
+    overlap between neighbouring chunks, or the same passage found twice)
+    are dropped. A passage over passage_tokens keeps only its sentences that
+    share the most terms with the query, in their original order. The last
+    passage is trimmed the same way to fit what is left of the budget, and
+    packing stops once the budget is full. Citations cover only the passages
+    that made it in.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, passage_tokens=CONTEXT_PASSAGE_TOKENS,
+                 min_passage_tokens=CONTEXT_MIN_PASSAGE_TOKENS):
+        self.token_budget = token_budget
+        self.passage_tokens = passage_tokens
+        self.min_passage_tokens = min_passage_tokens
+
+    def _trim(self, sentences, counts, terms, limit):
+        """Indices of the most query-relevant sentences fitting in limit tokens, in text order"""
+        scores = []
+        for i, sentence in enumerate(sentences):
+            words = set(WORD.findall(sentence.lower()))
+            scores.append((-len(terms & words), i))
+        kept, used = [], 0
+        for _, i in sorted(scores):
+            if used + counts[i] <= limit:
+                kept.append(i)
+                used += counts[i]
+        return sorted(kept)
+
+    def pack(self, query, results):
+        """(context_text, citations, stats) for search results, best first"""
+        with span("context_pack", items=len(results)):
+            terms = {word for word in WORD.findall(query.lower()) if word not in STOPWORDS}
+            separator_tokens = count_tokens(SEPARATOR)
+            seen_sentences = set()
+            passages, citations = [], []
+            raw_tokens = used = 0
+            for entry in results:
+                context = entry["payload"]["context"]
+                sentences = _sentences(context)
+                counts = [count_tokens(sentence) for sentence in sentences]
+                raw_tokens += sum(counts)
+
+                total = len(sentences)
+                keep = []
+                for i, sentence in enumerate(sentences):
+                    key = _normalize_sentence(sentence)
+                    if key and key not in seen_sentences:
+                        keep.append(i)
+                sentences = [sentences[i] for i in keep]
+                counts = [counts[i] for i in keep]
+
+                remaining = self.token_budget - used - (separator_tokens if passages else 0)
+                limit = min(self.passage_tokens or remaining, remaining)
+                if sum(counts) > limit:
+                    keep = self._trim(sentences, counts, terms, limit)
+                    sentences = [sentences[i] for i in keep]
+                    counts = [counts[i] for i in keep]
+                tokens = sum(counts)
+                # Short passages stay; short remnants of deduplicated or trimmed ones do not
+                if not sentences or (len(sentences) < total and tokens < self.min_passage_tokens):
+                    if remaining < self.min_passage_tokens:
+                        break
+                    continue
+
+                seen_sentences.update(_normalize_sentence(sentence) for sentence in sentences)
+                # An untouched passage keeps its original layout (line breaks, lists)
+                passages.append(context.strip() if len(sentences) == total else " ".join(sentences))
+                used += tokens + (separator_tokens if len(passages) > 1 else 0)
+
+                filename = entry["payload"]["filename"]
+                page = entry["payload"]["page"]
+                citation = f"{filename}"
+                if page > 0:
+                    citation += f"(page {page})"
+                if citation not in citations:
+                    citations.append(citation)
+
+            CONTEXT_TOKENS.observe(raw_tokens, state="raw")
+            CONTEXT_TOKENS.observe(used, state="packed")
+            stats = {"candidates": len(results), "passages": len(passages), "raw_tokens": raw_tokens, "packed_tokens": used}
+            return SEPARATOR.join(passages), citations, stats
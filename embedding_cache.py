@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from quantization import packed_dim
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "./embed_cache")
+
+_DIGEST_SIZE = 32
+
+def text_digest(text):
+    """Content address of a chunk: SHA-256 of its UTF-8 text"""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """Append-only, memory-mapped cache of chunk embeddings for one model.
+
+    Rows are addressed by the SHA-256 of the chunk text and stored in three
+    flat files under `path`: the text digests (the index), the packed binary
+    vectors and float16 copies of the float vectors. Binary vectors are kept
+    exactly as computed from the float32 output, so a cache hit inserts the
+    same Milvus rows as a fresh encode.
+
+    Appends are serialized with a thread lock; one process should own a
+    cache directory at a time.
+    """
+
+    def __init__(self, path, model_name, dim):
+        self.path = path
+        self.model_name = model_name
+        self.dim = dim
+        self.packed_dim = packed_dim(dim)
+        self._index_file = os.path.join(path, "index.sha256")
+        self._binary_file = os.path.join(path, "binary.uint8")
+        self._vectors_file = os.path.join(path, "vectors.float16")
+        self._meta_file = os.path.join(path, "meta.json")
+        self._lock = threading.Lock()
+        self._row_of = {}
+        self._rows = 0
+        self._binary = None
+        self._vectors = None
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        meta = {"model_name": self.model_name, "dim": self.dim}
+        if os.path.exists(self._meta_file):
+            with open(self._meta_file) as f:
+                if json.load(f) != meta:
+                    logger.warning(f"Embedding cache {self.path} was built for another model or dimension; resetting")
+                    self._remove_files()
+        with open(self._meta_file, "w") as f:
+            json.dump(meta, f)
+
+        if not os.path.exists(self._index_file):
+            return
+        digests = np.fromfile(self._index_file, dtype=np.uint8)
+        # An interrupted append leaves the index ahead of or behind the vector
+        # files; only rows present in all three are usable
+        rows = min(
+            len(digests) // _DIGEST_SIZE,
+            os.path.getsize(self._binary_file) // self.packed_dim if os.path.exists(self._binary_file) else 0,
+            os.path.getsize(self._vectors_file) // (self.dim * 2) if os.path.exists(self._vectors_file) else 0,
+        )
+        digests = digests[:rows * _DIGEST_SIZE].reshape(rows, _DIGEST_SIZE)
+        self._row_of = {digest.tobytes(): row for row, digest in enumerate(digests)}
+        self._rows = rows
+        for file_path, row_bytes in (
+            (self._index_file, _DIGEST_SIZE),
+            (self._binary_file, self.packed_dim),
+            (self._vectors_file, self.dim * 2),
+        ):
+            if os.path.exists(file_path) and os.path.getsize(file_path) != rows * row_bytes:
+                os.truncate(file_path, rows * row_bytes)
+        logger.info(f"Opened embedding cache {self.path} with {rows} vectors")
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def nbytes(self):
+        return self._rows * (_DIGEST_SIZE + self.packed_dim + self.dim * 2)
+
+    def lookup(self, contexts):
+        """Digests of the contexts and their cache rows (-1 where not cached)"""
+        digests = [text_digest(text) for text in contexts]
+        rows = np.array([self._row_of.get(digest, -1) for digest in digests], dtype=np.int64)
+        hits = int((rows >= 0).sum())
+        with self._lock:
+            self.hits += hits
+            self.misses += len(rows) - hits
+            # Float32 output plus packed vector that did not have to be computed
+            self.bytes_saved += hits * (self.dim * 4 + self.packed_dim)
+        return digests, rows
+
+    def _mapped(self):
+        with self._lock:
+            if self._rows and (self._vectors is None or self._vectors.shape[0] < self._rows):
+                self._vectors = np.memmap(self._vectors_file, dtype=np.float16, mode="r", shape=(self._rows, self.dim))
+                self._binary = np.memmap(self._binary_file, dtype=np.uint8, mode="r", shape=(self._rows, self.packed_dim))
+            return self._vectors, self._binary
+
+    def get(self, rows):
+        """(float32 embeddings, packed binary vectors) for the given cache rows"""
+        vectors, binary = self._mapped()
+        return vectors[rows].astype(np.float32), np.array(binary[rows])
+
+    def add(self, digests, embeddings, binary_embeddings):
+        """Append freshly computed vectors; digests already cached are skipped"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        binary_embeddings = np.asarray(binary_embeddings, dtype=np.uint8).reshape(-1, self.packed_dim)
+        with self._lock:
+            new = {}
+            for i, digest in enumerate(digests):
+                if digest not in self._row_of and digest not in new:
+                    new[digest] = i
+            if not new:
+                return 0
+            positions = list(new.values())
+            # Vectors first, index last: a crash never indexes a missing row
+            with open(self._vectors_file, "ab") as f:
+                f.write(embeddings[positions].astype(np.float16).tobytes())
+            with open(self._binary_file, "ab") as f:
+                f.write(binary_embeddings[positions].tobytes())
+            with open(self._index_file, "ab") as f:
+                f.write(b"".join(new))
+            for offset, digest in enumerate(new):
+                self._row_of[digest] = self._rows + offset
+            self._rows += len(new)
+            return len(new)
+
+    def _remove_files(self):
+        for file_path in (self._index_file, self._binary_file, self._vectors_file):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._rows,
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+class EmbeddingCacheRegistry:
+    """Process-wide map of model name -> EmbeddingCache"""
+
+    def __init__(self, cache_dir=EMBED_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name, dim):
+        with self._lock:
+            cache = self._caches.get(model_name)
+            if cache is None:
+                # Same directory naming as the Hugging Face hub cache
+                path = os.path.join(self.cache_dir, "models--" + model_name.replace("/", "--"))
+                cache = EmbeddingCache(path, model_name, dim)
+                self._caches[model_name] = cache
+            return cache
+
+    def stats(self):
+        with self._lock:
+            caches = dict(self._caches)
+        return {
+            "enabled": EMBED_CACHE_ENABLED,
+            "models": {model_name: cache.stats() for model_name, cache in caches.items()},
+        }
+
+# Shared process-wide registry
+embedding_caches = EmbeddingCacheRegistry()
@@ -0,0 +1,102 @@
+import os
+import asyncio
+import logging
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# Concurrency limits (override via environment)
+# Embedding gets one small pool: the encoder already uses every core through
+# torch intra-op threads and releases the GIL while it runs, so a few workers
+# keep the CPU busy without oversubscribing it.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+# PDF parsing runs on its own pool so it overlaps with embedding
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+# PDF text extraction runs in worker processes, one file per task; at most this many files at once process-wide
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# A file whose extraction takes longer (seconds) is skipped and its worker replaced
+PARSE_FILE_TIMEOUT = float(os.getenv("PARSE_FILE_TIMEOUT", "120"))
+# Milvus calls and query-time retrieval are short and latency sensitive; they get
+# their own pool so they never queue behind a bulk upload.
+MILVUS_WORKERS = int(os.getenv("MILVUS_WORKERS", "8"))
+# LLM query rewrites for multi-query retrieval; a retrieval thread waits on one with a timeout
+EXPANSION_WORKERS = int(os.getenv("EXPANSION_WORKERS", "4"))
+# Maximum number of in-flight LLM requests per process
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+milvus_executor = ThreadPoolExecutor(max_workers=MILVUS_WORKERS, thread_name_prefix="milvus")
+parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+expansion_executor = ThreadPoolExecutor(max_workers=EXPANSION_WORKERS, thread_name_prefix="expand")
+
+# Files being extracted across every caller; a caller holds one slot per task it has submitted
+parse_slots = threading.BoundedSemaphore(max(1, PARSE_PROCESSES))
+_parse_pools = set()
+_parse_pools_lock = threading.Lock()
+
+def new_parse_process_pool(max_workers=PARSE_PROCESSES):
+    """Process pool for one caller's PDF extraction; its workers are never shared with another caller"""
+    # spawn: forking a process that holds torch threads can deadlock
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    with _parse_pools_lock:
+        _parse_pools.add(pool)
+    return pool
+
+def close_parse_process_pool(pool, terminate=False):
+    """Shut down a pool from new_parse_process_pool; terminate kills workers stuck on a task"""
+    with _parse_pools_lock:
+        _parse_pools.discard(pool)
+    if terminate:
+        # ProcessPoolExecutor cannot cancel a running task, so its workers are terminated
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+_llm_semaphore = None
+
+def _get_llm_semaphore():
+    # Created lazily so it binds to the running event loop
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    return _llm_semaphore
+
+def _in_context(fn, *args, **kwargs):
+    # Context variables (e.g. the request trace) follow the call into the pool thread
+    return partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+async def run_embed(fn, *args, **kwargs):
+    """Run CPU-bound embedding work on the bounded embedding pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(embed_executor, _in_context(fn, *args, **kwargs))
+
+async def run_parse(fn, *args, **kwargs):
+    """Run PDF parsing on the parse pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parse_executor, _in_context(fn, *args, **kwargs))
+
+async def run_milvus(fn, *args, **kwargs):
+    """Run Milvus I/O and query-time retrieval on the Milvus thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(milvus_executor, _in_context(fn, *args, **kwargs))
+
+@asynccontextmanager
+async def llm_slot():
+    """Hold one of the LLM_CONCURRENCY slots for the duration of a completion."""
+    async with _get_llm_semaphore():
+        yield
+
+def shutdown():
+    embed_executor.shutdown(wait=False, cancel_futures=True)
+    milvus_executor.shutdown(wait=False, cancel_futures=True)
+    parse_executor.shutdown(wait=False, cancel_futures=True)
+    expansion_executor.shutdown(wait=False, cancel_futures=True)
+    with _parse_pools_lock:
+        pools = list(_parse_pools)
+    for pool in pools:
+        close_parse_process_pool(pool, terminate=True)
@@ -71,6 +71,25 @@ export default function AdminDashboard() {
     }
   }
 
+  const waitForJob = async (jobId: string) => {
+    // Poll the ingestion job until it reaches a terminal state
+    while (true) {
+      const response = await fetch(`http://localhost:8000/api/jobs/${jobId}`)
+      const job = await response.json()
+      if (!response.ok) {
+        return { status: 'failed', error: job.detail, files: [] }
+      }
+      if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+        return job
+      }
+      const { pages_parsed, chunks_parsed, vectors_embedded, rows_inserted } = job.progress
+      setUploadProgress(
+        `Processing (${job.stage}): ${pages_parsed} pages parsed into ${chunks_parsed} chunks, ${vectors_embedded} embedded, ${rows_inserted} stored`
+      )
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+    }
+  }
+
   const handleFileUpload = async (files: FileList | null) => {
     if (!files || files.length === 0 || !sessionId || !groqApiKey) return
 
@@ -92,8 +111,19 @@ export default function AdminDashboard() {
       )
 
       if (response.ok) {
-        const data = await response.json()
-        setUploadProgress(`Successfully processed ${data.processed_count} document(s)`)
+        let data = await response.json()
+        if (data.job_id) {
+          data = await waitForJob(data.job_id)
+          if (data.status !== 'completed') {
+            alert(`Processing ${data.status}: ${data.error ?? ''}`)
+            setUploadProgress('')
+            await loadSessionInfo(sessionId)
+            return
+          }
+          setUploadProgress(`Successfully processed ${data.files.length} document(s)`)
+        } else {
+          setUploadProgress(data.message)
+        }
         await loadSessionInfo(sessionId)
         setTimeout(() => setUploadProgress(''), 3000)
       } else {
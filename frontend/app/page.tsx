@@ -52,7 +52,7 @@ export default function ChatPage() {
       let citations: string[] = []
 
       ws.onopen = () => {
-        ws.send(JSON.stringify({ query: input }))
+        ws.send(JSON.stringify({ query: input, groq_api_key: groqApiKey }))
       }
 
       ws.onmessage = (event) => {
@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Number of ingestion jobs processed concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Finished jobs are kept this long (seconds) so clients can still read their status
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+class IngestionJob:
+    """A queued parse -> embed -> insert run for a set of uploaded files.
+
+    Progress is updated from worker threads through update(), and pushed to
+    every watcher on the event loop that created the job.
+    """
+
+    def __init__(self, session_id, files, groq_api_key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.files = files  # list of {"filename", "content_hash", "data"}
+        self.groq_api_key = groq_api_key
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.error = None
+        self.file_errors = {}  # filename -> why it was skipped
+        self.timings = None  # per-stage breakdown, set when the job ends
+        self.progress = {
+            "files_total": len(files),
+            "files_parsed": 0,
+            "files_failed": 0,
+            "pages_parsed": 0,
+            "chunks_parsed": 0,
+            "vectors_embedded": 0,
+            "rows_inserted": 0,
+        }
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._loop = asyncio.get_running_loop()
+        self._watchers = set()
+
+    @property
+    def filenames(self):
+        return [f["filename"] for f in self.files]
+
+    @property
+    def content_hashes(self):
+        return [f["content_hash"] for f in self.files]
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "stage": self.stage,
+            "files": self.filenames,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "file_errors": dict(self.file_errors),
+            "timings": self.timings,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+        }
+
+    def update(self, stage=None, **increments):
+        """Advance stage and/or add to progress counters. Safe to call from any thread."""
+        self.check_cancelled()
+        if stage is not None:
+            self.stage = stage
+        for key, value in increments.items():
+            self.progress[key] = self.progress.get(key, 0) + value
+        self._publish()
+
+    def fail_file(self, filename, error):
+        """Record a file that was skipped while the rest of the job carries on"""
+        self.file_errors[filename] = str(error)
+        self.update(files_failed=1)
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.stage = status
+        self.error = error
+        self.finished_at = time.time()
+        self._publish()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def release_payload(self):
+        # File bytes are only needed until parsing is done
+        for f in self.files:
+            f.pop("data", None)
+
+    def _publish(self):
+        self.updated_at = time.time()
+        self._loop.call_soon_threadsafe(self._notify_watchers, self.to_dict())
+
+    def _notify_watchers(self, snapshot):
+        for queue in self._watchers:
+            queue.put_nowait(snapshot)
+
+    async def watch(self):
+        """Yield a snapshot now and after every change until the job finishes."""
+        queue = asyncio.Queue()
+        self._watchers.add(queue)
+        try:
+            snapshot = self.to_dict()
+            yield snapshot
+            while snapshot["status"] not in TERMINAL_STATES:
+                snapshot = await queue.get()
+                yield snapshot
+        finally:
+            self._watchers.discard(queue)
+
+class IngestionQueue:
+    """In-process job queue drained by a fixed number of asyncio workers.
+
+    handler is an async callable taking the job; it reports progress through
+    job.update() and may raise JobCancelled.
+    """
+
+    def __init__(self, handler, workers=INGEST_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} ingestion workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job):
+        self._prune()
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        logger.info(f"Queued ingestion job {job.id} for session {job.session_id} ({len(job.files)} file(s))")
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def active_jobs(self, session_id=None):
+        return [
+            job for job in self.jobs.values()
+            if not job.done and (session_id is None or job.session_id == session_id)
+        ]
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if not job.done:
+            job.cancel()
+            if job.status == QUEUED:
+                job.finish(CANCELLED)
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self.jobs.values() if j.done and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _worker(self, worker_id):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.done:
+                    continue
+                job.status = RUNNING
+                job.update(stage=RUNNING)
+                await self.handler(job)
+                job.finish(COMPLETED)
+                logger.info(f"Ingestion job {job.id} completed: {job.progress}")
+            except JobCancelled:
+                job.finish(CANCELLED)
+                logger.info(f"Ingestion job {job.id} cancelled")
+            except Exception as e:
+                logger.error(f"Ingestion job {job.id} failed: {e}")
+                job.finish(FAILED, error=str(e))
+            finally:
+                job.release_payload()
+                self._queue.task_done()
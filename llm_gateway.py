@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import hashlib
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+import httpx
+from executors import llm_slot
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# OpenAI-compatible endpoint; point it at benchmarks/mock_llm_server.py for offline load tests
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+# In-flight completions per API key (on top of the process-wide LLM_CONCURRENCY)
+LLM_KEY_CONCURRENCY = int(os.getenv("LLM_KEY_CONCURRENCY", "8"))
+# Requests per minute per API key; 0 disables rate limiting
+LLM_KEY_RPM = float(os.getenv("LLM_KEY_RPM", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Pooled connections per API key
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+# Per-key clients kept open; the least recently used idle ones are closed beyond this
+LLM_MAX_KEYS = int(os.getenv("LLM_MAX_KEYS", "256"))
+# Seconds after which the client of an unused key is closed
+LLM_KEY_IDLE_TTL = float(os.getenv("LLM_KEY_IDLE_TTL", "600"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """A completion failed after retries (or with a non-retryable error)."""
+
+class _RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket allowing `rate_per_minute` acquisitions a minute with bursts up to `burst`"""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class _KeyState:
+    """Connection pool, concurrency cap and rate limiter shared by every session using one API key.
+
+    The key itself is not kept; it is sent with each request.
+    """
+
+    def __init__(self, base_url):
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            http2=False
+        )
+        self.semaphore = asyncio.Semaphore(LLM_KEY_CONCURRENCY)
+        self.limiter = RateLimiter(LLM_KEY_RPM) if LLM_KEY_RPM > 0 else None
+        # Streams in flight; a state is only closed while this is 0
+        self.active = 0
+        self.last_used = time.monotonic()
+
+def _key_digest(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+class LLMGateway:
+    """Process-wide async client for OpenAI-compatible chat completions (Groq).
+
+    One pooled HTTP client per API key, so connections are reused across
+    sessions. Each key has its own concurrency cap and optional rate limit, and
+    every call also holds one of the process-wide llm_slot()s. Connection
+    errors, timeouts and 408/409/429/5xx responses are retried with
+    exponential backoff (honouring Retry-After) as long as nothing has been
+    streamed yet. TTFT and tokens per second go to the stage metrics.
+
+    Per-key states are held by a hash of the key in LRU order. Idle states are
+    closed after idle_ttl seconds, or when more than max_keys are open.
+    """
+
+    def __init__(self, base_url=GROQ_BASE_URL, max_retries=LLM_MAX_RETRIES, retry_base_delay=LLM_RETRY_BASE_DELAY,
+                 max_keys=LLM_MAX_KEYS, idle_ttl=LLM_KEY_IDLE_TTL):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self._keys = OrderedDict()
+        self.evictions = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.tokens = 0
+
+    async def _acquire_state(self, api_key):
+        """The key's state, marked active so it cannot be evicted until released"""
+        # Only touched from the event loop, so no lock is needed
+        digest = _key_digest(api_key)
+        state = self._keys.get(digest)
+        if state is None:
+            state = self._keys[digest] = _KeyState(self.base_url)
+        self._keys.move_to_end(digest)
+        state.active += 1
+        await self._evict()
+        return state
+
+    def _release_state(self, state):
+        state.active -= 1
+        state.last_used = time.monotonic()
+
+    async def _evict(self):
+        """Close idle states past idle_ttl, and the least recently used idle ones beyond max_keys"""
+        now = time.monotonic()
+        excess = len(self._keys) - self.max_keys
+        for digest, state in list(self._keys.items()):
+            if state.active:
+                continue
+            if excess > 0 or now - state.last_used > self.idle_ttl:
+                # Another eviction may have taken it while this one awaited a close
+                if self._keys.pop(digest, None) is None:
+                    continue
+                excess -= 1
+                self.evictions += 1
+                await state.client.aclose()
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return self.retry_base_delay * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def stream(self, api_key, model, prompt, temperature=0.4, max_tokens=1000):
+        """Yield text deltas of a streamed completion"""
+        if not api_key:
+            raise LLMError("Groq API key is required")
+        headers = {"Authorization": f"Bearer {api_key}"}
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        state = await self._acquire_state(api_key)
+        deltas = self._stream(state, headers, payload)
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            # Closed here, not by the garbage collector, so the slots are freed at once
+            await deltas.aclose()
+            self._release_state(state)
+
+    async def _stream(self, state, headers, payload):
+        # Key cap first, so a saturated key does not hold global slots other keys could use
+        async with state.semaphore, llm_slot():
+            self.requests += 1
+            attempt = 0
+            while True:
+                if state.limiter is not None:
+                    await state.limiter.acquire()
+                start = time.perf_counter()
+                first_token = None
+                usage_tokens = None
+                deltas = 0
+                try:
+                    async with state.client.stream("POST", "/chat/completions", json=payload, headers=headers) as response:
+                        if response.status_code in RETRYABLE_STATUS:
+                            retry_after = response.headers.get("retry-after")
+                            raise _RetryableError(
+                                f"HTTP {response.status_code}",
+                                float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else None
+                            )
+                        if response.status_code >= 400:
+                            body = (await response.aread()).decode("utf-8", "replace")
+                            raise LLMError(f"HTTP {response.status_code}: {body[:500]}")
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            try:
+                                event = json.loads(data)
+                            except json.JSONDecodeError:
+                                # One bad event is not worth failing a partly streamed answer
+                                logger.warning(f"Skipping malformed stream event: {data[:200]!r}")
+                                continue
+                            if not isinstance(event, dict):
+                                continue
+                            usage = event.get("usage") or (event.get("x_groq") or {}).get("usage")
+                            if usage:
+                                usage_tokens = usage.get("completion_tokens", usage_tokens)
+                            for choice in event.get("choices", ()):
+                                delta = (choice.get("delta") or {}).get("content")
+                                if delta:
+                                    if first_token is None:
+                                        first_token = time.perf_counter()
+                                        observe("llm_ttft", first_token - start)
+                                    deltas += 1
+                                    yield delta
+                except (_RetryableError, httpx.TransportError) as e:
+                    # Retrying after text went out would duplicate it
+                    if first_token is not None or attempt >= self.max_retries:
+                        self.failures += 1
+                        raise LLMError(f"LLM request failed: {e}") from e
+                    delay = self._backoff(attempt, getattr(e, "retry_after", None))
+                    attempt += 1
+                    self.retries += 1
+                    logger.warning(f"LLM request failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                except LLMError:
+                    self.failures += 1
+                    raise
+
+                elapsed = time.perf_counter() - start
+                tokens = usage_tokens if usage_tokens is not None else deltas
+                self.tokens += tokens
+                observe("llm_stream", elapsed)
+                if first_token is not None and tokens > 1 and elapsed > first_token - start:
+                    observe("llm_decode", elapsed - (first_token - start), items=tokens)
+                return
+
+    async def complete(self, api_key, model, prompt, temperature=0.4, max_tokens=1000):
+        """Full completion text (streamed underneath, so TTFT is still measured)"""
+        parts = []
+        async for delta in self.stream(api_key, model, prompt, temperature=temperature, max_tokens=max_tokens):
+            parts.append(delta)
+        return "".join(parts)
+
+    async def close(self):
+        for state in self._keys.values():
+            await state.client.aclose()
+        self._keys.clear()
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "api_keys": len(self._keys),
+            "key_evictions": self.evictions,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "completion_tokens": self.tokens,
+        }
+
+# Shared process-wide gateway
+llm_gateway = LLMGateway()
@@ -0,0 +1,146 @@
+import os
+import logging
+import threading
+import torch
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+HF_CACHE_DIR = "./hf_cache"
+DEFAULT_EMBED_MODEL = "BAAI/bge-m3"
+
+_DTYPES = {
+    "fp32": torch.float32,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+}
+
+def default_device():
+    """Device used when none is requested (EMBED_DEVICE overrides auto-detection)."""
+    device = os.getenv("EMBED_DEVICE")
+    if device:
+        return device
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def default_precision():
+    return os.getenv("EMBED_PRECISION", "fp32")
+
+# "torch": PyTorch SentenceTransformer (EMBED_PRECISION applies)
+# "onnx": ONNX Runtime export of the same weights
+# "onnx-int8": ONNX Runtime with dynamically int8-quantized weights
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def default_backend():
+    return os.getenv("EMBED_BACKEND", "torch")
+
+# Instruction set targeted by the int8 export: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANT_CONFIG = os.getenv("EMBED_ONNX_QUANT_CONFIG", "avx512_vnni")
+
+class ModelRegistry:
+    """Process-wide cache of embedding models keyed by (model name, device, precision, backend).
+
+    Each model is loaded at most once and shared by every session, EmbedData
+    and Retriever in the process. Loads of different keys can run in parallel;
+    concurrent requests for the same key wait for the single in-flight load.
+    """
+
+    def __init__(self, cache_folder=HF_CACHE_DIR):
+        self.cache_folder = cache_folder
+        self._models = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _resolve_key(self, model_name, device=None, precision=None, backend=None):
+        device = device or default_device()
+        precision = precision or default_precision()
+        backend = backend or default_backend()
+        if precision not in _DTYPES:
+            raise ValueError(f"Unsupported precision '{precision}'. Choose one of: {', '.join(_DTYPES)}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+        if backend != "torch" and precision != "fp32":
+            raise ValueError(f"Precision '{precision}' only applies to the torch backend")
+        return (model_name, device, precision, backend)
+
+    def _get_key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _onnx_dir(self, model_name):
+        return os.path.join(self.cache_folder, "onnx", model_name.replace("/", "--"))
+
+    def _load_onnx(self, model_name, device, quantized):
+        """Load the ONNX export of a model, exporting (and quantizing) it into the cache on first use"""
+        export_dir = self._onnx_dir(model_name)
+        if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+            logger.info(f"Exporting {model_name} to ONNX under {export_dir}...")
+            model = SentenceTransformer(model_name, device=device, backend="onnx", cache_folder=self.cache_folder)
+            model.save_pretrained(export_dir)
+        if not quantized:
+            return SentenceTransformer(export_dir, device=device, backend="onnx")
+
+        file_name = f"onnx/model_qint8_{ONNX_QUANT_CONFIG}.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            logger.info(f"Quantizing the ONNX export of {model_name} to int8 ({ONNX_QUANT_CONFIG})...")
+            model = SentenceTransformer(export_dir, device=device, backend="onnx")
+            export_dynamic_quantized_onnx_model(model, ONNX_QUANT_CONFIG, export_dir)
+        return SentenceTransformer(export_dir, device=device, backend="onnx", model_kwargs={"file_name": file_name})
+
+    def _load(self, key):
+        model_name, device, precision, backend = key
+        logger.info(f"Loading embedding model {model_name} on {device} ({backend}, {precision})...")
+        if backend != "torch":
+            model = self._load_onnx(model_name, device, quantized=backend == "onnx-int8")
+            logger.info(f"Loaded embedding model {model_name}")
+            return model
+        model = SentenceTransformer(
+            model_name,
+            device=device,
+            cache_folder=self.cache_folder
+        )
+        if precision != "fp32":
+            model = model.to(_DTYPES[precision])
+        model.eval()
+        logger.info(f"Loaded embedding model {model_name}")
+        return model
+
+    def get(self, model_name=DEFAULT_EMBED_MODEL, device=None, precision=None, backend=None):
+        """Return the shared model for this key, loading it on first use."""
+        key = self._resolve_key(model_name, device, precision, backend)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._get_key_lock(key):
+            # Another thread may have finished loading while we waited
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(key)
+                self._models[key] = model
+        return model
+
+    def warm_up(self, model_names=None, device=None, precision=None, backend=None):
+        """Load the given models and run one encode so kernels are initialized."""
+        for model_name in model_names or [DEFAULT_EMBED_MODEL]:
+            model = self.get(model_name, device=device, precision=precision, backend=backend)
+            model.encode("warm up")
+
+    def loaded(self):
+        """Keys of the models currently held by the registry."""
+        return list(self._models.keys())
+
+    def release(self, model_name=None):
+        """Drop cached models (all of them, or every key for one model name)."""
+        with self._lock:
+            for key in list(self._models.keys()):
+                if model_name is None or key[0] == model_name:
+                    del self._models[key]
+
+# Shared process-wide registry
+registry = ModelRegistry()
+
+def get_embed_model(model_name=DEFAULT_EMBED_MODEL, device=None, precision=None, backend=None):
+    return registry.get(model_name, device=device, precision=precision, backend=backend)
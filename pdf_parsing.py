@@ -0,0 +1,19 @@
+import io
+import pypdf
+
+# Runs inside the parse worker processes: keep this module free of heavy
+# imports (torch, llama_index) so spawned workers start fast.
+
+def extract_pdf_pages(source, file_name):
+    """Return [(text, metadata)] for every page of a PDF given as a path or bytes.
+
+    Metadata matches llama_index's PDFReader (file_name, page_label).
+    """
+    fp = open(source, "rb") if isinstance(source, str) else io.BytesIO(source)
+    with fp:
+        pdf = pypdf.PdfReader(fp)
+        page_labels = pdf.page_labels
+        return [
+            (page.extract_text(), {"page_label": page_labels[index], "file_name": file_name})
+            for index, page in enumerate(pdf.pages)
+        ]
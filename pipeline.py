@@ -0,0 +1,284 @@
+import io
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import pypdf
+from llama_index.core import Document
+from executors import (
+    run_parse, run_embed, run_milvus,
+    new_parse_process_pool, close_parse_process_pool, parse_slots, PARSE_PROCESSES, PARSE_FILE_TIMEOUT
+)
+from pdf_parsing import extract_pdf_pages
+from metrics import span, observe
+
+logger = logging.getLogger(__name__)
+
+# Batches buffered between two stages; bounds peak memory to a few batches
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+
+# Seconds between checks for a free parse slot while this call's own files are running
+_SLOT_POLL_INTERVAL = 0.5
+
+def document_metadata(doc, fallback_filename):
+    """Citation metadata (filename, 1-based page) for a loaded PDF page"""
+    filename = "unknown"
+    page = 0
+
+    if hasattr(doc, 'metadata') and doc.metadata:
+        if 'file_name' in doc.metadata:
+            filename = doc.metadata['file_name']
+        elif 'source' in doc.metadata:
+            filename = doc.metadata['source'].split('/')[-1] if '/' in doc.metadata['source'] else doc.metadata['source']
+
+        if 'page_label' in doc.metadata:
+            try:
+                page = int(doc.metadata['page_label'])
+            except (ValueError, TypeError):
+                page = 0
+        elif 'page' in doc.metadata:
+            try:
+                page = int(doc.metadata['page'])
+            except (ValueError, TypeError):
+                page = 0
+
+    if filename == "unknown":
+        filename = fallback_filename
+
+    return {
+        "filename": filename,
+        "page": page + 1
+    }
+
+def iter_pdf_pages(source, file_name=None):
+    """Yield one Document per PDF page of a path or in-memory buffer, extracting text lazily.
+
+    Metadata matches llama_index's PDFReader (file_name, page_label).
+    """
+    if isinstance(source, str):
+        file_name = file_name or os.path.basename(source)
+        fp = open(source, "rb")
+    else:
+        fp = io.BytesIO(source)
+    with fp:
+        pdf = pypdf.PdfReader(fp)
+        page_labels = pdf.page_labels
+        for index, page in enumerate(pdf.pages):
+            with span("parse", items=1):
+                text = page.extract_text()
+            yield Document(
+                text=text,
+                metadata={"page_label": page_labels[index], "file_name": file_name}
+            )
+
+def iter_page_records(files, on_file_parsed=None, on_page_parsed=None, on_file_failed=None, timeout=PARSE_FILE_TIMEOUT):
+    """Yield (text, metadata) for every page of every (source, filename) pair.
+
+    A source is a file path or the file's bytes.
+
+    With PARSE_PROCESSES > 0 files are extracted in parallel worker processes
+    and their pages are yielded as each file finishes. A file that fails to
+    parse or takes longer than timeout seconds is skipped and reported through
+    on_file_failed(filename, error); the rest of the batch carries on.
+    """
+    if PARSE_PROCESSES <= 0:
+        for source, filename in files:
+            for doc in iter_pdf_pages(source, filename):
+                if on_page_parsed:
+                    on_page_parsed()
+                yield doc.text, document_metadata(doc, filename)
+            if on_file_parsed:
+                on_file_parsed(filename)
+        return
+
+    for filename, pages in iter_parsed_files(files, timeout, on_file_failed):
+        for text, metadata in pages:
+            if on_page_parsed:
+                on_page_parsed()
+            yield text, document_metadata(Document(text=text, metadata=metadata), filename)
+        if on_file_parsed:
+            on_file_parsed(filename)
+
+def iter_parsed_files(files, timeout=PARSE_FILE_TIMEOUT, on_file_failed=None):
+    """Yield (filename, [(text, metadata)]) per file, in completion order, from worker processes.
+
+    Every call runs its own process pool, and each submitted file holds one
+    of the process-wide parse_slots, so at most PARSE_PROCESSES files are in
+    flight across all concurrent calls. A file is only submitted once a worker
+    is free to start it, and its deadline is measured from there. When a file
+    overruns, only this call's workers are killed and its other in-flight
+    files are resubmitted to a fresh pool.
+    """
+    pending = deque(files)
+    in_flight = {}  # future -> (source, filename, deadline)
+    retried = set()
+    pool = None
+
+    def fail(filename, error):
+        logger.warning(f"Skipping {filename}: {error}")
+        if on_file_failed:
+            on_file_failed(filename, error)
+
+    def finish(future):
+        parse_slots.release()
+        return in_flight.pop(future)
+
+    def restart_pool(pool):
+        # Requeues the unfinished files; the caller has already taken the ones it handles
+        for future in list(in_flight):
+            future.cancel()
+            source, filename, _ = finish(future)
+            pending.appendleft((source, filename))
+        close_parse_process_pool(pool, terminate=True)
+
+    try:
+        while pending or in_flight:
+            while pending:
+                # Files retried after a worker crash run alone, so a second crash is theirs
+                if in_flight and (pending[0][1] in retried or any(name in retried for _, name, _ in in_flight.values())):
+                    break
+                # Wait for a slot only with nothing of our own running; otherwise collect results first
+                if not parse_slots.acquire(blocking=not in_flight):
+                    break
+                if pool is None:
+                    pool = new_parse_process_pool(min(PARSE_PROCESSES, len(pending) + len(in_flight)))
+                source, filename = pending.popleft()
+                future = pool.submit(extract_pdf_pages, source, filename)
+                future.submitted = time.perf_counter()
+                in_flight[future] = (source, filename, time.monotonic() + timeout)
+
+            next_deadline = min(deadline for _, _, deadline in in_flight.values())
+            wait_seconds = max(0.0, next_deadline - time.monotonic())
+            if pending:
+                # Slots freed by other callers are picked up without waiting for our own files
+                wait_seconds = min(wait_seconds, _SLOT_POLL_INTERVAL)
+            done, _ = wait(in_flight, timeout=wait_seconds, return_when=FIRST_COMPLETED)
+
+            if not done:
+                now = time.monotonic()
+                expired = [future for future, (_, _, deadline) in in_flight.items() if deadline <= now]
+                if not expired:
+                    continue
+                for future in expired:
+                    _, filename, _ = finish(future)
+                    fail(filename, f"parsing timed out after {timeout:.0f}s")
+                restart_pool(pool)
+                pool = None
+                continue
+
+            broken = False
+            for future in done:
+                source, filename, _ = finish(future)
+                try:
+                    pages = future.result()
+                except BrokenProcessPool as e:
+                    # A worker died; which file killed it is unknown, so each gets one solo retry
+                    broken = True
+                    if filename in retried:
+                        fail(filename, e)
+                    else:
+                        retried.add(filename)
+                        pending.append((source, filename))
+                    continue
+                except Exception as e:
+                    fail(filename, e)
+                    continue
+                # Worker time for the file, as seen from here
+                observe("parse", time.perf_counter() - future.submitted, items=len(pages))
+                yield filename, pages
+            if broken:
+                restart_pool(pool)
+                pool = None
+    finally:
+        # Files still running when the caller stopped reading are killed with their workers
+        abandoned = bool(in_flight)
+        for future in list(in_flight):
+            future.cancel()
+            finish(future)
+        if pool is not None:
+            close_parse_process_pool(pool, terminate=abandoned)
+
+def take(iterator, n):
+    """Pull up to n items from an iterator"""
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) == n:
+            break
+    return batch
+
+async def run_pipeline(
+    records,
+    embeddata,
+    vector_db,
+    batch_size=512,
+    queue_size=PIPELINE_QUEUE_SIZE,
+    on_parsed=None,
+    on_embedded=None,
+    on_inserted=None
+):
+    """Stream (text, metadata) records through embed -> quantize -> insert.
+
+    Each stage runs on its own executor and hands batches to the next through a
+    bounded queue, so parsing, embedding and Milvus inserts overlap and only a
+    few batches are ever held in memory. Returns the number of rows inserted.
+    """
+    records = iter(records)
+    parsed_batches = asyncio.Queue(maxsize=queue_size)
+    encoded_batches = asyncio.Queue(maxsize=queue_size)
+
+    async def parse_stage():
+        while True:
+            batch = await run_parse(take, records, batch_size)
+            if not batch:
+                break
+            # Similar lengths end up in the same encoder batches, so less padding
+            batch.sort(key=lambda record: len(record[0]))
+            if on_parsed:
+                on_parsed(len(batch))
+            await parsed_batches.put(batch)
+        await parsed_batches.put(None)
+
+    async def embed_stage():
+        while (batch := await parsed_batches.get()) is not None:
+            contexts = [text for text, _ in batch]
+            metadata = [meta for _, meta in batch]
+            if vector_db.sparse:
+                embeddings, binary_embeddings, sparse_embeddings = await run_embed(embeddata.embed_batch_with_sparse, contexts)
+            else:
+                embeddings, binary_embeddings = await run_embed(embeddata.embed_batch, contexts)
+                sparse_embeddings = None
+            if on_embedded:
+                on_embedded(len(contexts))
+            # Float embeddings ride along for the vector DB's rescore store, if any
+            await encoded_batches.put((contexts, binary_embeddings, metadata, embeddings, sparse_embeddings))
+        await encoded_batches.put(None)
+
+    async def insert_stage():
+        total_inserted = 0
+        while (item := await encoded_batches.get()) is not None:
+            inserted = await run_milvus(vector_db.insert_batch, *item)
+            total_inserted += inserted
+            if on_inserted:
+                on_inserted(inserted)
+        return total_inserted
+
+    tasks = [
+        asyncio.create_task(parse_stage()),
+        asyncio.create_task(embed_stage()),
+        asyncio.create_task(insert_stage()),
+    ]
+    try:
+        _, _, total_inserted = await asyncio.gather(*tasks)
+    except BaseException:
+        # A failed stage would leave the others blocked on their queues
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    logger.info(f"Pipeline ingested {total_inserted} documents into '{vector_db.collection_name}'")
+    return total_inserted
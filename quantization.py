@@ -0,0 +1,55 @@
+import sys
+import threading
+import numpy as np
+
+# Multiplying eight 0/1 bytes (read as one little-endian uint64) by this constant
+# gathers them into the top byte, first byte in the most significant bit - the
+# same layout np.packbits produces.
+_GATHER_BITS = np.uint64(0x8040201008040201)
+_FAST_PATH = sys.byteorder == "little"
+
+_scratch = threading.local()
+
+def packed_dim(dim):
+    """Bytes per packed binary vector of the given dimension"""
+    return (dim + 7) // 8
+
+def _get_scratch(rows, dim):
+    # Per-thread scratch buffers, grown on demand and reused across batches
+    signs = getattr(_scratch, "signs", None)
+    if signs is None or signs.shape[0] < rows or signs.shape[1] != dim:
+        _scratch.signs = np.empty((rows, dim), dtype=np.bool_)
+        _scratch.words = np.empty((rows, dim // 8), dtype=np.uint64)
+    return _scratch.signs[:rows], _scratch.words[:rows]
+
+def pack_signs(embeddings, out=None):
+    """Binary-quantize a float batch: bit i is set when component i > 0.
+
+    embeddings is a (n, dim) or (dim,) float array; the result is a (n, dim/8)
+    uint8 array (or (dim/8,) for a single vector), identical to
+    np.packbits(embeddings > 0, axis=-1). Pass a preallocated uint8 array as
+    out to avoid allocating the result; no other per-batch arrays are created
+    for contiguous float32 input.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    single = embeddings.ndim == 1
+    if single:
+        embeddings = embeddings[np.newaxis, :]
+    rows, dim = embeddings.shape
+
+    if out is None:
+        out = np.empty((rows, packed_dim(dim)), dtype=np.uint8)
+    elif single and out.ndim == 1:
+        out = out[np.newaxis, :]
+
+    if not _FAST_PATH or dim % 8 != 0:
+        out[...] = np.packbits(embeddings > 0, axis=1)
+        return out[0] if single else out
+
+    signs, words = _get_scratch(rows, dim)
+    np.greater(embeddings, 0, out=signs)
+    # Each group of eight sign bytes becomes one uint64; the gathered bits end
+    # up in its most significant (last, on little-endian) byte
+    np.multiply(signs.view(np.uint64), _GATHER_BITS, out=words)
+    np.copyto(out, words.view(np.uint8)[:, 7::8])
+    return out[0] if single else out
@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "600"))
+CONTEXT_CACHE_MAX_BYTES = int(os.getenv("CONTEXT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+# Minimum cosine similarity between query embeddings to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# Rough per-entry bookkeeping cost (dict slots, tuples, floats)
+_ENTRY_OVERHEAD = 200
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive cache key for a query"""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def _text_bytes(*texts):
+    return sum(len(text.encode("utf-8")) for text in texts if text)
+
+class CacheStats:
+    """Hit/miss counters shared by every cache of one layer"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def to_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class LRUCache:
+    """Byte-bounded LRU map with a per-entry TTL"""
+
+    def __init__(self, max_bytes, ttl, stats):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = stats
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[2] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[0]
+
+    def put(self, key, value, size):
+        size += _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def peek(self, key):
+        """Value for key if present and fresh, without touching stats or LRU order"""
+        entry = self._entries.get(key)
+        if entry is None or entry[2] < time.monotonic():
+            return None
+        return entry[0]
+
+    def items(self):
+        now = time.monotonic()
+        return [(key, entry[0]) for key, entry in self._entries.items() if entry[2] >= now]
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.nbytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+class QueryCache:
+    """Two-layer cache for one collection.
+
+    - context layer: normalized query text -> (context, citations)
+    - answer layer: query embedding similar above a threshold -> (answer, citations)
+
+    Both layers are cleared whenever rows are added to or removed from the
+    collection. Writers pass the generation they read before computing, so a
+    result computed against the old rows is never stored after an invalidation.
+    """
+
+    def __init__(self, context_stats, answer_stats):
+        self._lock = threading.Lock()
+        self.generation = 0
+        self._contexts = LRUCache(CONTEXT_CACHE_MAX_BYTES, QUERY_CACHE_TTL, context_stats)
+        self._answers = LRUCache(ANSWER_CACHE_MAX_BYTES, QUERY_CACHE_TTL, answer_stats)
+        self._answer_matrix = None  # stacked embeddings of the answer layer, rebuilt lazily
+        self._answer_keys = []
+
+    def get_context(self, query, top_k):
+        with self._lock:
+            entry = self._contexts.get((normalize_query(query), top_k))
+            if entry is None:
+                return None
+            context_text, citations = entry
+            return context_text, list(citations)
+
+    def put_context(self, query, top_k, context_text, citations, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            size = _text_bytes(context_text, *citations)
+            self._contexts.put((normalize_query(query), top_k), (context_text, list(citations)), size)
+
+    def get_answer(self, query, query_embedding=None):
+        """Cached (answer, citations) for this query, or None.
+
+        An exact (normalized) text match is always tried first. Without an
+        embedding a text miss is not counted, so callers can try the cheap
+        lookup before encoding the query; with one, the closest cached query
+        above ANSWER_CACHE_THRESHOLD is used.
+        """
+        with self._lock:
+            entry = self._answers.peek(normalize_query(query))
+            if entry is not None:
+                _, answer, citations = self._answers.get(normalize_query(query))
+                return answer, list(citations)
+            if query_embedding is None:
+                return None
+
+            items = self._answers.items()
+            if not items:
+                self._answers.stats.misses += 1
+                return None
+            # LRU reordering does not change the set of keys, so the stacked
+            # matrix is only rebuilt after inserts, evictions or expiry
+            if set(key for key, _ in items) != set(self._answer_keys):
+                self._answer_keys = [key for key, _ in items]
+                self._answer_matrix = np.stack([value[0] for _, value in items])
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            similarities = self._answer_matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < ANSWER_CACHE_THRESHOLD:
+                self._answers.stats.misses += 1
+                return None
+            # Counts the hit and refreshes LRU order
+            entry = self._answers.get(self._answer_keys[best])
+            if entry is None:
+                return None
+            _, answer, citations = entry
+            return answer, list(citations)
+
+    def put_answer(self, query, query_embedding, answer, citations, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            embedding = np.asarray(query_embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+            size = _text_bytes(answer, *citations) + embedding.nbytes
+            self._answers.put(normalize_query(query), (embedding, answer, list(citations)), size)
+            # Force a rebuild even if the key set is unchanged (replaced entry)
+            self._answer_keys = []
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            if len(self._contexts) or len(self._answers):
+                self._contexts.stats.invalidations += 1
+                self._answers.stats.invalidations += 1
+            self._contexts.clear()
+            self._answers.clear()
+            self._answer_keys = []
+            self._answer_matrix = None
+
+    @property
+    def nbytes(self):
+        return self._contexts.nbytes + self._answers.nbytes
+
+    def entry_counts(self):
+        return len(self._contexts), len(self._answers)
+
+class QueryCacheRegistry:
+    """Process-wide map of collection name -> QueryCache"""
+
+    def __init__(self):
+        self._caches = {}
+        self._lock = threading.Lock()
+        self.context_stats = CacheStats()
+        self.answer_stats = CacheStats()
+
+    def get(self, collection_name):
+        with self._lock:
+            cache = self._caches.get(collection_name)
+            if cache is None:
+                cache = QueryCache(self.context_stats, self.answer_stats)
+                self._caches[collection_name] = cache
+            return cache
+
+    def invalidate(self, collection_name):
+        with self._lock:
+            cache = self._caches.get(collection_name)
+        if cache is not None:
+            cache.invalidate()
+
+    def drop(self, collection_name):
+        with self._lock:
+            self._caches.pop(collection_name, None)
+
+    def stats(self):
+        with self._lock:
+            caches = list(self._caches.values())
+        counts = [cache.entry_counts() for cache in caches]
+        return {
+            "enabled": QUERY_CACHE_ENABLED,
+            "collections": len(caches),
+            "bytes": sum(cache.nbytes for cache in caches),
+            "context": {**self.context_stats.to_dict(), "entries": sum(c for c, _ in counts)},
+            "answer": {**self.answer_stats.to_dict(), "entries": sum(a for _, a in counts)},
+        }
+
+# Shared process-wide registry
+query_caches = QueryCacheRegistry()
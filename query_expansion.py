@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import logging
+import threading
+import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from executors import expansion_executor
+from metrics import span, registry
+from text_utils import STOPWORDS, WORD, RRF_K
+
+logger = logging.getLogger(__name__)
+
+# Multi-query retrieval: "off", "rules" (local rewrites) or "llm" (rewrites from the session's LLM)
+QUERY_EXPANSION = os.getenv("QUERY_EXPANSION", "off").lower()
+# Variants retrieved alongside the original query
+QUERY_EXPANSION_VARIANTS = int(os.getenv("QUERY_EXPANSION_VARIANTS", "3"))
+# Time (ms) allowed for rewriting plus the fan-out search; when it would be exceeded the single query is used
+QUERY_EXPANSION_BUDGET_MS = float(os.getenv("QUERY_EXPANSION_BUDGET_MS", "300"))
+# Longer queries are specific enough to be searched as they are (0 expands every query)
+QUERY_EXPANSION_MAX_WORDS = int(os.getenv("QUERY_EXPANSION_MAX_WORDS", "12"))
+
+# Seconds between fan-outs run despite an over-budget estimate, to re-measure it
+_PROBE_INTERVAL = 30.0
+
+EXPANSIONS = registry.counter("rag_query_expansion_total", "Multi-query retrievals by outcome", ["outcome"])
+
+# Clauses of a compound question
+CLAUSE_SPLIT = re.compile(r"\s+(?:and|or|also|و|أو)\s+|[,;؛]", re.IGNORECASE)
+LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+EXPANSION_PROMPT = (
+    "Rewrite the search query below into {n} alternative search queries for a document search engine. "
+    "Use different wording, expand abbreviations and name the likely subject explicitly. "
+    "Answer with one query per line and nothing else.\n"
+    "QUERY: {query}\n"
+)
+
+def rule_variants(query, n=QUERY_EXPANSION_VARIANTS):
+    """Local rewrites: the query's keywords, its clauses, and keyword pairs"""
+    words = WORD.findall(query.lower())
+    keywords = [word for word in words if word not in STOPWORDS]
+    candidates = []
+    if keywords and len(keywords) < len(words):
+        candidates.append(" ".join(keywords))
+    clauses = [clause.strip(" ?؟.!") for clause in CLAUSE_SPLIT.split(query)]
+    clauses = [clause for clause in clauses if len(WORD.findall(clause)) >= 2]
+    if len(clauses) > 1:
+        candidates.extend(clauses)
+    if len(keywords) >= 3:
+        candidates.extend(" ".join(keywords[i:i + 2]) for i in range(len(keywords) - 1))
+
+    seen = {" ".join(words)}
+    variants = []
+    for candidate in candidates:
+        key = " ".join(WORD.findall(candidate.lower()))
+        if key and key not in seen:
+            seen.add(key)
+            variants.append(candidate)
+        if len(variants) == n:
+            break
+    return variants
+
+def parse_llm_variants(text, query, n=QUERY_EXPANSION_VARIANTS):
+    seen = {query.strip().lower()}
+    variants = []
+    for line in text.splitlines():
+        line = LIST_MARKER.sub("", line).strip().strip('"')
+        if line and line.lower() not in seen:
+            seen.add(line.lower())
+            variants.append(line)
+        if len(variants) == n:
+            break
+    return variants
+
+def fuse_result_lists(result_lists, top_k, rrf_k=RRF_K):
+    """Reciprocal-rank fusion of several search() result lists; ties keep the original query's order"""
+    fused = {}
+    for results in result_lists:
+        for rank, entry in enumerate(results):
+            doc_id = entry["id"]
+            score = 1.0 / (rrf_k + rank + 1)
+            if doc_id in fused:
+                fused[doc_id][0] += score
+            else:
+                fused[doc_id] = [score, len(fused), entry]
+    ranked = sorted(fused.values(), key=lambda item: (-item[0], item[1]))[:top_k]
+    return [{**entry, "score": score} for score, _, entry in ranked]
+
+def _smooth(average, value):
+    return value if average is None else 0.8 * average + 0.2 * value
+
+class QueryExpander:
+    """Fan one query out into variants, retrieve them in one batch and fuse the rankings.
+
+    The budget covers rewriting plus the batched encode and search. An LLM
+    rewrite that is not back in time is abandoned. Before searching, the
+    fan-out cost is predicted from a running average of the measured per-query
+    cost; if it would not fit in what is left of the budget, the plain single
+    query is searched instead. Single-query searches feed the average too,
+    scaled by the measured batched-to-single cost ratio, and one fan-out every
+    _PROBE_INTERVAL seconds runs regardless, so one slow measurement cannot
+    switch expansion off for good.
+    """
+
+    def __init__(self, mode=QUERY_EXPANSION, variants=QUERY_EXPANSION_VARIANTS, budget_ms=QUERY_EXPANSION_BUDGET_MS,
+                 max_words=QUERY_EXPANSION_MAX_WORDS, llm=None):
+        if mode not in ("rules", "llm"):
+            raise ValueError(f"Unknown query expansion mode: {mode}")
+        if mode == "llm" and llm is None:
+            raise ValueError("LLM query expansion needs an llm")
+        self.mode = mode
+        self.variants = variants
+        self.budget = budget_ms / 1000
+        self.max_words = max_words
+        self.llm = llm
+        # Seconds per query of a batched encode + search, smoothed
+        self._query_cost = None
+        # Seconds of a single-query search, and what one query of a batch costs relative to it
+        self._single_cost = None
+        self._batch_ratio = 1.0
+        self._last_probe = 0.0
+        self._lock = threading.Lock()
+
+    def _search_single(self, retriever, query, top_k, query_embedding):
+        start = time.perf_counter()
+        results = retriever.search(query, top_k=top_k, query_embedding=query_embedding)
+        cost = time.perf_counter() - start
+        with self._lock:
+            self._single_cost = _smooth(self._single_cost, cost)
+            self._query_cost = _smooth(self._query_cost, cost * self._batch_ratio)
+        return results
+
+    def expand(self, query, deadline):
+        """Variants of query ([] when the query is not expanded or rewriting ran out of time)"""
+        if self.max_words and len(WORD.findall(query)) > self.max_words:
+            return []
+        if self.mode == "rules":
+            return rule_variants(query, self.variants)
+        future = expansion_executor.submit(self.llm.complete, EXPANSION_PROMPT.format(n=self.variants, query=query))
+        try:
+            response = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            future.cancel()
+            return []
+        except Exception as e:
+            logger.warning(f"Query expansion failed: {e}")
+            return []
+        return parse_llm_variants(response.text, query, self.variants)
+
+    def retrieve(self, retriever, query, top_k, query_embedding=None):
+        """Fused results for query and its variants, or plain retriever.search() results"""
+        start = time.perf_counter()
+        deadline = start + self.budget
+        with span("query_expand"):
+            variants = self.expand(query, deadline)
+        if not variants:
+            EXPANSIONS.inc(outcome="skipped")
+            return self._search_single(retriever, query, top_k, query_embedding)
+
+        queries = [query] + variants
+        now = time.perf_counter()
+        with self._lock:
+            query_cost = self._query_cost
+            over_budget = query_cost is not None and now + query_cost * len(queries) > deadline
+            if over_budget and now - self._last_probe >= _PROBE_INTERVAL:
+                # Re-measure the fan-out now and then, in case the estimate is stale
+                self._last_probe = now
+                over_budget = False
+        if over_budget:
+            EXPANSIONS.inc(outcome="over_budget")
+            return self._search_single(retriever, query, top_k, query_embedding)
+
+        search_start = time.perf_counter()
+        if query_embedding is None:
+            query_embeddings = retriever.encode_queries(queries)
+        else:
+            query_embeddings = np.vstack([np.asarray(query_embedding, dtype=np.float32)[np.newaxis, :], retriever.encode_queries(variants)])
+        result_lists = retriever.search_many(queries, top_k=top_k, query_embeddings=query_embeddings)
+        cost = (time.perf_counter() - search_start) / len(queries)
+        with self._lock:
+            self._query_cost = _smooth(self._query_cost, cost)
+            if self._single_cost:
+                self._batch_ratio = _smooth(self._batch_ratio, min(1.0, cost / self._single_cost))
+        EXPANSIONS.inc(outcome="expanded")
+        return fuse_result_lists(result_lists, top_k)
@@ -1,47 +1,177 @@
 import os
+import json
 import logging
+import threading
+from collections import OrderedDict
 import numpy as np
 from pymilvus import MilvusClient, DataType
-from sentence_transformers import SentenceTransformer
 from llama_index.llms.groq import Groq
 from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from model_registry import get_embed_model, default_backend
+from quantization import pack_signs, packed_dim
+from embedding_cache import embedding_caches, text_digest, EMBED_CACHE_ENABLED
+from query_cache import query_caches, QUERY_CACHE_ENABLED
+from chunking import Chunker
+from batching import encode_bucketed
+from metrics import span
+from query_expansion import QueryExpander, QUERY_EXPANSION
+from context_packing import ContextPacker, CONTEXT_PACKING, CONTEXT_CANDIDATES
+from reranking import get_reranker, RERANKER_ENABLED
+from sparse import get_lexical_head, encode_dense_and_sparse, fuse_rankings, SPARSE_ENABLED, HYBRID_CANDIDATES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Binary candidates fetched per requested result when rescoring is enabled
+RESCORE_OVERSAMPLE = int(os.getenv("RESCORE_OVERSAMPLE", "10"))
+
+# "session": one Milvus Lite file and collection per session
+# "shared": every session in one collection, filtered by a session_id field
+MILVUS_TENANCY = os.getenv("MILVUS_TENANCY", "session")
+
+# Row fields returned with every search result
+PAYLOAD_FIELDS = ["context", "filename", "page", "char_start", "char_end"]
+
+# Passages per query unless a caller asks for another number; cached answers are built from this many
+DEFAULT_TOP_K = 5
+
+# Largest limit (top-k) Milvus accepts for a search or query
+MILVUS_MAX_LIMIT = 16384
+
+# Milvus Lite clients shared by all tenants of a db file
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+def get_shared_client(db_file):
+    with _shared_clients_lock:
+        client = _shared_clients.get(db_file)
+        if client is None:
+            client = MilvusClient(db_file)
+            _shared_clients[db_file] = client
+            logger.info(f"Initialized shared Milvus Lite client with database: {db_file}")
+        return client
+
+def close_shared_clients():
+    with _shared_clients_lock:
+        for client in _shared_clients.values():
+            client.close()
+        _shared_clients.clear()
+
 def batch_iterate(lst, batch_size):
     """Yield successive n-sized chunks from list."""
     for i in range(0, len(lst), batch_size):
         yield lst[i:i+batch_size]
 
 class EmbedData:
-    def __init__(self, embed_model_name="BAAI/bge-m3", batch_size=512):
+    def __init__(self, embed_model_name="BAAI/bge-m3", batch_size=512, device=None, precision=None, backend=None, use_cache=EMBED_CACHE_ENABLED, sparse=SPARSE_ENABLED):
         self.embed_model_name = embed_model_name
+        self.device = device
+        self.precision = precision
+        self.backend = backend or default_backend()
         self.embed_model = self._load_embed_model()
+        self.use_cache = use_cache
+        self._embedding_cache = None
+        self._chunker = None
+        # Also produce bge-m3 lexical weights for a sparse index
+        self.sparse = sparse
         self.batch_size = batch_size
         self.embeddings = []
         self.binary_embeddings = []  # Store binary quantized embeddings
         self.metadata = []  # Store document metadata (filename, page, etc.)
 
     def _load_embed_model(self):
-        embed_model = SentenceTransformer(
+        # Shared across all sessions and EmbedData instances in the process
+        return get_embed_model(
             self.embed_model_name,
-            cache_folder='./hf_cache'
+            device=self.device,
+            precision=self.precision,
+            backend=self.backend
         )
-        return embed_model
+
+    @property
+    def vector_dim(self):
+        dim = self.embed_model.get_sentence_embedding_dimension()
+        if dim is None:
+            dim = len(self.generate_embedding("test"))
+        return dim
 
     def generate_embedding(self, context):
-        return self.embed_model.encode(context)
+        if isinstance(context, str):
+            return self.embed_model.encode(context)
+        # Lists are scheduled by token length so short chunks are not padded to long ones
+        with span("embed", items=len(context)):
+            return encode_bucketed(self.embed_model, context)
 
     def _binary_quantize(self, embeddings):
-        """Convert float32 embeddings to binary vectors"""
-        embeddings_array = np.array(embeddings)
-        binary_embeddings = np.where(embeddings_array > 0, 1, 0).astype(np.uint8)
-        # Pack bits into bytes (8 dimensions per byte)
-        packed_embeddings = np.packbits(binary_embeddings, axis=1)
-        return [vec.tobytes() for vec in packed_embeddings]
-
-    def embed(self, contexts, metadata=None):
+        """Convert float32 embeddings to packed binary vectors (one uint8 row per vector)"""
+        # Rows are views into a single buffer; Milvus reads them without per-row copies
+        with span("quantize", items=len(embeddings)):
+            return pack_signs(embeddings)
+
+    @property
+    def embedding_cache(self):
+        """On-disk cache of this model's chunk embeddings (None when disabled)"""
+        if self.use_cache and self._embedding_cache is None:
+            # Quantized backends produce slightly different vectors, so they get their own cache
+            cache_name = self.embed_model_name if self.backend == "torch" else f"{self.embed_model_name}@{self.backend}"
+            self._embedding_cache = embedding_caches.get(cache_name, self.vector_dim)
+        return self._embedding_cache
+
+    @property
+    def chunker(self):
+        """Splits page records into chunks sized for this model's tokenizer"""
+        if self._chunker is None:
+            self._chunker = Chunker.for_model(self.embed_model)
+        return self._chunker
+
+    def chunk_records(self, records):
+        """Lazily turn (page_text, metadata) records into chunk records"""
+        return self.chunker.iter_chunks(records)
+
+    @property
+    def lexical_head(self):
+        return get_lexical_head(self.embed_model_name, self.embed_model)
+
+    def embed_batch_with_sparse(self, contexts):
+        """Like embed_batch, plus lexical weights ({token_id: weight}) from the same encoder pass.
+
+        Every chunk goes through the encoder since the embedding cache only
+        holds dense vectors; fresh vectors are still added to it.
+        """
+        with span("embed", items=len(contexts)):
+            embeddings, sparse_embeddings = encode_dense_and_sparse(self.embed_model, self.lexical_head, contexts)
+        binary_batch = self._binary_quantize(embeddings)
+        cache = self.embedding_cache
+        if cache is not None:
+            cache.add([text_digest(text) for text in contexts], embeddings, binary_batch)
+        return embeddings, binary_batch, sparse_embeddings
+
+    def embed_batch(self, contexts):
+        """Embed one batch without keeping it; returns (float32 embeddings, packed binary vectors)"""
+        cache = self.embedding_cache
+        if cache is None or not contexts:
+            batch_embeddings = self.generate_embedding(contexts)
+            return batch_embeddings, self._binary_quantize(batch_embeddings)
+
+        # Only chunks never seen by this model go through the encoder
+        digests, rows = cache.lookup(contexts)
+        cached = rows >= 0
+        missing = np.flatnonzero(~cached)
+        batch_embeddings = np.empty((len(contexts), cache.dim), dtype=np.float32)
+        binary_batch = np.empty((len(contexts), packed_dim(cache.dim)), dtype=np.uint8)
+        if cached.any():
+            batch_embeddings[cached], binary_batch[cached] = cache.get(rows[cached])
+        if len(missing):
+            fresh = np.asarray(self.generate_embedding([contexts[i] for i in missing]), dtype=np.float32)
+            fresh_binary = self._binary_quantize(fresh)
+            batch_embeddings[missing] = fresh
+            binary_batch[missing] = fresh_binary
+            cache.add([digests[i] for i in missing], fresh, fresh_binary)
+        if cached.any():
+            logger.info(f"Embedding cache: {int(cached.sum())}/{len(contexts)} chunks reused")
+        return batch_embeddings, binary_batch
+
+    def embed(self, contexts, metadata=None, progress_callback=None):
         self.contexts = contexts
         if metadata is None:
             # Default metadata if none provided
@@ -51,14 +181,14 @@ class EmbedData:
         logger.info(f"Generating embeddings for {len(contexts)} contexts...")
 
         for batch_context in batch_iterate(contexts, self.batch_size):
-            # Generate float32 embeddings
-            batch_embeddings = self.generate_embedding(batch_context)
+            # Generate float32 embeddings and their binary quantization
+            batch_embeddings, binary_batch = self.embed_batch(batch_context)
             self.embeddings.extend(batch_embeddings)
-
-            # Convert to binary and store
-            binary_batch = self._binary_quantize(batch_embeddings)
             self.binary_embeddings.extend(binary_batch)
 
+            if progress_callback:
+                progress_callback(len(batch_context))
+
         logger.info(f"Generated {len(self.embeddings)} embeddings with binary quantization")
 
 class MilvusVDB_BQ:
@@ -67,15 +197,42 @@ class MilvusVDB_BQ:
         collection_name, 
         vector_dim=1024, 
         batch_size=512,
-        db_file="milvus_binary_quantized.db"
+        db_file="milvus_binary_quantized.db",
+        rescore_store=None,
+        tenant_id=None,
+        sparse=False
     ):
         self.collection_name = collection_name
         self.batch_size = batch_size
         self.vector_dim = vector_dim
         self.db_file = db_file
         self.client = None
+        # Optional RescoreStore holding compact float copies of the vectors
+        self.rescore_store = rescore_store
+        # When set, the collection is shared: rows carry this session_id and
+        # every search and delete is restricted to it
+        self.tenant_id = tenant_id
+        # Rows carry a sparse_vector of lexical weights next to the binary vector
+        self.sparse = sparse
+
+    @property
+    def cache_key(self):
+        """Identifies this tenant's rows for the query cache"""
+        if self.tenant_id is None:
+            return self.collection_name
+        return f"{self.collection_name}/{self.tenant_id}"
+
+    def tenant_filter(self, expr=None):
+        """Restrict a filter expression to this tenant's rows"""
+        if self.tenant_id is None:
+            return expr or ""
+        tenant_expr = f"session_id == {json.dumps(self.tenant_id)}"
+        return f"{tenant_expr} and ({expr})" if expr else tenant_expr
 
     def define_client(self):
+        if self.tenant_id is not None:
+            self.client = get_shared_client(self.db_file)
+            return
         try:
             self.client = MilvusClient(self.db_file)
             logger.info(f"Initialized Milvus Lite client with database: {self.db_file}")
@@ -84,10 +241,20 @@ class MilvusVDB_BQ:
             raise e
 
     def create_collection(self, drop_existing=True):
+        # A shared collection is never dropped; only this tenant's rows go
+        if self.tenant_id is not None and drop_existing:
+            if self.client.has_collection(collection_name=self.collection_name):
+                self.delete_tenant()
+            drop_existing = False
+
         # Drop existing collection only if requested
         if drop_existing and self.client.has_collection(collection_name=self.collection_name):
             self.client.drop_collection(collection_name=self.collection_name)
             logger.info(f"Dropped existing collection: {self.collection_name}")
+        if drop_existing and self.rescore_store is not None:
+            self.rescore_store.reset()
+        if drop_existing:
+            query_caches.invalidate(self.cache_key)
 
         # Create collection only if it doesn't exist
         if not self.client.has_collection(collection_name=self.collection_name):
@@ -102,7 +269,15 @@ class MilvusVDB_BQ:
             schema.add_field(field_name="context", datatype=DataType.VARCHAR, max_length=65535)
             schema.add_field(field_name="filename", datatype=DataType.VARCHAR, max_length=512)
             schema.add_field(field_name="page", datatype=DataType.INT64)
+            # Character span of the chunk within its page's text
+            schema.add_field(field_name="char_start", datatype=DataType.INT64)
+            schema.add_field(field_name="char_end", datatype=DataType.INT64)
+            if self.tenant_id is not None:
+                # Plain scalar field: Milvus Lite cannot filter on partition keys
+                schema.add_field(field_name="session_id", datatype=DataType.VARCHAR, max_length=128)
             schema.add_field(field_name="binary_vector", datatype=DataType.BINARY_VECTOR, dim=self.vector_dim)
+            if self.sparse:
+                schema.add_field(field_name="sparse_vector", datatype=DataType.SPARSE_FLOAT_VECTOR)
 
             # Create index parameters for binary vectors
             index_params = self.client.prepare_index_params()
@@ -112,6 +287,13 @@ class MilvusVDB_BQ:
                 index_type="BIN_FLAT",  # Exact search for binary vectors
                 metric_type="HAMMING"  # Hamming distance for binary vectors
             )
+            if self.sparse:
+                index_params.add_index(
+                    field_name="sparse_vector",
+                    index_name="sparse_vector_index",
+                    index_type="SPARSE_INVERTED_INDEX",
+                    metric_type="IP"
+                )
 
             # Create collection with schema and index
             self.client.create_collection(
@@ -124,85 +306,327 @@ class MilvusVDB_BQ:
         else:
             logger.info(f"Collection '{self.collection_name}' already exists, appending data")
 
-    def ingest_data(self, embeddata):
+    def ingest_data(self, embeddata, progress_callback=None):
         logger.info(f"Ingesting {len(embeddata.contexts)} documents...")
 
         total_inserted = 0
-        for batch_context, batch_binary_embeddings, batch_metadata in zip(
+        for batch_context, batch_binary_embeddings, batch_metadata, batch_embeddings in zip(
             batch_iterate(embeddata.contexts, self.batch_size),
             batch_iterate(embeddata.binary_embeddings, self.batch_size),
-            batch_iterate(embeddata.metadata, self.batch_size)
+            batch_iterate(embeddata.metadata, self.batch_size),
+            batch_iterate(embeddata.embeddings, self.batch_size)
         ):
-            # Prepare data for insertion
-            data_batch = []
-            for context, binary_embedding, metadata in zip(batch_context, batch_binary_embeddings, batch_metadata):
-                data_batch.append({
-                    "context": context,
-                    "filename": metadata.get("filename", "unknown"),
-                    "page": metadata.get("page", 0),
-                    "binary_vector": binary_embedding
-                })
-
-            # Insert batch
-            self.client.insert(
-                collection_name=self.collection_name,
-                data=data_batch
-            )
+            self.insert_batch(batch_context, batch_binary_embeddings, batch_metadata, batch_embeddings)
 
             total_inserted += len(batch_context)
             logger.info(f"Inserted batch: {len(batch_context)} documents")
+            if progress_callback:
+                progress_callback(len(batch_context))
 
         logger.info(f"Successfully ingested {total_inserted} documents with binary quantization")
 
+    def insert_batch(self, contexts, binary_embeddings, metadata, embeddings=None, sparse_embeddings=None):
+        """Insert one batch of rows; returns the number of rows inserted
+
+        When a rescore store is attached, the float embeddings of the batch are
+        stored under the ids Milvus assigned to the rows. Sparse collections
+        need the lexical weights of every row.
+        """
+        # Prepare data for insertion
+        data_batch = []
+        for context, binary_embedding, meta in zip(contexts, binary_embeddings, metadata):
+            data_batch.append({
+                "context": context,
+                "filename": meta.get("filename", "unknown"),
+                "page": meta.get("page", 0),
+                "char_start": meta.get("char_start", 0),
+                "char_end": meta.get("char_end", len(context)),
+                "binary_vector": binary_embedding
+            })
+            if self.tenant_id is not None:
+                data_batch[-1]["session_id"] = self.tenant_id
+        if self.sparse:
+            for row, weights in zip(data_batch, sparse_embeddings or [{}] * len(data_batch)):
+                # Milvus rejects empty sparse rows; token id 0 is a special token no query weights
+                row["sparse_vector"] = weights or {0: 1e-6}
+
+        with span("insert", items=len(data_batch)):
+            result = self.client.insert(
+                collection_name=self.collection_name,
+                data=data_batch
+            )
+            if self.rescore_store is not None and embeddings is not None:
+                self.rescore_store.add(result["ids"], embeddings)
+        # Cached contexts and answers no longer reflect the collection
+        query_caches.invalidate(self.cache_key)
+        return len(data_batch)
+
+    def delete_by_filenames(self, filenames):
+        """Remove every row that came from the given files"""
+        if not filenames:
+            return
+        file_filter = self.tenant_filter(f"filename in {json.dumps(list(filenames), ensure_ascii=False)}")
+        if self.rescore_store is None:
+            self.client.delete(collection_name=self.collection_name, filter=file_filter)
+        else:
+            # Deleted by id, a page at a time, so their rescore vectors can be dropped too
+            while True:
+                rows = self.client.query(
+                    collection_name=self.collection_name,
+                    filter=file_filter,
+                    output_fields=["id"],
+                    limit=MILVUS_MAX_LIMIT,
+                    consistency_level="Strong"
+                )
+                ids = [row["id"] for row in rows]
+                if not ids:
+                    break
+                self.client.delete(collection_name=self.collection_name, ids=ids)
+                self.rescore_store.remove(ids)
+        query_caches.invalidate(self.cache_key)
+        logger.info(f"Deleted rows for {len(filenames)} file(s) from '{self.collection_name}'")
+
+    def delete_tenant(self):
+        """Remove every row of this tenant from the shared collection"""
+        self.client.delete(collection_name=self.collection_name, filter=self.tenant_filter())
+        if self.rescore_store is not None:
+            self.rescore_store.reset()
+        query_caches.invalidate(self.cache_key)
+        logger.info(f"Deleted rows of session '{self.tenant_id}' from '{self.collection_name}'")
+
+    def close(self):
+        """Close the client unless it is shared with other tenants"""
+        if self.client is not None and self.tenant_id is None:
+            self.client.close()
+
 class Retriever:
-    def __init__(self, vector_db, embeddata, top_k=5):
+    def __init__(self, vector_db, embeddata, top_k=5, oversample=RESCORE_OVERSAMPLE):
         self.vector_db = vector_db
         self.embeddata = embeddata
         self.top_k = top_k
+        # Candidates per result for the Hamming stage when rescoring is available
+        self.oversample = oversample
+        # Lexical weights of recently encoded queries, so callers can keep passing only the dense embedding
+        self._query_sparse = OrderedDict()
+        self._query_sparse_lock = threading.Lock()
+
+    @property
+    def hybrid(self):
+        """Dense and sparse results are fused when the collection has a sparse index"""
+        return self.vector_db.sparse and self.embeddata.sparse
 
     def _binary_quantize_query(self, query_embedding):
-        embedding_array = np.array([query_embedding])
-        binary_embedding = np.where(embedding_array > 0, 1, 0).astype(np.uint8)
-        # Pack bits into bytes (8 dimensions per byte)
-        packed_embedding = np.packbits(binary_embedding, axis=1)
-        return packed_embedding[0].tobytes()
+        return pack_signs(query_embedding).tobytes()
+
+    def _remember_weights(self, queries, weights):
+        with self._query_sparse_lock:
+            for query, query_weights in zip(queries, weights):
+                self._query_sparse[query] = query_weights
+                self._query_sparse.move_to_end(query)
+            while len(self._query_sparse) > 256:
+                self._query_sparse.popitem(last=False)
+
+    def encode_query(self, query):
+        if not self.hybrid:
+            with span("query_encode"):
+                return self.embeddata.embed_model.encode(query)
+        # One pass yields both the dense vector and the lexical weights
+        with span("query_encode"):
+            query_embedding, weights = encode_dense_and_sparse(self.embeddata.embed_model, self.embeddata.lexical_head, query)
+        self._remember_weights([query], [weights])
+        return query_embedding
+
+    def encode_queries(self, queries):
+        """(n, dim) float32 embeddings of several queries, encoded in length-bucketed batches"""
+        queries = list(queries)
+        with span("query_encode", items=len(queries)):
+            if not self.hybrid:
+                return encode_bucketed(self.embeddata.embed_model, queries)
+            embeddings, weights = encode_dense_and_sparse(self.embeddata.embed_model, self.embeddata.lexical_head, queries)
+        self._remember_weights(queries, weights)
+        return embeddings
+
+    def _query_weights(self, query):
+        with self._query_sparse_lock:
+            weights = self._query_sparse.get(query)
+        if weights is None:
+            _, weights = encode_dense_and_sparse(self.embeddata.embed_model, self.embeddata.lexical_head, query)
+        return weights
+
+    def search(self, query, top_k=None, query_embedding=None):
+        if top_k is None:
+            top_k = self.top_k
+
+        # Generate query embedding (float32) unless the caller already has it
+        if query_embedding is None:
+            query_embedding = self.encode_query(query)
+        with span("search"):
+            return self._search_many([query], np.asarray(query_embedding)[np.newaxis, :], top_k)[0]
 
-    def search(self, query, top_k=None):
+    def search_many(self, queries, top_k=None, query_embeddings=None):
+        """Results for several queries, in the format of search(), from one encode pass and one Milvus search per stage"""
         if top_k is None:
             top_k = self.top_k
+        queries = list(queries)
+        if not queries:
+            return []
+
+        if query_embeddings is None:
+            query_embeddings = self.encode_queries(queries)
+        with span("search", items=len(queries)):
+            return self._search_many(queries, np.asarray(query_embeddings), top_k)
+
+    def _search_many(self, queries, query_embeddings, top_k):
+        # Convert to binary vectors, one row per query
+        binary_queries = [row.tobytes() for row in pack_signs(query_embeddings)]
+
+        if self.hybrid:
+            return self._search_hybrid_many(queries, query_embeddings, binary_queries, top_k)
 
-        # Generate query embedding (float32)
-        query_embedding = self.embeddata.embed_model.encode(query)
-        # Convert to binary vectors
-        binary_query = self._binary_quantize_query(query_embedding)
+        rescore_store = self.vector_db.rescore_store
+        if rescore_store is not None and len(rescore_store) and self.oversample > 1:
+            return self._format_many(self._rescored_rankings(query_embeddings, binary_queries, top_k))
 
-        # Perform search using MilvusClient
+        # Perform search using MilvusClient; payloads come back with the hits
         search_results = self.vector_db.client.search(
             collection_name=self.vector_db.collection_name,
-            data=[binary_query],
+            data=binary_queries,
             anns_field="binary_vector",
             search_params={"metric_type": "HAMMING", "params": {}},
-            limit=top_k,
-            output_fields=["context", "filename", "page"]
+            limit=min(top_k, MILVUS_MAX_LIMIT),
+            filter=self.vector_db.tenant_filter(),
+            output_fields=PAYLOAD_FIELDS
         )
 
         # Format results
-        formatted_results = []
-        for result in search_results[0]:
-            formatted_results.append({
-                "id": result["id"],
-                "score": 1.0 / (1.0 + result["distance"]),  # Convert Hamming distance to similarity score
-                "payload": {
-                    "context": result["entity"]["context"],
-                    "filename": result["entity"]["filename"],
-                    "page": result["entity"]["page"]
-                }
-            })
+        all_results = []
+        for hits in search_results:
+            formatted_results = []
+            for result in hits:
+                formatted_results.append({
+                    "id": result["id"],
+                    "score": 1.0 / (1.0 + result["distance"]),  # Convert Hamming distance to similarity score
+                    "payload": {
+                        "context": result["entity"]["context"],
+                        "filename": result["entity"]["filename"],
+                        "page": result["entity"]["page"],
+                        "char_start": result["entity"].get("char_start", 0),
+                        "char_end": result["entity"].get("char_end", 0)
+                    }
+                })
+            all_results.append(formatted_results)
 
-        return formatted_results
+        return all_results
+
+    def _hamming_rankings(self, binary_queries, limit):
+        """[(id, similarity)] of the nearest binary vectors per query, best first"""
+        results = self.vector_db.client.search(
+            collection_name=self.vector_db.collection_name,
+            data=list(binary_queries),
+            anns_field="binary_vector",
+            search_params={"metric_type": "HAMMING", "params": {}},
+            limit=limit,
+            filter=self.vector_db.tenant_filter(),
+            output_fields=[]
+        )
+        return [[(candidate["id"], 1.0 / (1.0 + candidate["distance"])) for candidate in candidates] for candidates in results]
+
+    def _hamming_ranking(self, binary_query, limit):
+        return self._hamming_rankings([binary_query], limit)[0]
+
+    def _rescored_rankings(self, query_embeddings, binary_queries, top_k):
+        """Oversampled Hamming candidates, reranked by each float query against the rescore store"""
+        rankings = []
+        for query_embedding, candidates in zip(query_embeddings, self._hamming_rankings(binary_queries, min(top_k * self.oversample, MILVUS_MAX_LIMIT))):
+            if not candidates:
+                rankings.append([])
+                continue
+            ids = [doc_id for doc_id, _ in candidates]
+            scores = self.vector_db.rescore_store.score(query_embedding, ids)
+            # Candidates missing from the store keep their Hamming order after the rescored ones
+            hamming_scores = [score for _, score in candidates]
+            order = sorted(
+                range(len(ids)),
+                key=lambda i: (np.isnan(scores[i]), -scores[i] if not np.isnan(scores[i]) else -hamming_scores[i])
+            )[:top_k]
+            rankings.append([(ids[i], hamming_scores[i] if np.isnan(scores[i]) else float(scores[i])) for i in order])
+        return rankings
+
+    def _rescored_ranking(self, query_embedding, binary_query, top_k):
+        return self._rescored_rankings([query_embedding], [binary_query], top_k)[0]
+
+    def _sparse_rankings(self, weights, limit):
+        """[(id, inner product)] per query of the rows sharing the most weighted terms with it, best first"""
+        rankings = [[] for _ in weights]
+        # Queries without any lexical weight are not searched
+        searched = [i for i, query_weights in enumerate(weights) if query_weights]
+        if not searched:
+            return rankings
+        results = self.vector_db.client.search(
+            collection_name=self.vector_db.collection_name,
+            data=[weights[i] for i in searched],
+            anns_field="sparse_vector",
+            search_params={"metric_type": "IP", "params": {}},
+            limit=limit,
+            filter=self.vector_db.tenant_filter(),
+            output_fields=[]
+        )
+        for i, hits in zip(searched, results):
+            rankings[i] = [(result["id"], float(result["distance"])) for result in hits]
+        return rankings
+
+    def _search_hybrid_many(self, queries, query_embeddings, binary_queries, top_k):
+        """Dense (rescored when possible) and sparse rankings merged by fuse_rankings"""
+        limit = min(top_k * HYBRID_CANDIDATES, MILVUS_MAX_LIMIT)
+        rescore_store = self.vector_db.rescore_store
+        if rescore_store is not None and len(rescore_store) and self.oversample > 1:
+            dense = self._rescored_rankings(query_embeddings, binary_queries, limit)
+        else:
+            dense = self._hamming_rankings(binary_queries, limit)
+        sparse = self._sparse_rankings([self._query_weights(query) for query in queries], limit)
+        return self._format_many([fuse_rankings(d, s)[:top_k] for d, s in zip(dense, sparse)])
+
+    def _format_many(self, rankings):
+        """Fetch payloads for several [(id, score)] rankings with one get, keeping each ranking's order"""
+        ids = list({doc_id: None for ranking in rankings for doc_id, _ in ranking})
+        if not ids:
+            return [[] for _ in rankings]
+        rows = self.vector_db.client.get(
+            collection_name=self.vector_db.collection_name,
+            ids=ids,
+            output_fields=PAYLOAD_FIELDS
+        )
+        payloads = {row["id"]: row for row in rows}
+
+        all_results = []
+        for ranking in rankings:
+            formatted_results = []
+            for doc_id, score in ranking:
+                row = payloads.get(doc_id)
+                if row is None:
+                    continue
+                formatted_results.append({
+                    "id": doc_id,
+                    "score": score,
+                    "payload": {
+                        "context": row["context"],
+                        "filename": row["filename"],
+                        "page": row["page"],
+                        "char_start": row.get("char_start", 0),
+                        "char_end": row.get("char_end", 0)
+                    }
+                })
+            all_results.append(formatted_results)
+
+        return all_results
+
+    def _format(self, ranking):
+        """Fetch payloads for [(id, score)] and build result dicts, keeping the ranking order"""
+        return self._format_many([ranking])[0]
 
 class RAG:
-    def __init__(self, retriever, llm_model="moonshotai/kimi-k2-instruct", groq_api_key=None):
+    def __init__(self, retriever, llm_model="moonshotai/kimi-k2-instruct", groq_api_key=None, expansion=QUERY_EXPANSION, packing=CONTEXT_PACKING,
+                 rerank=RERANKER_ENABLED):
         system_msg = ChatMessage(
             role=MessageRole.SYSTEM,
             content="You are a helpful assistant that answers questions about the user's document.",
@@ -212,6 +636,12 @@ class RAG:
         self.groq_api_key = groq_api_key or os.getenv("GROQ_API_KEY")
         self.llm = self._setup_llm()
         self.retriever = retriever
+        # Multi-query retrieval ("rules" or "llm"); None searches the query as given
+        self.expander = QueryExpander(mode=expansion, llm=self.llm) if expansion != "off" else None
+        # Token-budgeted context; None joins the top_k passages as they are
+        self.packer = ContextPacker() if packing else None
+        # Cross-encoder between retrieval and context building (shared by every engine in the process)
+        self.reranker = get_reranker() if rerank else None
         self.prompt_template = (
             "CONTEXT: {context}\n"
             "---------------------\n"
@@ -234,8 +664,108 @@ class RAG:
             max_tokens=1000
         )
 
-    def generate_context_with_citations(self, query, top_k=5):
-        results = self.retriever.search(query, top_k=top_k)
+    @property
+    def cache(self):
+        """Query cache of this engine's collection (None when caching is disabled)"""
+        if not QUERY_CACHE_ENABLED:
+            return None
+        return query_caches.get(self.retriever.vector_db.cache_key)
+
+    def cache_generation(self):
+        """Read before retrieval and pass to store_answer to avoid caching stale answers"""
+        cache = self.cache
+        return cache.generation if cache is not None else None
+
+    def lookup_answer(self, query):
+        """Cached answer for this or a semantically equivalent query.
+
+        Returns ((answer, citations) or None, query_embedding). The embedding is
+        computed only when the exact query text is not cached; pass it on to
+        generate_context_with_citations and store_answer to avoid re-encoding.
+        """
+        cache = self.cache
+        if cache is None:
+            return None, None
+        cached = cache.get_answer(query)
+        if cached is not None:
+            return cached, None
+        query_embedding = self.retriever.encode_query(query)
+        return cache.get_answer(query, query_embedding), query_embedding
+
+    def store_answer(self, query, query_embedding, answer, citations, generation):
+        cache = self.cache
+        if cache is None or query_embedding is None:
+            return
+        cache.put_answer(query, query_embedding, answer, citations, generation)
+
+    def lookup_answers(self, queries):
+        """lookup_answer for several queries, encoding every query in one batch.
+
+        Returns ([(answer, citations) or None per query], query_embeddings);
+        the embeddings are None when caching is disabled.
+        """
+        cache = self.cache
+        if cache is None:
+            return [None] * len(queries), None
+        query_embeddings = self.retriever.encode_queries(queries)
+        return [cache.get_answer(query, embedding) for query, embedding in zip(queries, query_embeddings)], query_embeddings
+
+    def generate_context_with_citations(self, query, top_k=DEFAULT_TOP_K, query_embedding=None):
+        return self.generate_contexts_with_citations(
+            [query], top_k=top_k,
+            query_embeddings=None if query_embedding is None else [query_embedding]
+        )[0]
+
+    def generate_contexts_with_citations(self, queries, top_k=DEFAULT_TOP_K, query_embeddings=None):
+        """(context_text, citations) per query; queries missing from the context cache are retrieved in one batch.
+
+        With query expansion on, each query is retrieved through _retrieve on
+        its own, exactly as a single query is, so every endpoint builds the
+        same context for the same query.
+        """
+        cache = self.cache
+        contexts = [None] * len(queries)
+        if cache is not None:
+            generation = cache.generation
+            for i, query in enumerate(queries):
+                contexts[i] = cache.get_context(query, top_k)
+        missing = [i for i, context in enumerate(contexts) if context is None]
+        if not missing:
+            return contexts
+
+        # With packing, extra candidates let the token budget be filled by relevance
+        candidates = max(top_k, CONTEXT_CANDIDATES) if self.packer is not None else top_k
+        # The reranker picks those from a wider candidate set
+        fetch = self.reranker.candidate_count(candidates) if self.reranker is not None else candidates
+        if self.expander is None and len(missing) > 1:
+            results = self.retriever.search_many(
+                [queries[i] for i in missing], top_k=fetch,
+                query_embeddings=None if query_embeddings is None else np.asarray([query_embeddings[i] for i in missing])
+            )
+        else:
+            results = [self._retrieve(
+                queries[i], fetch,
+                query_embedding=None if query_embeddings is None else query_embeddings[i]
+            ) for i in missing]
+        if self.reranker is not None:
+            results = self.reranker.rerank_many([queries[i] for i in missing], results, candidates)
+
+        for i, query_results in zip(missing, results):
+            contexts[i] = self._build_context(queries[i], query_results)
+            if cache is not None:
+                cache.put_context(queries[i], top_k, contexts[i][0], contexts[i][1], generation)
+        return contexts
+
+    def _retrieve(self, query, top_k, query_embedding=None):
+        """Search results for one query, fanned out over query variants when expansion is on"""
+        if self.expander is None:
+            return self.retriever.search(query, top_k=top_k, query_embedding=query_embedding)
+        return self.expander.retrieve(self.retriever, query, top_k, query_embedding)
+
+    def _build_context(self, query, results):
+        if self.packer is not None:
+            context_text, citations, _ = self.packer.pack(query, results)
+            return context_text, citations
 
         combined_context = []
         citations = []
@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+from model_registry import HF_CACHE_DIR
+from query_cache import LRUCache, CacheStats, normalize_query
+from embedding_cache import text_digest
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Rerank retrieved candidates with a cross-encoder before the context is built
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Loaded once per process on CPU; set HF_HUB_OFFLINE=1 to load it from ./hf_cache only
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+# Candidates scored per query; shrinks toward RERANK_MIN_CANDIDATES while the p95 is over budget
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "24"))
+RERANK_MIN_CANDIDATES = int(os.getenv("RERANK_MIN_CANDIDATES", "8"))
+RERANK_P95_BUDGET_MS = float(os.getenv("RERANK_P95_BUDGET_MS", "250"))
+RERANK_CACHE_MAX_BYTES = int(os.getenv("RERANK_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+# Rerank calls kept for the rolling p95
+_WINDOW = 200
+# Cache key, score and bookkeeping per entry
+_SCORE_ENTRY_BYTES = 120
+
+class Reranker:
+    """Cross-encoder reranking of search results with a latency budget.
+
+    All (query, passage) pairs of a call are scored in batches of
+    batch_size. Scores are cached per (query, chunk text hash), so repeated
+    or expanded queries only score the pairs they have not seen. The number
+    of candidates scored per query adapts to the budget: it is cut by a
+    quarter while the p95 of recent calls is over budget_ms, and it grows back
+    by two while the p95 stays under 60% of the budget.
+    """
+
+    def __init__(self, model_name=RERANKER_MODEL, batch_size=RERANK_BATCH_SIZE, max_candidates=RERANK_CANDIDATES,
+                 min_candidates=RERANK_MIN_CANDIDATES, budget_ms=RERANK_P95_BUDGET_MS, model=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+        self.min_candidates = min(min_candidates, max_candidates)
+        self.budget = budget_ms / 1000
+        self._model = model
+        self._model_lock = threading.Lock()
+        self.candidates = max_candidates
+        self._latencies = deque(maxlen=_WINDOW)
+        self._lock = threading.Lock()
+        self.cache_stats = CacheStats()
+        self._cache = LRUCache(RERANK_CACHE_MAX_BYTES, RERANK_CACHE_TTL, self.cache_stats)
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                logger.info(f"Loading reranker {self.model_name} on cpu...")
+                self._model = CrossEncoder(self.model_name, device="cpu", cache_folder=HF_CACHE_DIR)
+                logger.info(f"Loaded reranker {self.model_name}")
+            return self._model
+
+    def warm_up(self):
+        self.model.predict([("warm up", "warm up")])
+
+    def candidate_count(self, keep):
+        """Candidates to retrieve so that keep results are left after reranking"""
+        with self._lock:
+            return max(self.candidates, keep)
+
+    def rerank(self, query, results, keep):
+        return self.rerank_many([query], [results], keep)[0]
+
+    def rerank_many(self, queries, result_lists, keep):
+        """Each result list reordered by cross-encoder score and cut to keep entries"""
+        start = time.perf_counter()
+        with self._lock:
+            limit = max(self.candidates, keep)
+        result_lists = [results[:limit] for results in result_lists]
+
+        keys = []
+        scores = []
+        missing = []
+        with self._lock:
+            for query, results in zip(queries, result_lists):
+                normalized = normalize_query(query)
+                query_keys = [(normalized, text_digest(entry["payload"]["context"])) for entry in results]
+                query_scores = [self._cache.get(key) for key in query_keys]
+                missing.extend((query, entry["payload"]["context"], len(keys), i)
+                               for i, (entry, score) in enumerate(zip(results, query_scores)) if score is None)
+                keys.append(query_keys)
+                scores.append(query_scores)
+
+        if missing:
+            with span("rerank", items=len(missing)):
+                predicted = np.asarray(self.model.predict(
+                    [(query, context) for query, context, _, _ in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                ), dtype=np.float32).reshape(-1)
+            with self._lock:
+                for (_, _, list_index, i), score in zip(missing, predicted.tolist()):
+                    scores[list_index][i] = score
+                    self._cache.put(keys[list_index][i], score, _SCORE_ENTRY_BYTES)
+
+        reranked = []
+        for results, query_scores in zip(result_lists, scores):
+            order = sorted(range(len(results)), key=lambda i: -query_scores[i])[:keep]
+            reranked.append([{**results[i], "score": float(query_scores[i])} for i in order])
+        self._record(time.perf_counter() - start)
+        return reranked
+
+    def _record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            if len(self._latencies) < 20:
+                return
+            p95 = float(np.percentile(self._latencies, 95))
+            if p95 > self.budget and self.candidates > self.min_candidates:
+                self.candidates = max(self.min_candidates, int(self.candidates * 0.75))
+                # Judge the new size on its own latencies
+                self._latencies.clear()
+                logger.info(f"Rerank p95 {p95 * 1000:.0f} ms over budget; scoring {self.candidates} candidates")
+            elif p95 < 0.6 * self.budget and self.candidates < self.max_candidates:
+                self.candidates = min(self.max_candidates, self.candidates + 2)
+                self._latencies.clear()
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "model": self.model_name,
+                "candidates": self.candidates,
+                "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None,
+                "budget_ms": self.budget * 1000,
+                "cache_entries": len(self._cache),
+                **self.cache_stats.to_dict(),
+            }
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker():
+    """Shared process-wide reranker"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker()
+        return _reranker
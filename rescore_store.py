@@ -0,0 +1,203 @@
+import os
+import shutil
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Storage precision of the rescoring vectors: "float16" or "int8"
+RESCORE_DTYPE = os.getenv("RESCORE_DTYPE", "float16")
+
+class RescoreStore:
+    """Append-only, memory-mapped store of compact float vectors keyed by Milvus id.
+
+    Holds a float16 (or int8 + per-vector scale) copy of every embedding so
+    that binary candidates can be rescored against the float query. Rows live
+    in flat files under `path` and are read through np.memmap, so only the
+    pages touched by a query are loaded.
+
+    Removed ids are recorded in a tombstone file and skipped; once dead rows
+    outnumber live ones the live rows are rewritten into a fresh directory
+    that replaces `path`.
+    """
+
+    def __init__(self, path, dim, dtype=RESCORE_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported rescore dtype '{dtype}'. Choose 'float16' or 'int8'.")
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._vectors_file = os.path.join(path, f"vectors.{dtype}")
+        self._scales_file = os.path.join(path, "scales.float32")
+        self._ids_file = os.path.join(path, "ids.int64")
+        self._removed_file = os.path.join(path, "removed.int64")
+        self._lock = threading.Lock()
+        self._row_of = {}
+        self._rows = 0
+        self._vectors = None
+        self._scales = None
+        self._finish_compaction()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _finish_compaction(self):
+        """Complete or discard a compaction interrupted by a crash"""
+        compacted, replaced = f"{self.path}.compact", f"{self.path}.old"
+        if os.path.isdir(compacted):
+            if os.path.isdir(self.path):
+                # Interrupted before the swap; the original is intact
+                shutil.rmtree(compacted)
+            else:
+                os.replace(compacted, self.path)
+        if os.path.isdir(replaced):
+            shutil.rmtree(replaced)
+
+    def _row_files(self):
+        """(file, bytes per row) of every per-row file of this dtype"""
+        files = [(self._vectors_file, self.dim * self.dtype.itemsize), (self._ids_file, 8)]
+        if self.dtype == np.int8:
+            files.append((self._scales_file, 4))
+        return files
+
+    def _load(self):
+        if not os.path.exists(self._ids_file):
+            return
+        # An interrupted append leaves the files with different row counts; only
+        # rows present in all of them are usable, and later appends must line up
+        rows = min(
+            os.path.getsize(file_path) // row_bytes if os.path.exists(file_path) else 0
+            for file_path, row_bytes in self._row_files()
+        )
+        for file_path, row_bytes in self._row_files():
+            if os.path.exists(file_path) and os.path.getsize(file_path) != rows * row_bytes:
+                logger.warning(f"Truncating {file_path} to {rows} rows after an interrupted write")
+                os.truncate(file_path, rows * row_bytes)
+        ids = np.fromfile(self._ids_file, dtype=np.int64, count=rows)
+        self._row_of = {int(i): row for row, i in enumerate(ids.tolist())}
+        if os.path.exists(self._removed_file):
+            for i in np.fromfile(self._removed_file, dtype=np.int64).tolist():
+                self._row_of.pop(i, None)
+        self._rows = rows
+        logger.info(f"Opened rescore store {self.path} with {self._rows} vectors")
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def nbytes(self):
+        row_bytes = self.dim * self.dtype.itemsize + 8 + (4 if self.dtype == np.int8 else 0)
+        return self._rows * row_bytes
+
+    def ids(self):
+        """Live Milvus ids in insertion order"""
+        if not self._rows:
+            return np.empty(0, dtype=np.int64)
+        ids = np.fromfile(self._ids_file, dtype=np.int64, count=self._rows)
+        return ids[np.sort(np.fromiter(self._row_of.values(), dtype=np.int64, count=len(self._row_of)))]
+
+    @property
+    def dead_rows(self):
+        return self._rows - len(self._row_of)
+
+    def add(self, ids, embeddings):
+        """Append the vectors for the given Milvus ids"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.dtype == np.int8:
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            vectors = np.rint(embeddings / scales[:, np.newaxis]).astype(np.int8)
+        else:
+            scales = None
+            vectors = embeddings.astype(np.float16)
+
+        with self._lock:
+            with open(self._vectors_file, "ab") as f:
+                f.write(vectors.tobytes())
+            if scales is not None:
+                with open(self._scales_file, "ab") as f:
+                    f.write(scales.astype(np.float32).tobytes())
+            with open(self._ids_file, "ab") as f:
+                f.write(ids.tobytes())
+            for offset, i in enumerate(ids.tolist()):
+                self._row_of[i] = self._rows + offset
+            self._rows += len(ids)
+
+    def remove(self, ids):
+        """Forget the vectors of deleted Milvus ids; compacts once dead rows outnumber live ones"""
+        with self._lock:
+            removed = np.asarray([i for i in map(int, ids) if self._row_of.pop(i, None) is not None], dtype=np.int64)
+            if not len(removed):
+                return
+            with open(self._removed_file, "ab") as f:
+                f.write(removed.tobytes())
+            if self.dead_rows > len(self._row_of):
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the live rows into a fresh directory and swap it in (lock held)"""
+        live = sorted(self._row_of.items(), key=lambda item: item[1])
+        rows = np.array([row for _, row in live], dtype=np.int64)
+        compacted, replaced = f"{self.path}.compact", f"{self.path}.old"
+        if os.path.isdir(compacted):
+            shutil.rmtree(compacted)
+        os.makedirs(compacted)
+        for file_path, row_bytes in self._row_files():
+            if file_path == self._ids_file:
+                data = np.array([i for i, _ in live], dtype=np.int64)
+            else:
+                dtype = np.float32 if file_path == self._scales_file else self.dtype
+                source = np.memmap(file_path, dtype=dtype, mode="r", shape=(self._rows, row_bytes // np.dtype(dtype).itemsize))
+                data = np.ascontiguousarray(source[rows])
+                del source
+            with open(os.path.join(compacted, os.path.basename(file_path)), "wb") as f:
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        # Readers map the files again on their next score()
+        self._vectors = None
+        self._scales = None
+        os.replace(self.path, replaced)
+        os.replace(compacted, self.path)
+        shutil.rmtree(replaced)
+        logger.info(f"Compacted rescore store {self.path}: {self._rows - len(live)} dead rows dropped, {len(live)} kept")
+        self._row_of = {i: row for row, (i, _) in enumerate(live)}
+        self._rows = len(live)
+
+    def _mapped(self):
+        # Remap when rows were appended (or the files compacted) since the last map; lock held
+        if self._rows and (self._vectors is None or self._vectors.shape[0] < self._rows):
+            self._vectors = np.memmap(self._vectors_file, dtype=self.dtype, mode="r", shape=(self._rows, self.dim))
+            if self.dtype == np.int8:
+                self._scales = np.memmap(self._scales_file, dtype=np.float32, mode="r", shape=(self._rows,))
+        return self._vectors, self._scales
+
+    def score(self, query_embedding, ids):
+        """Dot product of the float query with each stored vector; NaN where an id is unknown"""
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        # Rows and maps are taken together so a concurrent compaction cannot mix them
+        with self._lock:
+            rows = np.array([self._row_of.get(int(i), -1) for i in ids], dtype=np.int64)
+            vectors, scales = self._mapped()
+        scores = np.full(len(rows), np.nan, dtype=np.float32)
+        known = rows >= 0
+        if not known.any():
+            return scores
+
+        candidate_rows = rows[known]
+        scores[known] = vectors[candidate_rows].astype(np.float32) @ query
+        if scales is not None:
+            scores[known] *= scales[candidate_rows]
+        return scores
+
+    def reset(self):
+        """Remove every stored vector"""
+        with self._lock:
+            self._vectors = None
+            self._scales = None
+            for file_path in (self._vectors_file, self._scales_file, self._ids_file, self._removed_file):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            self._row_of = {}
+            self._rows = 0
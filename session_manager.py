@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from storage import SESSIONS_DIR, write_json_atomic, valid_session_id
+
+logger = logging.getLogger(__name__)
+
+# Resident sessions unused for this long (seconds) are spilled to disk
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+# Most sessions kept resident at once; least recently used are spilled first
+MAX_RESIDENT_SESSIONS = int(os.getenv("MAX_RESIDENT_SESSIONS", "64"))
+# Budget for the vectors and Milvus files of all resident sessions
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "2048"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "30"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", SESSIONS_DIR)
+# Keep manifests of resident sessions on disk too, and re-register every stored session at startup
+SESSION_PERSIST = os.getenv("SESSION_PERSIST", "true").lower() in ("1", "true", "yes")
+
+class SessionManager:
+    """Sessions kept in LRU order, spilled to disk when idle or over budget.
+
+    spill is an async callable taking a resident session; it releases its
+    clients and returns (manifest, memo). The JSON manifest is written to
+    spill_dir and the small memo (e.g. the API key, which never touches
+    disk) stays in memory. rehydrate(manifest, memo) rebuilds the session on
+    its next use. sizeof(session) returns the bytes a session pins.
+
+    Sessions held through use()/acquire() are never spilled.
+
+    With persist, manifests outlive rehydration: save(session_id) rewrites a
+    resident session's manifest through describe(session), and restore()
+    registers every manifest found in spill_dir as a spilled session (with
+    no memo), so sessions survive a restart and are only reopened on use.
+    """
+
+    def __init__(
+        self,
+        spill,
+        rehydrate,
+        sizeof,
+        describe=None,
+        persist=SESSION_PERSIST,
+        idle_ttl=SESSION_IDLE_TTL,
+        max_resident=MAX_RESIDENT_SESSIONS,
+        memory_budget_mb=SESSION_MEMORY_BUDGET_MB,
+        spill_dir=SESSION_SPILL_DIR
+    ):
+        self._spill = spill
+        self._rehydrate = rehydrate
+        self._sizeof = sizeof
+        self._describe = describe
+        self.persist = persist and describe is not None
+        self.idle_ttl = idle_ttl
+        self.max_resident = max_resident
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self._resident = OrderedDict()  # session id -> session, least recently used first
+        self._last_used = {}
+        self._spilled = {}  # session id -> memo; the manifest is on disk
+        self._busy = {}
+        self._locks = {}
+        self._wakeup = None
+        self._task = None
+        self.spills = 0
+        self.rehydrations = 0
+        self.restored = 0
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def restore(self):
+        """Register the sessions stored in spill_dir; nothing is opened until a session is used"""
+        start = time.perf_counter()
+        for name in os.listdir(self.spill_dir):
+            if not name.endswith(".json"):
+                continue
+            session_id = name[:-len(".json")]
+            if not valid_session_id(session_id):
+                logger.warning(f"Ignoring stored manifest with an invalid session id: {name}")
+                continue
+            if session_id not in self:
+                self._spilled[session_id] = None
+                self.restored += 1
+        logger.info(f"Restored {self.restored} stored sessions in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return self.restored
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._sweeper())
+        logger.info(f"Session manager started (idle TTL {self.idle_ttl:.0f}s, max {self.max_resident} resident, budget {self.memory_budget // (1024 * 1024)} MB)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def __contains__(self, session_id):
+        return session_id in self._resident or session_id in self._spilled
+
+    def __len__(self):
+        return len(self._resident) + len(self._spilled)
+
+    def __setitem__(self, session_id, session):
+        self._resident[session_id] = session
+        self.touch(session_id)
+        self.kick()
+
+    def get(self, session_id):
+        """Resident session or None; never rehydrates"""
+        session = self._resident.get(session_id)
+        if session is not None:
+            self.touch(session_id)
+        return session
+
+    def touch(self, session_id):
+        if session_id in self._resident:
+            self._resident.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+
+    def kick(self):
+        """Ask the sweeper to enforce the limits now rather than at its next tick"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _lock(self, session_id):
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    def _manifest_path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    async def load(self, session_id):
+        """Session by id, rehydrated from disk if it was spilled; None if unknown"""
+        async with self._lock(session_id):
+            return await self._load_locked(session_id)
+
+    async def _load_locked(self, session_id):
+        if session_id in self._resident:
+            self.touch(session_id)
+            return self._resident[session_id]
+        if session_id not in self._spilled:
+            return None
+
+        manifest_path = self._manifest_path(session_id)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        start = time.perf_counter()
+        session = await self._rehydrate(manifest, self._spilled[session_id])
+        del self._spilled[session_id]
+        if not self.persist:
+            os.remove(manifest_path)
+        self.rehydrations += 1
+        self[session_id] = session
+        logger.info(f"Rehydrated session {session_id} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return session
+
+    async def acquire(self, session_id):
+        """Load a session and pin it against spilling until release()"""
+        async with self._lock(session_id):
+            session = await self._load_locked(session_id)
+            if session is not None:
+                self._busy[session_id] = self._busy.get(session_id, 0) + 1
+            return session
+
+    def release(self, session_id):
+        count = self._busy.get(session_id, 0) - 1
+        if count > 0:
+            self._busy[session_id] = count
+        else:
+            self._busy.pop(session_id, None)
+        self.touch(session_id)
+        self.kick()
+
+    @asynccontextmanager
+    async def use(self, session_id):
+        session = await self.acquire(session_id)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                self.release(session_id)
+
+    async def remove(self, session_id):
+        """Forget a session (resident or spilled); returns the resident session, if any"""
+        async with self._lock(session_id):
+            session = self._resident.pop(session_id, None)
+            self._last_used.pop(session_id, None)
+            self._spilled.pop(session_id, None)
+            if os.path.exists(self._manifest_path(session_id)):
+                os.remove(self._manifest_path(session_id))
+        self._locks.pop(session_id, None)
+        return session
+
+    async def spill(self, session_id):
+        """Write a resident, unpinned session to disk and release it; returns True if spilled"""
+        async with self._lock(session_id):
+            if session_id not in self._resident or self._busy.get(session_id):
+                return False
+            session = self._resident.pop(session_id)
+            self._last_used.pop(session_id, None)
+            # Still known (as spilled) while its clients are being released
+            self._spilled[session_id] = None
+            try:
+                manifest, memo = await self._spill(session)
+            except Exception as e:
+                logger.error(f"Failed to spill session {session_id}: {e}")
+                del self._spilled[session_id]
+                self._resident[session_id] = session
+                self.touch(session_id)
+                return False
+            write_json_atomic(self._manifest_path(session_id), manifest)
+            self._spilled[session_id] = memo
+            self.spills += 1
+            return True
+
+    async def save(self, session_id):
+        """Write a resident session's manifest now (after its index or documents changed)"""
+        if not self.persist:
+            return
+        async with self._lock(session_id):
+            session = self._resident.get(session_id)
+            if session is not None:
+                write_json_atomic(self._manifest_path(session_id), self._describe(session))
+
+    def resident_bytes(self):
+        return {session_id: self._sizeof(session) for session_id, session in self._resident.items()}
+
+    async def enforce_limits(self):
+        """Spill idle sessions, then least recently used ones until under the cap and budget"""
+        now = time.monotonic()
+        for session_id in list(self._resident):
+            if now - self._last_used.get(session_id, now) > self.idle_ttl and await self.spill(session_id):
+                logger.info(f"Spilled idle session {session_id}")
+
+        sizes = self.resident_bytes()
+        total = sum(sizes.values())
+        for session_id in list(self._resident):
+            if len(self._resident) <= self.max_resident and total <= self.memory_budget:
+                break
+            if await self.spill(session_id):
+                total -= sizes.get(session_id, 0)
+                logger.info(f"Spilled session {session_id} ({sizes.get(session_id, 0) / (1024 * 1024):.1f} MB) to stay within limits")
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=SESSION_SWEEP_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.enforce_limits()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    def stats(self):
+        return {
+            "resident": len(self._resident),
+            "spilled": len(self._spilled),
+            "resident_bytes": sum(self.resident_bytes().values()),
+            "memory_budget_bytes": self.memory_budget,
+            "max_resident": self.max_resident,
+            "spills": self.spills,
+            "rehydrations": self.rehydrations,
+            "restored": self.restored,
+            "persist": self.persist,
+        }
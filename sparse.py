@@ -0,0 +1,105 @@
+import os
+import logging
+import threading
+import numpy as np
+from batching import plan_batches, token_lengths, EMBED_TOKEN_BUDGET, EMBED_MAX_BATCH_ROWS
+from model_registry import HF_CACHE_DIR
+from text_utils import RRF_K
+
+logger = logging.getLogger(__name__)
+
+# Store bge-m3 lexical weights in a sparse field and fuse sparse with dense search
+SPARSE_ENABLED = os.getenv("SPARSE_ENABLED", "false").lower() in ("1", "true", "yes")
+# "rrf": reciprocal-rank fusion; "weighted": min-max normalized scores, HYBRID_DENSE_WEIGHT on dense
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.7"))
+# Candidates fetched from each index per requested result before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))
+
+class LexicalHead:
+    """bge-m3's sparse head: relu(W . h + b) over the encoder's last hidden states.
+
+    Applied to the token embeddings the SentenceTransformer already computes
+    for the dense vector, so lexical weights cost no extra forward pass. Each
+    token id keeps its highest weight; special tokens are dropped.
+    """
+
+    def __init__(self, weight, bias, special_ids):
+        self.weight = np.asarray(weight, dtype=np.float32).reshape(-1)
+        self.bias = float(np.asarray(bias).reshape(-1)[0])
+        self.special_ids = set(special_ids)
+
+    @classmethod
+    def load(cls, model_name, tokenizer, cache_folder=HF_CACHE_DIR):
+        import torch
+        from huggingface_hub import hf_hub_download
+
+        path = hf_hub_download(model_name, "sparse_linear.pt", cache_dir=cache_folder)
+        state = torch.load(path, map_location="cpu")
+        return cls(state["weight"].numpy(), state["bias"].numpy(), tokenizer.all_special_ids)
+
+    def weights(self, token_embeddings, input_ids, attention_mask):
+        """{token_id: weight} for one text"""
+        scores = np.maximum(np.asarray(token_embeddings, dtype=np.float32) @ self.weight + self.bias, 0.0)
+        lexical = {}
+        for token_id, score, mask in zip(np.asarray(input_ids).tolist(), scores.tolist(), np.asarray(attention_mask).tolist()):
+            if not mask or score <= 0 or token_id in self.special_ids:
+                continue
+            if score > lexical.get(token_id, 0.0):
+                lexical[token_id] = score
+        return lexical
+
+_heads = {}
+_heads_lock = threading.Lock()
+
+def get_lexical_head(model_name, model):
+    """Shared sparse head for a model, loaded on first use"""
+    with _heads_lock:
+        head = _heads.get(model_name)
+        if head is None:
+            head = _heads[model_name] = LexicalHead.load(model_name, model.tokenizer)
+            logger.info(f"Loaded lexical weight head for {model_name}")
+        return head
+
+def _to_numpy(value):
+    return value.detach().float().cpu().numpy() if hasattr(value, "detach") else np.asarray(value)
+
+def encode_dense_and_sparse(model, head, texts, token_budget=EMBED_TOKEN_BUDGET, max_rows=EMBED_MAX_BATCH_ROWS):
+    """One encoder pass per length bucket; returns (dense float32 rows, [{token_id: weight}]) in input order"""
+    if isinstance(texts, str):
+        dense, sparse = encode_dense_and_sparse(model, head, [texts], token_budget, max_rows)
+        return dense[0], sparse[0]
+    dense = None
+    sparse = [None] * len(texts)
+    for batch in plan_batches(token_lengths(model, texts), token_budget, max_rows):
+        outputs = model.encode([texts[i] for i in batch], batch_size=len(batch), output_value=None)
+        for i, features in zip(batch, outputs):
+            vector = _to_numpy(features["sentence_embedding"])
+            if dense is None:
+                dense = np.empty((len(texts), vector.shape[0]), dtype=np.float32)
+            dense[i] = vector
+            sparse[i] = head.weights(
+                _to_numpy(features["token_embeddings"]),
+                _to_numpy(features["input_ids"]),
+                _to_numpy(features["attention_mask"])
+            )
+    return dense, sparse
+
+def fuse_rankings(dense, sparse, method=HYBRID_FUSION, dense_weight=HYBRID_DENSE_WEIGHT, rrf_k=RRF_K):
+    """Merge two [(id, score)] rankings (best first) into one [(id, fused score)]"""
+    fused = {}
+    if method == "rrf":
+        for ranking in (dense, sparse):
+            for rank, (doc_id, _) in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    elif method == "weighted":
+        for ranking, weight in ((dense, dense_weight), (sparse, 1.0 - dense_weight)):
+            if not ranking:
+                continue
+            scores = [score for _, score in ranking]
+            low, span = min(scores), (max(scores) - min(scores)) or 1.0
+            for doc_id, score in ranking:
+                fused[doc_id] = fused.get(doc_id, 0.0) + weight * (score - low) / span
+    else:
+        raise ValueError(f"Unknown fusion method '{method}'. Choose 'rrf' or 'weighted'")
+    return sorted(fused.items(), key=lambda item: -item[1])
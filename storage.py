@@ -0,0 +1,73 @@
+import os
+import re
+import json
+import shutil
+import logging
+from chunking import CHUNK_TOKENS, CHUNK_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+# Root of everything that must survive a restart: Milvus Lite files, rescore vectors and session manifests
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+MILVUS_DIR = os.path.join(DATA_DIR, "milvus")
+RESCORE_DIR = os.path.join(DATA_DIR, "rescore")
+SESSIONS_DIR = os.path.join(DATA_DIR, "sessions")
+
+# Bumped when the manifest layout changes incompatibly
+MANIFEST_VERSION = 1
+
+# Session ids become file names under DATA_DIR, so they may not contain path separators or dots
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+def session_db_file(session_id):
+    return os.path.join(MILVUS_DIR, f"milvus_{session_id}.db")
+
+def shared_db_file():
+    return os.path.join(MILVUS_DIR, "milvus_shared.db")
+
+def rescore_path(session_id):
+    return os.path.join(RESCORE_DIR, f"rescore_{session_id}")
+
+def ensure_dirs():
+    for path in (MILVUS_DIR, RESCORE_DIR, SESSIONS_DIR):
+        os.makedirs(path, exist_ok=True)
+
+def model_fingerprint(embeddata):
+    """What produced a collection's vectors; a session whose fingerprint no longer matches must be re-embedded"""
+    return {
+        "embed_model": embeddata.embed_model_name,
+        "embed_backend": embeddata.backend,
+        "vector_dim": embeddata.vector_dim,
+        "sparse": embeddata.sparse,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+
+def compatible(stored, current):
+    """Stored vectors can be searched with the current encoder (backend and chunking may differ)"""
+    return all(stored.get(key) == current.get(key) for key in ("embed_model", "vector_dim", "sparse"))
+
+def write_json_atomic(path, data):
+    """Write JSON so that a crash leaves either the old or the new file, never a torn one"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def remove_files(*paths):
+    """Delete files or directories left by a removed session, ignoring missing ones"""
+    for path in paths:
+        if not path:
+            continue
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {e}")
@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import logging
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# Deltas are coalesced into one frame (WebSocket message) per interval, or sooner once this many characters are pending
+STREAM_FRAME_INTERVAL_MS = float(os.getenv("STREAM_FRAME_INTERVAL_MS", "50"))
+STREAM_FRAME_CHARS = int(os.getenv("STREAM_FRAME_CHARS", "512"))
+# A slow client lets at most this many characters pile up before the LLM stream stops being read
+STREAM_MAX_BUFFERED_CHARS = int(os.getenv("STREAM_MAX_BUFFERED_CHARS", "65536"))
+# Minimum time between Streamlit re-renders of a streaming answer
+STREAM_UI_INTERVAL_MS = float(os.getenv("STREAM_UI_INTERVAL_MS", "100"))
+
+class DeltaNormalizer:
+    """Turn streamed LLM chunks into text deltas without rescanning the answer so far.
+
+    Accepts plain strings (already deltas) and LlamaIndex CompletionResponse
+    chunks. A chunk's delta is used when present; otherwise its text is
+    taken as the cumulative answer, and only the part past what has already
+    been emitted is returned. Only lengths are compared, so each chunk costs
+    O(len(delta)) instead of a prefix check over the whole answer.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def feed(self, chunk):
+        if isinstance(chunk, str):
+            delta = chunk
+        else:
+            delta = getattr(chunk, "delta", None)
+            if not delta:
+                text = getattr(chunk, "text", None)
+                delta = text[self.length:] if text and len(text) > self.length else ""
+        if delta:
+            self.parts.append(delta)
+            self.length += len(delta)
+        return delta
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+def iter_frames(chunks, interval_ms=STREAM_UI_INTERVAL_MS, max_chars=STREAM_FRAME_CHARS, normalizer=None):
+    """Coalesce a synchronous chunk stream into (frame, normalizer) pairs.
+
+    A frame is yielded as soon as the first delta arrives, then at most once
+    per interval unless max_chars are pending, and once more for the tail.
+    The normalizer holds the full answer so far (normalizer.text), for
+    callers that re-render the whole message per frame.
+    """
+    normalizer = normalizer or DeltaNormalizer()
+    interval = interval_ms / 1000
+    pending = []
+    pending_chars = 0
+    last = 0.0
+    for chunk in chunks:
+        delta = normalizer.feed(chunk)
+        if not delta:
+            continue
+        pending.append(delta)
+        pending_chars += len(delta)
+        now = time.monotonic()
+        if now - last >= interval or pending_chars >= max_chars:
+            yield "".join(pending), normalizer
+            pending.clear()
+            pending_chars = 0
+            last = now
+    if pending:
+        yield "".join(pending), normalizer
+
+async def relay(chunks, send, interval_ms=STREAM_FRAME_INTERVAL_MS, max_chars=STREAM_FRAME_CHARS, max_buffered=STREAM_MAX_BUFFERED_CHARS):
+    """Forward an async chunk stream to `await send(frame)` in coalesced frames; returns the full text.
+
+    Reading the stream and sending run as separate tasks. While a send is in
+    flight, new deltas pile up and leave as one larger frame. Once
+    max_buffered characters are waiting, reading pauses until the sender
+    drains, so a slow client holds back the upstream stream instead of
+    growing memory. Time spent paused is recorded as the stream_backpressure
+    stage.
+    """
+    normalizer = DeltaNormalizer()
+    interval = interval_ms / 1000
+    pending = []
+    state = {"chars": 0, "done": False}
+    ready = asyncio.Event()
+    drained = asyncio.Event()
+    drained.set()
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                delta = normalizer.feed(chunk)
+                if not delta:
+                    continue
+                pending.append(delta)
+                state["chars"] += len(delta)
+                ready.set()
+                if state["chars"] >= max_buffered:
+                    drained.clear()
+                    start = time.perf_counter()
+                    await drained.wait()
+                    observe("stream_backpressure", time.perf_counter() - start)
+        finally:
+            state["done"] = True
+            ready.set()
+
+    producer = asyncio.create_task(produce())
+    frames = 0
+    try:
+        last = 0.0
+        while True:
+            await ready.wait()
+            ready.clear()
+            if pending:
+                delay = last + interval - time.monotonic()
+                if delay > 0 and state["chars"] < max_chars and not state["done"]:
+                    # Let more deltas join this frame
+                    await asyncio.sleep(delay)
+                frame = "".join(pending)
+                pending.clear()
+                state["chars"] = 0
+                drained.set()
+                await send(frame)
+                frames += 1
+                last = time.monotonic()
+            if state["done"] and not pending:
+                break
+        # Surface errors raised while reading the stream
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    logger.debug(f"Relayed {normalizer.length} characters in {frames} frames")
+    return normalizer.text
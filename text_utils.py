@@ -0,0 +1,20 @@
+import os
+import re
+
+# Text constants shared by query expansion, context packing and hybrid search.
+# Kept free of model imports so that text-only modules load without torch.
+
+# Words that carry no search intent (English and Arabic)
+STOPWORDS = frozenset("""
+a an the is are was were be been being do does did of to in on at by for with from into about as and or not no
+what which who whom whose when where why how can could should would will shall may might must
+i me my we our you your it its this that these those there their they them he she his her
+please tell explain describe give show list find any some all more most much many
+ما ماذا هل كيف متى أين اين لماذا من في على عن إلى الى هو هي هذا هذه ذلك التي الذي و أو او مع
+""".split())
+
+# Words as the query and passage scorers see them
+WORD = re.compile(r"[\w\-]+", re.UNICODE)
+
+# Constant k of reciprocal-rank fusion: 1 / (k + rank)
+RRF_K = int(os.getenv("RRF_K", "60"))